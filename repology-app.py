@@ -17,22 +17,29 @@
 # You should have received a copy of the GNU General Public License
 # along with repology.  If not, see <http://www.gnu.org/licenses/>.
 
+import datetime
+import hashlib
 import json
 import math
-
+from collections import OrderedDict
 from operator import itemgetter
 
 import flask
 
 from werkzeug.contrib.profiler import ProfilerMiddleware
 
+from repology.badges import BadgeRenderer
 from repology.database import Database
+from repology.databasepool import DatabasePool
+from repology.export import EXPORT_DATA_FILE, EXPORT_META_FILE, GetExportDataFileName, LoadExportMeta, PackageToApiV1Json
 from repology.graphprocessor import GraphProcessor
+from repology.metapackageindex import MetapackageIndexFile
 from repology.metapackageproc import *
 from repology.package import *
 from repology.packageproc import *
 from repology.queryfilters import *
 from repology.repoman import RepositoryManager
+from repology.responsecache import LRUCache, MemcachedCache, ResponseCache, UpdateGenerationTracker
 from repology.template_helpers import *
 from repology.version import VersionCompare
 
@@ -70,52 +77,240 @@ app.jinja_env.globals['REPOLOGY_HOME'] = app.config['REPOLOGY_HOME']
 app.jinja_env.globals['repometadata'] = repometadata
 app.jinja_env.globals['reponames'] = reponames
 
+# badges: shared with repology-genbadges.py
+badge_renderer = BadgeRenderer(app.jinja_env, repometadata)
+
+
+# database connections are shared between requests of a worker process
+database_pool = None
+
+if app.config['DATABASE_POOL_SIZE']:
+    database_pool = DatabasePool(
+        lambda: Database(app.config['DSN'], readonly=False, autocommit=True, prepare=True),
+        maxsize=app.config['DATABASE_POOL_SIZE'],
+        timeout=app.config['DATABASE_POOL_TIMEOUT'],
+        check_interval=app.config['DATABASE_POOL_CHECK_INTERVAL']
+    )
+
 
 def get_db():
     if not hasattr(flask.g, 'database'):
-        flask.g.database = Database(app.config['DSN'], readonly=False, autocommit=True)
+        if database_pool is not None:
+            flask.g.database = database_pool.Acquire()
+        else:
+            flask.g.database = Database(app.config['DSN'], readonly=False, autocommit=True)
     return flask.g.database
 
 
-# helpers
-def api_v1_package_to_json(package):
-    output = {
-        field: getattr(package, field) for field in (
-            'repo',
-            'subrepo',
-            'name',
-            'version',
-            'origversion',
-            'maintainers',
-            #'category',
-            #'comment',
-            #'homepage',
-            'licenses',
-            'downloads'
-        ) if getattr(package, field)
-    }
+@app.teardown_appcontext
+def release_db(exception):
+    database = flask.g.pop('database', None)
+    if database is not None and database_pool is not None:
+        # connection state is unknown after an error, so don't reuse it
+        database_pool.Release(database, broken=exception is not None)
+
+
+# in-memory metapackage index, reloaded when repology-update writes
+# a new snapshot
+metapackage_index = MetapackageIndexFile(app.config['METAPACKAGE_INDEX_PATH']) if app.config['METAPACKAGE_INDEX_PATH'] else None
+
+
+def get_metapackages(*filters, limit=500):
+    index = metapackage_index.Get() if metapackage_index is not None else None
+    if index is None:
+        return get_db().GetMetapackages(*filters, limit=limit)
+
+    names = index.Query(*filters, limit=limit)
+    return get_db().GetMetapackage(names) if names else []
+
+
+# update generation, rechecked periodically; used for cache
+# invalidation and conditional requests
+update_generation = UpdateGenerationTracker(
+    lambda: get_db().GetUpdateGeneration(),
+    check_interval=app.config['UPDATE_GENERATION_CHECK_INTERVAL']
+)
+
+# response cache
+response_cache = None
+
+if app.config['RESPONSE_CACHE_MEMCACHED']:
+    response_cache = ResponseCache(
+        MemcachedCache(app.config['RESPONSE_CACHE_MEMCACHED'], ttl=app.config['RESPONSE_CACHE_TTL']),
+        update_generation.GetGeneration
+    )
+elif app.config['RESPONSE_CACHE_SIZE']:
+    response_cache = ResponseCache(
+        LRUCache(app.config['RESPONSE_CACHE_SIZE'], ttl=app.config['RESPONSE_CACHE_TTL'], sizeof=lambda item: len(item[0])),
+        update_generation.GetGeneration
+    )
+
+# rendered graphs, keyed by latest history snapshot
+graph_cache = LRUCache(app.config['GRAPH_CACHE_SIZE']) if app.config['GRAPH_CACHE_SIZE'] else None
+
+# endpoints which output does not depend solely on update generation
+volatile_endpoints = set([
+    'static',
+    'metapackage_report',  # handles POST and flashes messages
+    'metapackage_packages',  # link statuses are updated by link checker
+    'metapackage_information',  # same
+    'runtime_stats',
+    'api_v1_export',  # served from files written by repology-update
+    'api_v1_export_generation',
+    'api_v1_metapackages_all_ndjson',  # redirect depends on export metadata
+])
+
+
+def is_read_only_request():
+    return flask.request.method in ('GET', 'HEAD') and flask.request.endpoint is not None and flask.request.endpoint not in volatile_endpoints
+
+
+def is_cacheable_request():
+    return response_cache is not None and flask.request.method == 'GET' and is_read_only_request()
+
+
+def get_response_cache_key():
+    return (
+        flask.request.endpoint,
+        tuple(sorted(flask.request.view_args.items())),
+        tuple(sorted(flask.request.args.items(multi=True)))
+    )
+
+
+def get_etag():
+    return hashlib.sha1('{} {}'.format(update_generation.GetGeneration(), flask.request.full_path).encode('utf-8')).hexdigest()
+
+
+def get_last_modified():
+    # HTTP dates have a resolution of one second
+    return update_generation.GetTimestamp().astimezone(datetime.timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+def is_not_modified():
+    if flask.request.if_none_match:
+        return flask.request.if_none_match.contains_weak(get_etag())
+
+    if flask.request.if_modified_since:
+        if_modified_since = flask.request.if_modified_since
+        if if_modified_since.tzinfo is not None:
+            if_modified_since = if_modified_since.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return get_last_modified() <= if_modified_since
+
+    return False
+
+
+def set_validators(response):
+    response.set_etag(get_etag())
+    response.last_modified = get_last_modified()
+
+
+@app.before_request
+def conditional_request():
+    if not is_read_only_request() or not is_not_modified():
+        return None
+
+    flask.g.not_modified = True
+
+    response = flask.Response(status=304)
+    set_validators(response)
+    return response
+
+
+@app.before_request
+def response_cache_lookup():
+    if not is_cacheable_request():
+        return None
+
+    cached = response_cache.Get(get_response_cache_key())
+    if cached is None:
+        return None
+
+    flask.g.response_cache_hit = True
+
+    data, status, headers = cached
+    return flask.Response(data, status=status, headers=headers)
+
+
+@app.after_request
+def response_cache_store(response):
+    if not is_cacheable_request() or flask.g.get('not_modified'):
+        return response
+
+    if flask.g.get('response_cache_hit'):
+        response.headers['X-Cache'] = 'HIT'
+        return response
+
+    if response.status_code == 200 and not response.is_streamed and 'Set-Cookie' not in response.headers:
+        response_cache.Set(
+            get_response_cache_key(),
+            (response.get_data(), response.status_code, list(response.headers.items()))
+        )
+
+    response.headers['X-Cache'] = 'MISS'
+    return response
+
+
+@app.after_request
+def conditional_response(response):
+    if is_read_only_request() and response.status_code == 200 and 'ETag' not in response.headers:
+        set_validators(response)
+
+    return response
+
+
+def get_graph_timestamp():
+    if 'graph_timestamp' not in flask.g:
+        flask.g.graph_timestamp = get_db().GetLatestHistoryTimestamp()
+    return flask.g.graph_timestamp
+
+
+def get_graph_version():
+    timestamp = get_graph_timestamp()
+    return int(timestamp.timestamp()) if timestamp is not None else None
+
+
+app.jinja_env.globals['graph_version'] = get_graph_version
+
+
+def graph_response(render):
+    """Produce SVG response, using graph cache if possible.
+
+    Graphs only change when new history snapshot is written, so they
+    are cached by (endpoint, arguments, snapshot) and, when requested
+    with current snapshot version in the url, are allowed to be cached
+    by clients for a long time.
+    """
+    version = get_graph_version()
+
+    key = (flask.request.endpoint, tuple(sorted(flask.request.view_args.items())), version)
+
+    data = graph_cache.Get(key) if graph_cache is not None else None
+
+    if data is None:
+        data = render(get_graph_timestamp())
+        if graph_cache is not None:
+            graph_cache.Set(key, data)
+
+    response = flask.Response(data, content_type='image/svg+xml')
 
-    # XXX: these tweaks should be implemented in core
-    if package.homepage:
-        output['www'] = [package.homepage]
-    if package.comment:
-        output['summary'] = package.comment
-    if package.category:
-        output['categories'] = [package.category]
+    if version is not None and flask.request.args.get('v') == str(version):
+        response.cache_control.public = True
+        response.cache_control.max_age = app.config['GRAPH_MAX_AGE']
 
-    return output
+    return response
 
 
+# helpers
 def api_v1_metapackages_generic(bound, *filters):
     metapackages = PackagesToMetapackages(
-        get_db().GetMetapackages(
+        get_metapackages(
             bound_to_filter(bound),
             *filters,
             limit=app.config['METAPACKAGES_PER_PAGE']
         )
     )
 
-    metapackages = {metapackage_name: list(map(api_v1_package_to_json, packageset)) for metapackage_name, packageset in metapackages.items()}
+    metapackages = {metapackage_name: list(map(PackageToApiV1Json, packageset)) for metapackage_name, packageset in metapackages.items()}
 
     return (
         json.dumps(metapackages),
@@ -213,7 +408,7 @@ def metapackages_generic(bound, *filters, template='metapackages.html', repo=Non
     searchfilter = NameSubstringQueryFilter(search) if search else None
 
     # get packages
-    packages = get_db().GetMetapackages(namefilter, InAnyRepoQueryFilter(reponames), searchfilter, *filters, limit=app.config['METAPACKAGES_PER_PAGE'])
+    packages = get_metapackages(namefilter, InAnyRepoQueryFilter(reponames), searchfilter, *filters, limit=app.config['METAPACKAGES_PER_PAGE'])
 
     # on empty result, fallback to show first, last set of results
     if not packages:
@@ -221,7 +416,7 @@ def metapackages_generic(bound, *filters, template='metapackages.html', repo=Non
             namefilter = NameStartingQueryFilter()
         else:
             namefilter = NameBeforeQueryFilter()
-        packages = get_db().GetMetapackages(namefilter, InAnyRepoQueryFilter(reponames), searchfilter, *filters, limit=app.config['METAPACKAGES_PER_PAGE'])
+        packages = get_metapackages(namefilter, InAnyRepoQueryFilter(reponames), searchfilter, *filters, limit=app.config['METAPACKAGES_PER_PAGE'])
 
     firstname, lastname = get_packages_name_range(packages)
 
@@ -535,7 +730,8 @@ def maintainers(bound=None):
 
     maintainers = get_db().GetMaintainers(bound, reverse, search, app.config['MAINTAINERS_PER_PAGE'])
 
-    firstpage, lastpage = False, False
+    # search results are a single page
+    firstpage, lastpage = bool(search), bool(search)
     for maintainer in maintainers:
         if maintainer['maintainer'] == minmaintainer:
             firstpage = True
@@ -761,52 +957,28 @@ def metapackage_report(name):
 
 @app.route('/badge/vertical-allrepos/<name>.svg')
 def badge_vertical_allrepos(name):
-    summaries = PackagesetToSummaries(get_db().GetMetapackage(name))
-
-    repostates = []
-    for reponame, summary in summaries.items():
-        repostates.append({
-            'name': repometadata[reponame]['desc'],
-            'version': summary['version'],
-            'versionclass': summary['versionclass']
-        })
-
     return (
-        flask.render_template(
-            'badge-vertical.svg',
-            repositories=sorted(repostates, key=lambda repo: repo['name']),
-            name=name
-        ),
+        badge_renderer.RenderVerticalAllRepos(name, get_db().GetMetapackage(name)),
         {'Content-type': 'image/svg+xml'}
     )
 
 
 @app.route('/badge/tiny-repos/<name>.svg')
 def badge_tiny_repos(name):
-    num_families = len(set([package.family for package in get_db().GetMetapackage(name)]))
     return (
-        flask.render_template(
-            'badge-tiny.svg',
-            name=name,
-            num_families=num_families
-        ),
+        badge_renderer.RenderTinyRepos(name, get_db().GetMetapackage(name)),
         {'Content-type': 'image/svg+xml'}
     )
 
 
 @app.route('/badge/version-for-repo/<repo>/<name>.svg')
 def badge_version_for_repo(repo, name):
-    summaries = PackagesetToSummaries(get_db().GetMetapackage(name))
-    if repo not in summaries:
+    badges = badge_renderer.RenderVersionForRepos(name, get_db().GetMetapackage(name), [repo])
+    if repo not in badges:
         flask.abort(404)
 
     return (
-        flask.render_template(
-            'badge-tiny-version.svg',
-            repo=repo,
-            version=summaries[repo]['version'],
-            versionclass=summaries[repo]['versionclass'],
-        ),
+        badges[repo],
         {'Content-type': 'image/svg+xml'}
     )
 
@@ -831,6 +1003,28 @@ def opensearch_maintainer():
     return flask.render_template('opensearch-maintainer.xml'), {'Content-type': 'application/xml'}
 
 
+@app.route('/opensearch/metapackage/suggest')
+def opensearch_metapackage_suggest():
+    search = flask.request.args.to_dict().get('search', '')
+    names = get_db().SearchMetapackages(search, app.config['SEARCH_SUGGESTIONS_LIMIT']) if search else []
+
+    return (
+        json.dumps([search, names]),
+        {'Content-type': 'application/x-suggestions+json'}
+    )
+
+
+@app.route('/opensearch/maintainer/suggest')
+def opensearch_maintainer_suggest():
+    search = flask.request.args.to_dict().get('search', '')
+    names = get_db().SearchMaintainers(search, app.config['SEARCH_SUGGESTIONS_LIMIT']) if search else []
+
+    return (
+        json.dumps([search, names]),
+        {'Content-type': 'application/x-suggestions+json'}
+    )
+
+
 @app.route('/statistics')
 @app.route('/statistics/<sorting>')
 def statistics(sorting=None):
@@ -871,38 +1065,44 @@ def graph_generic(getgraph, color, suffix=''):
     gheight = height - 20
     period = 60 * 60 * 24 * numdays
 
-    graph = getgraph(period)
+    def Render(reference):
+        # there's no use in more than one point per pixel
+        graph = getgraph(period, period / gwidth, reference)
 
-    return (
-        flask.render_template(
+        return flask.render_template(
             'graph.svg',
             width=width,
             height=height,
             gwidth=gwidth,
             gheight=gheight,
-            points=graph.GetPoints(period),
+            points=graph.GetPoints(period, maxpoints=gwidth),
             yticks=graph.GetYTicks(suffix),
             color=color,
             numdays=numdays,
             x=lambda x: int((1.0 - x) * gwidth) + 0.5,
             y=lambda y: int(10.0 + (1.0 - y) * (gheight - 20.0)) + 0.5,
-        ),
-        {'Content-type': 'image/svg+xml'}
-    )
+        )
+
+    return graph_response(Render)
 
 
 def graph_repo_generic(repo, getvalue, color, suffix=''):
     if repo not in reponames:
         flask.abort(404)
 
-    def GetGraph(period):
-        graph = GraphProcessor()
+    def GetGraph(period, resolution, reference):
+        times = []
+        values = []
 
-        for histentry in get_db().GetRepositoriesHistoryPeriod(period, repo):
+        for histentry in get_db().GetRepositoriesHistoryPeriod(period, repo, resolution, reference):
             try:
-                graph.AddPoint(histentry['timedelta'], getvalue(histentry['snapshot']))
+                values.append(getvalue(histentry['snapshot']))
             except:
-                pass  # ignore missing keys, division errors etc.
+                continue  # ignore missing keys, division errors etc.
+            times.append(histentry['timedelta'])
+
+        graph = GraphProcessor()
+        graph.AddPoints(times, values)
 
         return graph
 
@@ -910,14 +1110,19 @@ def graph_repo_generic(repo, getvalue, color, suffix=''):
 
 
 def graph_total_generic(getvalue, color, suffix=''):
-    def GetGraph(period):
-        graph = GraphProcessor()
+    def GetGraph(period, resolution, reference):
+        times = []
+        values = []
 
-        for histentry in get_db().GetStatisticsHistoryPeriod(period):
+        for histentry in get_db().GetStatisticsHistoryPeriod(period, resolution, reference):
             try:
-                graph.AddPoint(histentry['timedelta'], getvalue(histentry['snapshot']))
+                values.append(getvalue(histentry['snapshot']))
             except:
-                pass  # ignore missing keys, division errors etc.
+                continue  # ignore missing keys, division errors etc.
+            times.append(histentry['timedelta'])
+
+        graph = GraphProcessor()
+        graph.AddPoints(times, values)
 
         return graph
 
@@ -1008,30 +1213,30 @@ def clever_ceil(value):
 
 
 def map_repo_generic(repo2coords, namex='X', namey='Y', unitx='', unity=''):
-    snapshots = [
-        #get_db().GetRepositoriesHistoryAgo(60 * 60 * 24 * 30)
-    ]
+    def Render(reference):
+        snapshots = [
+            #get_db().GetRepositoriesHistoryAgo(60 * 60 * 24 * 30)
+        ]
 
-    points = []
-    for repo in get_db().GetRepositories():
-        if not repo['name'] in reponames:
-            continue
+        points = []
+        for repo in get_db().GetRepositories():
+            if not repo['name'] in reponames:
+                continue
 
-        point = {
-            'text': repometadata[repo['name']]['desc'],
-            'coords': list(map(repo2coords, [repo] + [snapshot[repo['name']] for snapshot in snapshots if repo['name'] in snapshot]))
-        }
+            point = {
+                'text': repometadata[repo['name']]['desc'],
+                'coords': list(map(repo2coords, [repo] + [snapshot[repo['name']] for snapshot in snapshots if repo['name'] in snapshot]))
+            }
 
-        if 'color' in repometadata[repo['name']]:
-            point['color'] = repometadata[repo['name']]['color']
+            if 'color' in repometadata[repo['name']]:
+                point['color'] = repometadata[repo['name']]['color']
 
-        points.append(point)
+            points.append(point)
 
-    width = 1140
-    height = 800
+        width = 1140
+        height = 800
 
-    return (
-        flask.render_template(
+        return flask.render_template(
             'map.svg',
             width=width,
             height=height,
@@ -1044,9 +1249,11 @@ def map_repo_generic(repo2coords, namex='X', namey='Y', unitx='', unity=''):
             unitx=unitx,
             unity=unity,
             points=points,
-        ),
-        {'Content-type': 'image/svg+xml'}
-    )
+        )
+
+    # repositories table is updated in the same transaction as history
+    # snapshot is taken, so the map only changes along with graphs
+    return graph_response(Render)
 
 
 @app.route('/graph/map_repo_size_fresh.svg')
@@ -1080,21 +1287,107 @@ def graph_map_repo_size_freshness():
     )
 
 
+@app.route('/runtime-stats')
+def runtime_stats():
+    stats = {}
+
+    if response_cache is not None:
+        stats['response_cache'] = response_cache.GetStats()
+
+    if database_pool is not None:
+        stats['database_pool'] = database_pool.GetStats()
+
+    if graph_cache is not None:
+        stats['graph_cache'] = {'size': len(graph_cache)}
+
+    return (
+        json.dumps(stats),
+        {'Content-type': 'application/json'}
+    )
+
+
 @app.route('/api/v1/metapackage/<name>')
 def api_v1_metapackage(name):
     return (
         json.dumps(list(map(
-            api_v1_package_to_json,
+            PackageToApiV1Json,
             get_db().GetMetapackage(name)
         ))),
         {'Content-type': 'application/json'}
     )
 
 
+def get_export_data_url():
+    if not app.config['EXPORT_DIR']:
+        flask.abort(404)
+
+    meta = LoadExportMeta(app.config['EXPORT_DIR'])
+    if meta is None:
+        flask.abort(404)
+
+    return flask.url_for('api_v1_export_generation', generation=meta['generation'])
+
+
+@app.route('/api/v1/metapackages/all.ndjson')
+def api_v1_metapackages_all_ndjson():
+    # served from pregenerated dump instead of reading all packages
+    # from the database for each request
+    return flask.redirect(get_export_data_url())
+
+
+@app.route('/api/v1/export/<any("{}", "{}"):filename>'.format(EXPORT_DATA_FILE, EXPORT_META_FILE))
+def api_v1_export(filename):
+    if filename == EXPORT_DATA_FILE:
+        # data file of each generation has its own name, so that
+        # it always matches checksum in metadata
+        return flask.redirect(get_export_data_url())
+
+    if not app.config['EXPORT_DIR']:
+        flask.abort(404)
+
+    return flask.send_from_directory(app.config['EXPORT_DIR'], filename, cache_timeout=60)
+
+
+@app.route('/api/v1/export/metapackages-<int:generation>.ndjson.gz')
+def api_v1_export_generation(generation):
+    if not app.config['EXPORT_DIR']:
+        flask.abort(404)
+
+    # contents of generation file never change
+    return flask.send_from_directory(app.config['EXPORT_DIR'], GetExportDataFileName(generation), cache_timeout=60 * 60 * 24)
+
+
+@app.route('/api/v1/metapackages/batch', methods=['POST'])
+def api_v1_metapackages_batch():
+    # accepts either JSON list of names or form-encoded names
+    names = flask.request.get_json(silent=True)
+    if names is None:
+        names = flask.request.form.getlist('name')
+
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        flask.abort(400)
+
+    if len(names) > app.config['API_BATCH_MAX_NAMES']:
+        flask.abort(413)
+
+    names = list(OrderedDict.fromkeys(names))
+
+    metapackages = PackagesToMetapackages(get_db().GetMetapackage(names)) if names else {}
+
+    # number of names is limited, so result is just built in memory
+    return (
+        json.dumps(OrderedDict(
+            (name, list(map(PackageToApiV1Json, metapackages.get(name, []))))
+            for name in names
+        )),
+        {'Content-type': 'application/json'}
+    )
+
+
 @app.route('/api')
 @app.route('/api/v1')
 def api_v1():
-    return flask.render_template('api.html', per_page=app.config['METAPACKAGES_PER_PAGE'])
+    return flask.render_template('api.html', per_page=app.config['METAPACKAGES_PER_PAGE'], batch_max_names=app.config['API_BATCH_MAX_NAMES'])
 
 
 @app.route('/api/v1/metapackages/')
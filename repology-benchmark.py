@@ -18,12 +18,19 @@
 # along with repology.  If not, see <http://www.gnu.org/licenses/>.
 
 import argparse
+import datetime
 import os
+import random
 import sys
+from collections import Counter
 from timeit import default_timer as timer
 
 import repology.config
 from repology.database import *
+from repology.graphprocessor import GraphProcessor
+from repology.linkchecker.benchmark import RunAsyncBenchmark, RunSyncBenchmark, SyntheticWeb
+from repology.linkchecker.scheduler import GetUrlHost
+from repology.metapackageindex import LoadMetapackageIndex
 from repology.queryfilters import *
 
 
@@ -66,6 +73,19 @@ class StatCounter():
         print('Metapackages: {}/{:.0f}/{}'.format(self.min_metapackages, self.total_metapackages / self.count, self.max_metapackages))
 
 
+class IndexedDatabase:
+    def __init__(self, database, index):
+        self.database = database
+        self.index = index
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+    def GetMetapackages(self, *filters, limit=500):
+        names = self.index.Query(*filters, limit=limit)
+        return self.database.GetMetapackage(names) if names else []
+
+
 def RunTest(database, title, pagefilter, *filters):
     print('===> ' + title)
 
@@ -84,13 +104,122 @@ def RunTest(database, title, pagefilter, *filters):
     sc.Print()
 
 
+def RunSearchTest(database, title, method, queries):
+    print('===> ' + title)
+
+    times = []
+    for query in queries:
+        start = timer()
+        method(query)
+        times.append(timer() - start)
+
+    print('        Time: {:.2f}ms/{:.2f}ms/{:.2f}ms'.format(min(times) * 1000.0, sum(times) / len(times) * 1000.0, max(times) * 1000.0))
+
+
+def GetMaintainersSubstring(database, search, limit=500):
+    # plain LIKE scan which maintainer search used before the ranked
+    # trigram search, kept for comparison
+    database.cursor.execute(
+        """
+        SELECT
+            maintainer,
+            num_packages,
+            num_packages_outdated
+        FROM maintainers
+        WHERE maintainer LIKE %s
+        ORDER BY maintainer
+        LIMIT %s
+        """,
+        ('%' + search + '%', limit)
+    )
+
+    return database.cursor.fetchall()
+
+
+def RunGraphTest(title, times, values, maxpoints=1090):
+    print('===> ' + title)
+
+    period = max(times).total_seconds()
+
+    start = timer()
+    graph = GraphProcessor()
+    graph.AddPoints(times, values)
+    points = graph.GetPoints(period, maxpoints=maxpoints)
+    graph.GetYTicks()
+
+    print('        Time: {:.2f}ms, {} -> {} points'.format((timer() - start) * 1000.0, len(times), len(points)))
+
+
+def RunGraphTests(numpoints):
+    rnd = random.Random(0)
+
+    # history is fetched in reverse chronological order
+    times = [datetime.timedelta(seconds=numpoints - n) for n in range(numpoints)]
+
+    values = []
+    value = 10000
+    for n in range(numpoints):
+        value += rnd.randint(-5, 5)
+        values.append(value)
+
+    RunGraphTest('Random walk', times, values)
+    RunGraphTest('Random walk (percent)', times, [value / 100.0 for value in values])
+    RunGraphTest('Mostly constant', times, [n // (numpoints // 10) for n in range(numpoints)])
+
+
+def RunLinkCheckerTests(options):
+    with SyntheticWeb(numhosts=options.hosts, numlinks=options.links, latency=options.latency, hang_time=options.timeout * 2) as web:
+        links = web.GetLinks()
+
+        print('        {} links on {} hosts, largest host has {} links'.format(
+            len(links),
+            options.hosts,
+            max(Counter(GetUrlHost(link[0]) for link in links).values())
+        ))
+
+        if options.engine in ['async', 'both']:
+            print('===> Async engine (concurrency {}, delay {}s)'.format(options.concurrency, options.delay))
+            RunAsyncBenchmark(links, timeout=options.timeout, delay=options.delay, concurrency=options.concurrency).Print()
+
+        if options.engine in ['sync', 'both']:
+            print('===> Sync engine ({} jobs, pack size {}, delay {}s)'.format(options.jobs, options.packsize, options.delay))
+            RunSyncBenchmark(links, timeout=options.timeout, delay=options.delay, jobs=options.jobs, packsize=options.packsize).Print()
+
+
 def Main():
     parser = argparse.ArgumentParser()
     parser.add_argument('-D', '--dsn', default=repology.config.DSN, help='database connection params')
+    parser.add_argument('-I', '--metapackage-index', help='path to metapackage index snapshot to use instead of SQL filtering')
+    parser.add_argument('-g', '--graph', type=int, metavar='POINTS', help='only benchmark graph processing of given number of points (does not need database)')
+    parser.add_argument('-L', '--linkchecker', action='store_true', help='only benchmark link checker against local synthetic web (does not need database)')
+
+    group = parser.add_argument_group('link checker benchmark')
+    group.add_argument('--hosts', type=int, default=100, help='number of synthetic hosts')
+    group.add_argument('--links', type=int, default=1000, help='number of synthetic links')
+    group.add_argument('--latency', type=float, default=0.05, help='average response latency of a host in seconds')
+    group.add_argument('--engine', choices=['async', 'sync', 'both'], default='both', help='link checking engine to benchmark')
+    group.add_argument('--timeout', type=float, default=2.0, help='timeout for link requests in seconds')
+    group.add_argument('--delay', type=float, default=0.1, help='delay between requests to one host')
+    group.add_argument('--concurrency', type=int, default=1000, help='max number of concurrent requests (async engine)')
+    group.add_argument('--jobs', type=int, default=1, help='number of parallel jobs (sync engine)')
+    group.add_argument('--packsize', type=int, default=128, help='pack size for link processing (sync engine)')
     options = parser.parse_args()
 
+    if options.graph:
+        print('==> Graphs')
+        RunGraphTests(options.graph)
+        return 0
+
+    if options.linkchecker:
+        print('==> Link checker')
+        RunLinkCheckerTests(options)
+        return 0
+
     database = Database(options.dsn)
 
+    if options.metapackage_index:
+        database = IndexedDatabase(database, LoadMetapackageIndex(options.metapackage_index))
+
     print('==> Core requests')
 
     RunTest(database, 'No filter (pagination only): starting', NameStartingQueryFilter)
@@ -109,6 +238,28 @@ def Main():
     RunTest(database, 'InRepo + Maintainer', NameStartingQueryFilter, InRepoQueryFilter('freebsd'), MaintainerQueryFilter('amdmi3@freebsd.org'))
 
     RunTest(database, 'NotInRepo + NumFamilies', NameStartingQueryFilter, NotInRepoQueryFilter('freebsd'), InNumFamiliesQueryFilter(more=5))
+    RunTest(database, 'NumFamilies + NotInRepo', NameStartingQueryFilter, InNumFamiliesQueryFilter(more=5), NotInRepoQueryFilter('freebsd'))
+
+    RunTest(database, 'NumFamilies + Outdated', NameStartingQueryFilter, InNumFamiliesQueryFilter(more=5), OutdatedInRepoQueryFilter('freebsd'))
+    RunTest(database, 'Outdated + NumFamilies', NameStartingQueryFilter, OutdatedInRepoQueryFilter('freebsd'), InNumFamiliesQueryFilter(more=5))
+
+    print('==> Search')
+
+    queries = ['a', 'x', 'py', 'lib', 'gtk', 'firefox', 'python', 'nonexistent']
+
+    RunTest(database, 'Metapackages substring', NameStartingQueryFilter, NameSubstringQueryFilter('lib'))
+    RunSearchTest(database, 'Metapackages ranked search', lambda query: database.SearchMetapackages(query, 20), queries)
+    RunSearchTest(database, 'Maintainers substring', lambda query: GetMaintainersSubstring(database, query, limit=500), queries)
+    RunSearchTest(database, 'Maintainers listing search', lambda query: database.GetMaintainers(search=query, limit=500), queries)
+    RunSearchTest(database, 'Maintainers ranked search', lambda query: database.SearchMaintainers(query, 20), queries)
+
+    print('==> Batch lookup')
+
+    names = sorted(set(package.effname for package in database.GetMetapackages(NameStartingQueryFilter(), limit=500)))
+    batches = [names[:10], names[:100], names]
+
+    RunSearchTest(database, 'Metapackages one by one ({} names)'.format(len(names)), lambda batch: [database.GetMetapackage(name) for name in batch], [names])
+    RunSearchTest(database, 'Metapackages batch (10/100/{} names)'.format(len(names)), lambda batch: database.GetMetapackage(batch), batches)
 
     return 0
 
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import gzip
+import io
+import os
+from timeit import default_timer as timer
+
+import repology.config
+from repology.badges import BadgeRenderer, CreateBadgeEnvironment
+from repology.database import Database
+from repology.logger import *
+from repology.metapackageproc import PackagesToMetapackages
+from repology.queryfilters import NameAfterQueryFilter
+from repology.repoman import RepositoryManager
+
+
+class BadgeWriter:
+    def __init__(self, outdir):
+        self.outdir = outdir
+        self.paths = set()
+
+        self.num_written = 0
+        self.num_unchanged = 0
+        self.num_removed = 0
+
+    def __WriteFile(self, path, data):
+        try:
+            with open(path, 'rb') as infile:
+                if infile.read() == data:
+                    return False
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmppath = path + '.tmp'
+        with open(tmppath, 'wb') as outfile:
+            outfile.write(data)
+        os.replace(tmppath, path)
+
+        return True
+
+    def Write(self, relpath, text):
+        path = os.path.join(self.outdir, relpath)
+        data = text.encode('utf-8')
+
+        # fixed mtime makes compressed output reproducible,
+        # so unchanged badges are not rewritten
+        compressed = io.BytesIO()
+        with gzip.GzipFile(fileobj=compressed, mode='wb', compresslevel=9, mtime=0) as gzfile:
+            gzfile.write(data)
+
+        self.paths.add(path)
+        self.paths.add(path + '.gz')
+
+        if self.__WriteFile(path, data) | self.__WriteFile(path + '.gz', compressed.getvalue()):
+            self.num_written += 1
+        else:
+            self.num_unchanged += 1
+
+    def RemoveStale(self):
+        for root, dirs, files in os.walk(os.path.join(self.outdir, 'badge'), topdown=False):
+            for filename in files:
+                path = os.path.join(root, filename)
+                if path not in self.paths:
+                    os.remove(path)
+                    self.num_removed += 1
+
+            if not os.listdir(root):
+                os.rmdir(root)
+
+
+def IsSafeName(name):
+    return '/' not in name and not name.startswith('.')
+
+
+def Main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-D', '--dsn', default=repology.config.DSN, help='database connection params')
+    parser.add_argument('-E', '--repos-dir', default=repology.config.REPOS_DIR, help='path to directory with repository configs')
+    parser.add_argument('-w', '--www-home', default=repology.config.REPOLOGY_HOME, help='repology www home')
+    parser.add_argument('-L', '--logfile', help='path to log file (log to stderr by default)')
+    parser.add_argument('-o', '--outdir', default='_badges', help='path to output directory')
+    parser.add_argument('-b', '--batch-size', type=int, default=1000, help='number of metapackages to fetch from database at once')
+    parser.add_argument('-r', '--remove-stale', action='store_true', help='remove badges for metapackages which no longer exist')
+    options = parser.parse_args()
+
+    logger = StderrLogger()
+    if options.logfile:
+        logger = FileLogger(options.logfile)
+
+    repometadata = RepositoryManager(options.repos_dir, 'dummy').GetMetadata(repology.config.REPOSITORIES)
+    renderer = BadgeRenderer(CreateBadgeEnvironment(repometadata, options.www_home), repometadata)
+
+    database = Database(options.dsn, readonly=True)
+    writer = BadgeWriter(options.outdir)
+
+    start = timer()
+    num_metapackages = 0
+
+    logger.Log('generating badges')
+
+    lastname = None
+    while True:
+        metapackages = PackagesToMetapackages(database.GetMetapackages(NameAfterQueryFilter(lastname), limit=options.batch_size))
+        if not metapackages:
+            break
+
+        for name, packages in metapackages.items():
+            if not IsSafeName(name):
+                continue
+
+            writer.Write(os.path.join('badge', 'vertical-allrepos', name + '.svg'), renderer.RenderVerticalAllRepos(name, packages))
+            writer.Write(os.path.join('badge', 'tiny-repos', name + '.svg'), renderer.RenderTinyRepos(name, packages))
+
+            for repo, badge in renderer.RenderVersionForRepos(name, packages).items():
+                writer.Write(os.path.join('badge', 'version-for-repo', repo, name + '.svg'), badge)
+
+        num_metapackages += len(metapackages)
+        lastname = max(metapackages.keys())
+
+        logger.GetIndented().Log('processed {} metapackages'.format(num_metapackages))
+
+    if options.remove_stale:
+        logger.Log('removing stale badges')
+        writer.RemoveStale()
+
+    logger.Log('{} badges written, {} unchanged, {} removed'.format(writer.num_written, writer.num_unchanged, writer.num_removed))
+    logger.Log('total time taken: {:.2f} seconds'.format((timer() - start)))
+
+    return 0
+
+
+if __name__ == '__main__':
+    os.sys.exit(Main())
@@ -18,110 +18,95 @@
 # along with repology.  If not, see <http://www.gnu.org/licenses/>.
 
 import argparse
+import asyncio
 import multiprocessing
 import os
-import re
-import socket
-import time
-import urllib.parse
-
-import requests
+import signal
 
 import repology.config
 from repology.database import Database
+from repology.linkchecker.blocking import GetLinkStatuses
+from repology.linkchecker.checkpoint import GetSelection, LinkCheckRun
+from repology.linkchecker.common import LinkCheckStats
+from repology.linkchecker.engine import AsyncLinkChecker
+from repology.linkchecker.resolver import DNSCache
+from repology.linkchecker.scheduler import DistributeLinks, HostScheduler
+from repology.linkchecker.writer import LinkStatusWriter
 from repology.logger import FileLogger, StderrLogger
 
 
-def GetHTTPLinkStatus(url, timeout):
-    try:
-        response = requests.head(url, allow_redirects=True, headers={'user-agent': 'Repology link checker/0'}, timeout=timeout)
-
-        # fallback to GET
-        if response.status_code != 200:
-            response = requests.get(url, allow_redirects=True, headers={'user-agent': 'Repology link checker/0'}, timeout=timeout)
-
-        redirect = None
-        size = None
-        location = None
-
-        # handle redirect chain
-        if response.history:
-            redirect = response.history[0].status_code
-
-            # resolve permanent (and only permament!) redirect chain
-            for h in response.history:
-                if h.status_code == 301:
-                    location = urllib.parse.urljoin(h.url, h.headers.get('location'))
-
-        # handle size
-        if response.status_code == 200:
-            content_length = response.headers.get('content-length')
-            if content_length:
-                size = int(content_length)
-
-        return (url, response.status_code, redirect, size, location)
-    except KeyboardInterrupt:
-        raise
-    except requests.Timeout:
-        return (url, Database.linkcheck_status_timeout, None, None, None)
-    except requests.TooManyRedirects:
-        return (url, Database.linkcheck_status_too_many_redirects, None, None, None)
-    except requests.ConnectionError:
-        # check for DNS error additionally
-        try:
-            parsed = urllib.parse.urlparse(url)
-            socket.gethostbyname(parsed.hostname)
-        except socket.gaierror:
-            return (url, Database.linkcheck_status_dns_error, None, None, None)
-        except:
-            pass
-        return (url, Database.linkcheck_status_cannot_connect, None, None, None)
-    except requests.exceptions.InvalidURL:
-        return (url, Database.linkcheck_status_invalid_url, None, None, None)
-    except:
-        return (url, Database.linkcheck_status_unknown_error, None, None, None)
+def Terminate(signum, frame):
+    # let writers flush results gathered so far
+    raise SystemExit('terminated by signal {}'.format(signum))
 
 
-def GetLinkStatuses(urls, delay, timeout):
-    results = []
-    prev_host = None
-    for url in urls:
-        # XXX: add support for gentoo mirrors, skip for now
-        if not url.startswith('http://') and not url.startswith('https://'):
-            continue
+def LinkProcessorWorker(queue, workerid, options, logger):
+    signal.signal(signal.SIGTERM, Terminate)
+
+    database = Database(options.dsn, readonly=False)
 
-        host = urllib.parse.urlparse(url).hostname
+    logger = logger.GetPrefixed('worker{}: '.format(workerid))
 
-        if host and host == prev_host:
-            time.sleep(delay)
+    logger.Log('Worker spawned')
 
-        results.append(GetHTTPLinkStatus(url, timeout))
+    # hosts are sharded between workers, so host rate limits only
+    # need to be enforced within a worker
+    scheduler = HostScheduler(options.delay)
+    stats = LinkCheckStats()
+    dns_cache = DNSCache()
 
-        prev_host = host
+    with LinkStatusWriter(database, options.flush_size, options.flush_interval, logger, clear_inflight=True, update_metapackages=True) as writer:
+        while True:
+            pack = queue.get()
+            if pack is None:
+                break
 
-    return results
+            logger.Log('Processing {} urls'.format(len(pack)))
+            for result in GetLinkStatuses(pack, delay=options.delay, timeout=options.timeout, stats=stats, scheduler=scheduler, dns_cache=dns_cache):
+                writer.Add(result)
 
+            logger.Log('Done processing {} urls: {}; busiest hosts: {}'.format(len(pack), stats, scheduler.GetHostStatsString()))
 
-def LinkProcessorWorker(queue, workerid, options, logger):
+    logger.Log('Worker exiting: {}; {}'.format(writer.GetStats(), dns_cache))
+
+
+def LinkProcessorAsync(urls, options, logger):
     database = Database(options.dsn, readonly=False)
 
-    logger = logger.GetPrefixed('worker{}: '.format(workerid))
+    logger = logger.GetPrefixed('checker: ')
+
+    checker = AsyncLinkChecker(timeout=options.timeout, delay=options.delay, concurrency=options.concurrency, logger=logger)
+
+    with LinkStatusWriter(database, options.flush_size, options.flush_interval, logger, clear_inflight=True, update_metapackages=True) as writer:
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(checker.Run(urls, writer.Add))
+        finally:
+            loop.close()
+
+    logger.Log('Done: {}; {}; {}'.format(checker.stats, writer.GetStats(), checker.dns_cache))
 
-    logger.Log('Worker spawned')
 
-    while True:
-        pack = queue.get()
-        if pack is None:
-            logger.Log('Worker exiting')
-            return
+def GetSelectionArgs(options):
+    return {
+        'prefix': options.prefix,
+        'recheck_age': options.age * 60 * 60 * 24 if options.age is not None else None,
+        'unchecked_only': options.unchecked,
+        'checked_only': options.checked,
+        'failed_only': options.failed,
+        'succeeded_only': options.succeeded,
+    }
 
-        logger.Log('Processing {} urls ({}..{})'.format(len(pack), pack[0], pack[-1]))
-        for result in GetLinkStatuses(pack, delay=options.delay, timeout=options.timeout):
-            url, status, redirect, size, location = result
-            database.UpdateLinkStatus(url=url, status=status, redirect=redirect, size=size, location=location)
 
-        database.Commit()
-        logger.Log('Done processing {} urls ({}..{})'.format(len(pack), pack[0], pack[-1]))
+def IterLinksForCheck(database, options, logger, checked_before):
+    logger.Log('Requesting urls')
+
+    num_urls = 0
+    for url in database.StreamLinksForCheck(checked_before=checked_before, **GetSelectionArgs(options)):
+        yield url
+        num_urls += 1
+
+    logger.Log('Enqueued {} urls'.format(num_urls))
 
 
 def Main():
@@ -131,79 +116,65 @@ def Main():
 
     parser.add_argument('--timeout', type=float, default=60.0, help='timeout for link requests in seconds')
     parser.add_argument('--delay', type=float, default=3.0, help='delay between requests to one host')
-    parser.add_argument('--age', type=int, default=0, help='min age for recheck in days')
-    parser.add_argument('--packsize', type=int, default=128, help='pack size for link processing')
-    parser.add_argument('--maxpacksize', type=int, help='max pack size for link processing (useful to skip large hosts)')
-    parser.add_argument('--jobs', type=int, default=1, help='number of parallel jobs')
+    parser.add_argument('--age', type=int, help='min age for recheck in days (by default, links are rechecked adaptively based on their history)')
+    parser.add_argument('--packsize', type=int, default=128, help='pack size for link processing (sync engine)')
+    parser.add_argument('--jobs', type=int, default=1, help='number of parallel jobs (sync engine)')
+    parser.add_argument('--engine', choices=['async', 'sync'], default='async', help='link checking engine: single process asyncio or multiprocess blocking requests')
+    parser.add_argument('--concurrency', type=int, default=1000, help='max number of concurrent requests (async engine)')
+    parser.add_argument('--flush-size', type=int, default=1000, help='max number of link statuses to buffer before writing them to the database')
+    parser.add_argument('--flush-interval', type=float, default=10.0, help='max time in seconds to buffer link statuses before writing them to the database')
 
     parser.add_argument('--unchecked', action='store_true', help='only process unchecked (newly discovered) links')
     parser.add_argument('--checked', action='store_true', help='only process old (already checked) links')
     parser.add_argument('--failed', action='store_true', help='only process links that were checked and failed')
-    parser.add_argument('--succeeded', action='store_true', help='only process links that were checked and failed')
+    parser.add_argument('--succeeded', action='store_true', help='only process links that were checked and succeeded')
     parser.add_argument('--prefix', help='only process links with specified prefix')
+
+    parser.add_argument('--resume', action='store_true', help='resume interrupted run with the same selection of links instead of starting over')
     options = parser.parse_args()
 
+    signal.signal(signal.SIGTERM, Terminate)
+
     logger = FileLogger(options.logfile) if options.logfile else StderrLogger()
-    database = Database(options.dsn, readonly=True, autocommit=True)
-
-    queue = multiprocessing.Queue(1)
-    processpool = [multiprocessing.Process(target=LinkProcessorWorker, args=(queue, i, options, logger)) for i in range(options.jobs)]
-    for process in processpool:
-        process.start()
-
-    # base logger already passed to workers, may append prefix here
-    logger = logger.GetPrefixed('master: ')
-
-    prev_url = None
-    while True:
-        # Get pack of links
-        logger.Log('Requesting pack of urls')
-        urls = database.GetLinksForCheck(
-            after=prev_url,
-            prefix=options.prefix,  # no limit by default
-            limit=options.packsize,
-            recheck_age=options.age * 60 * 60 * 24,
-            unchecked_only=options.unchecked,
-            checked_only=options.checked,
-            failed_only=options.failed,
-            succeeded_only=options.succeeded
-        )
-        if not urls:
-            logger.Log('  No more urls to process')
-            break
-
-        # Get another pack of urls with the last hostname to ensure
-        # that all urls for one hostname get into a same large pack
-        match = re.match('([a-z]+://[^/]+/)', urls[-1])
-        if match:
-            urls += database.GetLinksForCheck(
-                after=urls[-1],
-                prefix=match.group(1),
-                recheck_age=options.age * 60 * 60 * 24,
-                unchecked_only=options.unchecked,
-                checked_only=options.checked,
-                failed_only=options.failed,
-                succeeded_only=options.succeeded
-            )
-
-        # Process
-        if options.maxpacksize and len(urls) > options.maxpacksize:
-            logger.Log('Skipping {} urls ({}..{}), exceeds max pack size'.format(len(urls), urls[0], urls[-1]))
-        else:
-            queue.put(urls)
-            logger.Log('Enqueued {} urls ({}..{})'.format(len(urls), urls[0], urls[-1]))
-
-        prev_url = urls[-1]
-
-    logger.Log('Waiting for child processes to exit')
-
-    for process in processpool:
-        queue.put(None)
-
-    for process in processpool:
-        process.join()
-
-    logger.Log('Done')
+    database = Database(options.dsn, readonly=False, autocommit=True)
+
+    # base logger is passed to workers, which append their own prefix
+    master_logger = logger.GetPrefixed('master: ')
+
+    run = LinkCheckRun(database, GetSelection(**GetSelectionArgs(options)), logger=master_logger)
+    run.Start(options.resume)
+
+    urls = run.IterUrls(IterLinksForCheck(database, options, master_logger, run.started))
+
+    if options.engine == 'async':
+        LinkProcessorAsync(urls, options, logger)
+    else:
+        # each worker has its own queue, as all urls of a host must go
+        # to the same worker; queues are unbounded, so a worker busy
+        # with a large host doesn't hold back others
+        queues = [multiprocessing.Queue() for i in range(options.jobs)]
+        processpool = [multiprocessing.Process(target=LinkProcessorWorker, args=(queues[i], i, options, logger)) for i in range(options.jobs)]
+        for process in processpool:
+            process.start()
+
+        DistributeLinks(urls, queues, options.packsize)
+
+        master_logger.Log('Waiting for child processes to exit')
+
+        for queue in queues:
+            queue.put(None)
+
+        for process in processpool:
+            process.join()
+
+        # results of failed workers are lost, so the run may be resumed
+        if any(process.exitcode != 0 for process in processpool):
+            master_logger.Log('Some workers have failed, run may be resumed with --resume')
+            return 1
+
+    run.Finish()
+
+    master_logger.Log('Done')
 
     return 0
 
@@ -25,8 +25,13 @@ from timeit import default_timer as timer
 
 import repology.config
 from repology.database import Database
+from repology.export import MetapackagesExportWriter
+from repology.linkextractor import LinkExtractor
 from repology.logger import *
+from repology.metapackageindex import MetapackageIndex
+from repology.minhash import FindSimilarSets
 from repology.packageproc import FillPackagesetVersions
+from repology.relatedclusters import RelatedClusterer
 from repology.repoman import RepositoryManager
 from repology.transformer import PackageTransformer
 
@@ -79,6 +84,17 @@ def ProcessDatabase(options, logger, repoman, repositories_updated):
         db_logger.Log('committing changes')
         database.Commit()
 
+    if options.migrate_history:
+        db_logger.Log('migrating repository history')
+        num_migrated = database.MigrateRepositoryHistory()
+        if num_migrated is None:
+            db_logger.GetIndented().Log('no legacy history found')
+        else:
+            db_logger.GetIndented().Log('{} rows migrated; legacy repositories_history table may now be dropped'.format(num_migrated))
+
+        db_logger.Log('committing changes')
+        database.Commit()
+
     if options.database:
         db_logger.Log('clearing the database')
         database.Clear()
@@ -86,38 +102,79 @@ def ProcessDatabase(options, logger, repoman, repositories_updated):
         package_queue = []
         num_pushed = 0
 
-        def PackageProcessor(packageset):
-            nonlocal package_queue, num_pushed
-            FillPackagesetVersions(packageset)
-            package_queue.extend(packageset)
-
-            if len(package_queue) >= 10000:
-                database.AddPackages(package_queue)
-                num_pushed += len(package_queue)
-                package_queue = []
-                db_logger.Log('  pushed {} packages'.format(num_pushed))
-
-        db_logger.Log('pushing packages to database')
-        repoman.StreamDeserializeMulti(processor=PackageProcessor, reponames=options.reponames)
+        clusterer = RelatedClusterer(repology.config.RELATED_MAX_URL_METAPACKAGES, repology.config.RELATED_HUB_URLS)
+        link_extractor = LinkExtractor()
 
-        # process what's left in the queue
-        database.AddPackages(package_queue)
+        export_writer = MetapackagesExportWriter(options.export_dir) if options.export_dir else None
 
-        if options.fetch and options.update and options.parse:
-            db_logger.Log('recording repo updates')
-            database.MarkRepositoriesUpdated(repositories_updated)
-        else:
-            db_logger.Log('not recording repo updates, need --fetch --update --parse')
-
-        db_logger.Log('updating views')
-        database.UpdateViews()
-        database.ExtractLinks()
-
-        db_logger.Log('updating history')
-        database.SnapshotHistory()
-
-        db_logger.Log('committing changes')
-        database.Commit()
+        try:
+            def PackageProcessor(packageset):
+                nonlocal package_queue, num_pushed
+                FillPackagesetVersions(packageset)
+                clusterer.AddPackages(packageset)
+                link_extractor.AddPackages(packageset)
+                if export_writer:
+                    export_writer.AddPackageset(packageset)
+                package_queue.extend(packageset)
+
+                if len(package_queue) >= 10000:
+                    database.AddPackages(package_queue)
+                    num_pushed += len(package_queue)
+                    package_queue = []
+                    db_logger.Log('  pushed {} packages'.format(num_pushed))
+
+            db_logger.Log('pushing packages to database')
+            repoman.StreamDeserializeMulti(processor=PackageProcessor, reponames=options.reponames)
+
+            # process what's left in the queue
+            database.AddPackages(package_queue)
+
+            db_logger.Log('updating related metapackage clusters')
+            database.UpdateMetapackageClusters(clusterer.GetClusters())
+
+            if options.fetch and options.update and options.parse:
+                db_logger.Log('recording repo updates')
+                database.MarkRepositoriesUpdated(repositories_updated)
+            else:
+                db_logger.Log('not recording repo updates, need --fetch --update --parse')
+
+            db_logger.Log('updating views')
+            database.UpdateViews()
+
+            db_logger.Log('extracting links')
+            database.ExtractLinks(link_extractor.GetUrls())
+            database.UpdateMetapackageLinks()
+
+            db_logger.Log('updating similar maintainers')
+            database.UpdateMaintainerSimilarity(FindSimilarSets(database.GetMaintainerMetapackageSets(), limit=100))
+
+            db_logger.Log('updating history')
+            database.SnapshotHistory()
+            database.CompactHistory(repology.config.HISTORY_FULL_DAYS, repology.config.HISTORY_HOURLY_DAYS)
+
+            db_logger.Log('committing changes')
+            database.Commit()
+
+            # index must be in place before update generation is bumped,
+            # otherwise pages built with stale index may be cached under
+            # the new generation
+            if options.metapackage_index:
+                db_logger.Log('writing metapackage index')
+                MetapackageIndex(*database.GetMetapackageIndexData()).Save(options.metapackage_index)
+
+            db_logger.Log('bumping update generation')
+            database.IncrementUpdateGeneration()
+            generation = database.GetUpdateGeneration()['generation']
+            database.Commit()
+
+            if export_writer:
+                db_logger.Log('publishing metapackages export')
+                export_writer.Publish(generation)
+        except BaseException:
+            # don't leave partially written export behind
+            if export_writer:
+                export_writer.Discard()
+            raise
 
     logger.Log('database processing complete')
 
@@ -141,6 +198,8 @@ def Main():
     parser.add_argument('-E', '--repos-dir', default=repology.config.REPOS_DIR, help='path to directory with repository configs')
     parser.add_argument('-U', '--rules-dir', default=repology.config.RULES_DIR, help='path to directory with rules')
     parser.add_argument('-D', '--dsn', default=repology.config.DSN, help='database connection params')
+    parser.add_argument('-I', '--metapackage-index', default=repology.config.METAPACKAGE_INDEX_PATH, help='path to metapackage index snapshot to write after database update')
+    parser.add_argument('-X', '--export-dir', default=repology.config.EXPORT_DIR, help='path to directory to publish metapackages export to after database update')
 
     actions_grp = parser.add_argument_group('Actions')
     actions_grp.add_argument('-l', '--list', action='store_true', help='list repositories repology will work on')
@@ -153,6 +212,7 @@ def Main():
     actions_grp.add_argument('-P', '--reprocess', action='store_true', help='reprocess repository data')
     actions_grp.add_argument('-i', '--initdb', action='store_true', help='(re)initialize database schema')
     actions_grp.add_argument('-d', '--database', action='store_true', help='store in the database')
+    actions_grp.add_argument('-M', '--migrate-history', action='store_true', help='migrate legacy repository history snapshots to normalized table')
 
     actions_grp.add_argument('-r', '--show-unmatched-rules', action='store_true', help='show unmatched rules when parsing')
 
@@ -178,7 +238,7 @@ def Main():
     if options.fetch or options.parse or options.reprocess:
         repositories_updated, repositories_not_updated = ProcessRepositories(options=options, logger=logger, repoman=repoman, transformer=transformer)
 
-    if options.initdb or options.database:
+    if options.initdb or options.database or options.migrate_history:
         ProcessDatabase(options=options, logger=logger, repoman=repoman, repositories_updated=repositories_updated)
 
     if (options.parse or options.reprocess) and (options.show_unmatched_rules):
@@ -0,0 +1,99 @@
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+import jinja2
+
+from werkzeug.routing import Map, Rule
+
+from repology.packageproc import PackagesetToSummaries
+
+
+TEMPLATES_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'templates'))
+
+# routes referenced from badge templates; must match ones in repology-app.py
+BADGE_URL_MAP = Map([
+    Rule('/metapackage/<name>/packages', endpoint='metapackage_packages'),
+])
+
+
+def CreateBadgeEnvironment(repometadata, home):
+    """Create jinja environment for rendering badges without webapp."""
+    urls = BADGE_URL_MAP.bind('localhost')
+
+    env = jinja2.Environment(loader=jinja2.FileSystemLoader(TEMPLATES_DIR), trim_blocks=True, lstrip_blocks=True)
+    env.globals['url_for'] = lambda endpoint, **values: urls.build(endpoint, values)
+    env.globals['REPOLOGY_HOME'] = home
+    env.globals['repometadata'] = repometadata
+
+    return env
+
+
+class BadgeRenderer:
+    """Renders metapackage badges.
+
+    Shared by the webapp, which passes its own jinja environment, and
+    repology-genbadges.py, which uses one from CreateBadgeEnvironment(),
+    so pregenerated badges are exactly the same as served ones.
+    """
+
+    def __init__(self, environment, repometadata):
+        self.environment = environment
+        self.repometadata = repometadata
+
+    def __Render(self, template, **context):
+        return self.environment.get_template(template).render(**context)
+
+    def RenderVerticalAllRepos(self, name, packages):
+        summaries = PackagesetToSummaries(packages)
+
+        repostates = []
+        for reponame, summary in summaries.items():
+            repostates.append({
+                'name': self.repometadata[reponame]['desc'],
+                'version': summary['version'],
+                'versionclass': summary['versionclass']
+            })
+
+        return self.__Render(
+            'badge-vertical.svg',
+            repositories=sorted(repostates, key=lambda repo: repo['name']),
+            name=name
+        )
+
+    def RenderTinyRepos(self, name, packages):
+        num_families = len(set([package.family for package in packages]))
+        return self.__Render(
+            'badge-tiny.svg',
+            name=name,
+            num_families=num_families
+        )
+
+    def RenderVersionForRepos(self, name, packages, repos=None):
+        """Return dict of repo -> badge, for given repos or all repos which have the metapackage."""
+        summaries = PackagesetToSummaries(packages)
+
+        return {
+            repo: self.__Render(
+                'badge-tiny-version.svg',
+                name=name,
+                repo=repo,
+                version=summary['version'],
+                versionclass=summary['versionclass'],
+            ) for repo, summary in summaries.items() if repos is None or repo in repos
+        }
@@ -17,12 +17,46 @@
 
 import datetime
 import json
+import math
+import time
 
 import psycopg2
+import psycopg2.extras
 
 from repology.package import Package
 
 
+def GetPositionalQuery(query):
+    """Convert psycopg2 %s placeholders into PostgreSQL $N ones.
+
+    Literal percent signs must be doubled, as for psycopg2.
+    """
+    parts = []
+    nparam = 0
+    pos = 0
+
+    while True:
+        percent = query.find('%', pos)
+        if percent == -1:
+            parts.append(query[pos:])
+            break
+
+        parts.append(query[pos:percent])
+
+        spec = query[percent + 1:percent + 2]
+        if spec == '%':
+            parts.append('%')
+        elif spec == 's':
+            nparam += 1
+            parts.append('${}'.format(nparam))
+        else:
+            raise ValueError('unsupported placeholder in query: %' + spec)
+
+        pos = percent + 2
+
+    return ''.join(parts), nparam
+
+
 class Query:
     def __init__(self, query=None, *args):
         self.parts = [query] if query else []
@@ -67,6 +101,78 @@ class OrQuery(Query):
         return ' OR '.join(map(lambda x: '(' + x + ')', filter(None.__ne__, self.parts)))
 
 
+def EscapeLike(string):
+    return string.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def GetRankedSearchQuery(table, column):
+    # exact match first, then prefix matches, then substring matches;
+    # each subquery is limited separately so limit is applied as early
+    # as possible
+    return """
+        SELECT
+            {column}
+        FROM (
+                (
+                    SELECT {column}, 0 AS rank
+                    FROM {table}
+                    WHERE {column} = %(search)s
+                )
+            UNION ALL
+                (
+                    SELECT {column}, 1 AS rank
+                    FROM {table}
+                    WHERE {column} LIKE %(prefix)s
+                    ORDER BY {column}
+                    LIMIT %(limit)s
+                )
+            UNION ALL
+                (
+                    SELECT {column}, 2 AS rank
+                    FROM {table}
+                    WHERE {column} LIKE %(substring)s
+                    ORDER BY {column}
+                    LIMIT %(limit)s
+                )
+        ) AS matches
+        GROUP BY {column}
+        ORDER BY min(rank), {column}
+        LIMIT %(limit)s
+    """.format(table=table, column=column)
+
+
+def GetRankedSearchArgs(search, limit):
+    return {
+        'search': search,
+        'prefix': EscapeLike(search) + '%',
+        'substring': '%' + EscapeLike(search) + '%',
+        'limit': limit,
+    }
+
+
+REPOSITORY_HISTORY_COUNTERS = [
+    'num_packages',
+    'num_metapackages',
+    'num_metapackages_unique',
+    'num_metapackages_newest',
+    'num_metapackages_outdated',
+    'num_problems',
+    'num_maintainers',
+]
+
+
+def RepositoryHistoryRowToSnapshot(row):
+    # missing counters (e.g. for migrated history) are omitted
+    return {key: value for key, value in zip(REPOSITORY_HISTORY_COUNTERS, row) if value is not None}
+
+
+def GetHistoryBucketExpression(resolution):
+    # history points are grouped into buckets of resolution seconds
+    if resolution:
+        return 'floor(extract(epoch FROM ts) / %(resolution)s)'
+    return 'ts'
+
+
 class MetapackageRequest:
     def __init__(self):
         # effname filtering
@@ -172,49 +278,65 @@ class MetapackageRequest:
             raise RuntimeError('duplicate limit')
         self.limit = limit
 
-    def GetQuery(self):
-        tables = set()
-        where = AndQuery()
-        having = AndQuery()
+    def GetTables(self):
+        # (table, conditions) pairs for tables which limit set of metapackages
+        tables = []
 
-        # table joins and conditions
         if self.maintainer:
-            tables.add('maintainer_metapackages')
             if self.maintainer_outdated:
-                where.Append('maintainer_metapackages.maintainer = %s AND maintainer_metapackages.num_packages_outdated > 0 AND maintainer_metapackages.num_packages_newest = 0', self.maintainer)
+                tables.append(('maintainer_metapackages', AndQuery('maintainer_metapackages.maintainer = %s AND maintainer_metapackages.num_packages_outdated > 0 AND maintainer_metapackages.num_packages_newest = 0', self.maintainer)))
             else:
-                where.Append('maintainer_metapackages.maintainer = %s', self.maintainer)
+                tables.append(('maintainer_metapackages', AndQuery('maintainer_metapackages.maintainer = %s', self.maintainer)))
 
-        if self.morefamilies:
-            tables.add('metapackage_repocounts')
-            where.Append('metapackage_repocounts.num_families >= %s', self.morefamilies)
+        if self.morefamilies or self.lessfamilies:
+            conditions = AndQuery()
+            if self.morefamilies:
+                conditions.Append('metapackage_repocounts.num_families >= %s', self.morefamilies)
+            if self.lessfamilies:
+                conditions.Append('metapackage_repocounts.num_families <= %s', self.lessfamilies)
+            tables.append(('metapackage_repocounts', conditions))
 
-        if self.lessfamilies:
-            tables.add('metapackage_repocounts')
-            where.Append('metapackage_repocounts.num_families <= %s', self.lessfamilies)
+        if self.name_substring:
+            # matched with trigram index on compact search table
+            tables.append(('metapackages_search', AndQuery('metapackages_search.effname LIKE %s', '%' + self.name_substring + '%')))
 
         if self.repos:
-            tables.add('repo_metapackages')
             if self.repos_outdated:
-                where.Append('repo_metapackages.repo in (' + ','.join(['%s'] * len(self.repos)) + ') AND repo_metapackages.num_outdated > 0 AND repo_metapackages.num_newest = 0', *self.repos)
+                tables.append(('repo_metapackages', AndQuery('repo_metapackages.repo in (' + ','.join(['%s'] * len(self.repos)) + ') AND repo_metapackages.num_outdated > 0 AND repo_metapackages.num_newest = 0', *self.repos)))
             else:
-                where.Append('repo_metapackages.repo in (' + ','.join(['%s'] * len(self.repos)) + ')', *self.repos)
+                tables.append(('repo_metapackages', AndQuery('repo_metapackages.repo in (' + ','.join(['%s'] * len(self.repos)) + ')', *self.repos)))
+
+        return tables
+
+    def GetQuery(self, estimates=None):
+        tables = self.GetTables()
+        where = AndQuery()
+        having = AndQuery()
+
+        # most selective table drives the query, others are joined in
+        # order of increasing cardinality, so the query does not depend
+        # on the order filters were applied in
+        if estimates:
+            tables.sort(key=lambda table: estimates.get(table[0], math.inf))
+
+        joins = []
+        for table, conditions in tables:
+            joins.append(table)
+            where.Append(conditions)
 
+        # not-in-repo condition is not selective, so it's always joined last
         if self.repo_not:
-            tables.add('repo_metapackages as repo_metapackages1')
+            joins.append('repo_metapackages as repo_metapackages1')
             having.Append('count(nullif(repo_metapackages1.repo = %s, false)) = 0', self.repo_not)
 
         # effname conditions
         if self.namecond and self.namebound:
             where.Append('effname ' + self.namecond + ' %s', self.namebound)
 
-        if self.name_substring:
-            where.Append('effname LIKE %s', '%' + self.name_substring + '%')
-
         # construct query
         query = Query('SELECT DISTINCT effname FROM')
-        query.Append(tables.pop() if tables else 'repo_metapackages')
-        for table in tables:
+        query.Append(joins[0] if joins else 'metapackages_search')
+        for table in joins[1:]:
             query.Append('INNER JOIN ' + table + ' USING(effname)')
 
         if where:
@@ -235,21 +357,147 @@ class MetapackageRequest:
 
 
 class Database:
-    def __init__(self, dsn, readonly=True, autocommit=False):
+    max_prepared_statements = 100
+    estimates_ttl = 60 * 60
+
+    def __init__(self, dsn, readonly=True, autocommit=False, prepare=False):
         self.db = psycopg2.connect(dsn)
         self.db.set_session(readonly=readonly, autocommit=autocommit)
         self.cursor = self.db.cursor()
 
+        # server-side prepared statements for hot queries; only
+        # worth it for long-living (e.g. pooled) connections
+        self.prepare = prepare
+        self.prepared_statements = {}
+
+        # (timestamp, statistics), used for metapackage query planning
+        self.estimates_data = None
+
+    def IsClosed(self):
+        return self.db.closed != 0
+
+    def IsAlive(self):
+        if self.IsClosed():
+            return False
+
+        try:
+            self.cursor.execute('SELECT 1')
+            self.cursor.fetchall()
+        except psycopg2.Error:
+            return False
+
+        return True
+
+    def Close(self):
+        self.db.close()
+
+    def ExecutePrepared(self, query, args):
+        args = tuple(args)
+
+        if not self.prepare:
+            self.cursor.execute(query, args)
+            return
+
+        name = self.prepared_statements.get(query)
+
+        if name is None:
+            if len(self.prepared_statements) >= self.max_prepared_statements:
+                self.cursor.execute(query, args)
+                return
+
+            name = 'repology_stmt{}'.format(len(self.prepared_statements))
+
+            positional_query, nparams = GetPositionalQuery(query)
+            if nparams != len(args):
+                raise ValueError('query has {} placeholders, but {} arguments given'.format(nparams, len(args)))
+
+            self.cursor.execute('PREPARE {} AS {}'.format(name, positional_query))
+            self.prepared_statements[query] = name
+
+        if args:
+            self.cursor.execute('EXECUTE {}({})'.format(name, ','.join(['%s'] * len(args))), args)
+        else:
+            self.cursor.execute('EXECUTE {}'.format(name))
+
+    def CreateRepositoryHistoryTable(self):
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS repository_history (
+                repo text not null,
+                ts timestamp with time zone not null,
+
+                num_packages integer,
+                num_metapackages integer,
+                num_metapackages_unique integer,
+                num_metapackages_newest integer,
+                num_metapackages_outdated integer,
+                num_problems integer,
+                num_maintainers integer,
+
+                primary key(repo, ts)
+            )
+        """)
+
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS repository_history_ts ON repository_history(ts)')
+
+    def MigrateRepositoryHistory(self):
+        """Convert legacy repositories_history JSONB snapshots to repository_history rows.
+
+        Returns number of migrated rows, or None if there's no legacy table.
+        """
+        self.CreateRepositoryHistoryTable()
+
+        self.cursor.execute("SELECT to_regclass('repositories_history')")
+        if self.cursor.fetchall()[0][0] is None:
+            return None
+
+        self.cursor.execute("""
+            INSERT
+            INTO repository_history(
+                repo,
+                ts,
+
+                num_metapackages,
+                num_metapackages_unique,
+                num_metapackages_newest,
+                num_metapackages_outdated,
+                num_problems,
+                num_maintainers
+            )
+            SELECT
+                key,
+                ts,
+
+                (value->>'num_metapackages')::integer,
+                (value->>'num_metapackages_unique')::integer,
+                (value->>'num_metapackages_newest')::integer,
+                (value->>'num_metapackages_outdated')::integer,
+                (value->>'num_problems')::integer,
+                (value->>'num_maintainers')::integer
+            FROM repositories_history, jsonb_each(snapshot)
+            ON CONFLICT (repo, ts) DO NOTHING
+        """)
+
+        return self.cursor.rowcount
+
     def CreateSchema(self):
         self.cursor.execute('DROP TABLE IF EXISTS packages CASCADE')
         self.cursor.execute('DROP TABLE IF EXISTS repositories CASCADE')
-        self.cursor.execute('DROP TABLE IF EXISTS repositories_history CASCADE')
         self.cursor.execute('DROP TABLE IF EXISTS statistics CASCADE')
         self.cursor.execute('DROP TABLE IF EXISTS statistics_history CASCADE')
         self.cursor.execute('DROP TABLE IF EXISTS totals_history CASCADE')
         self.cursor.execute('DROP TABLE IF EXISTS links CASCADE')
+        self.cursor.execute('DROP TABLE IF EXISTS linkcheck_runs CASCADE')
+        self.cursor.execute('DROP TABLE IF EXISTS linkcheck_inflight CASCADE')
+        self.cursor.execute('DROP TABLE IF EXISTS link_metapackages CASCADE')
+        self.cursor.execute('DROP TABLE IF EXISTS metapackage_links CASCADE')
         self.cursor.execute('DROP TABLE IF EXISTS problems CASCADE')
+        self.cursor.execute('DROP TABLE IF EXISTS update_generation CASCADE')
+        self.cursor.execute('DROP TABLE IF EXISTS maintainer_similarity CASCADE')
+        self.cursor.execute('DROP TABLE IF EXISTS metapackage_clusters CASCADE')
 
+        # effname uses "C" collation, which is inherited by all views
+        # derived from packages, so effnames are ordered the same way
+        # as in the in-memory metapackage index
         self.cursor.execute("""
             CREATE TABLE packages (
                 repo text not null,
@@ -257,7 +505,7 @@ class Database:
                 subrepo text,
 
                 name text not null,
-                effname text not null,
+                effname text COLLATE "C" not null,
 
                 version text not null,
                 origversion text,
@@ -306,12 +554,7 @@ class Database:
         """)
 
         # repository_history
-        self.cursor.execute("""
-            CREATE TABLE repositories_history (
-                ts timestamp with time zone not null primary key,
-                snapshot jsonb not null
-            )
-        """)
+        self.CreateRepositoryHistoryTable()
 
         # statistics
         self.cursor.execute("""
@@ -413,6 +656,14 @@ class Database:
             CREATE UNIQUE INDEX ON maintainers(maintainer)
         """)
 
+        self.cursor.execute("""
+            CREATE INDEX ON maintainers(maintainer text_pattern_ops)
+        """)
+
+        self.cursor.execute("""
+            CREATE INDEX maintainers_maintainer_trgm ON maintainers USING gin (maintainer gin_trgm_ops)
+        """)
+
         # repo counts
         self.cursor.execute("""
             CREATE MATERIALIZED VIEW metapackage_repocounts AS
@@ -432,6 +683,21 @@ class Database:
         self.cursor.execute('CREATE INDEX ON metapackage_repocounts(num_families)')
         self.cursor.execute('CREATE INDEX ON metapackage_repocounts(shadow_only, num_families)')
 
+        # deduplicated non-shadow effnames, for listing and search
+        self.cursor.execute("""
+            CREATE MATERIALIZED VIEW metapackages_search AS
+                SELECT
+                    effname
+                FROM metapackage_repocounts
+                WHERE NOT shadow_only
+                ORDER BY effname
+            WITH DATA
+        """)
+
+        self.cursor.execute('CREATE UNIQUE INDEX ON metapackages_search(effname)')
+        self.cursor.execute('CREATE INDEX ON metapackages_search(effname text_pattern_ops)')
+        self.cursor.execute('CREATE INDEX metapackages_search_effname_trgm ON metapackages_search USING gin (effname gin_trgm_ops)')
+
         # links for link checker
         self.cursor.execute("""
             CREATE TABLE links (
@@ -444,7 +710,50 @@ class Database:
                 status smallint,
                 redirect smallint,
                 size bigint,
-                location text
+                location text,
+                status_changed timestamp with time zone,
+                next_check timestamp with time zone not null default now()
+            )
+        """)
+
+        self.cursor.execute('CREATE INDEX ON links(next_check)')
+
+        # link checker run state, for resuming interrupted runs
+        self.cursor.execute("""
+            CREATE TABLE linkcheck_runs (
+                selection text not null primary key,
+                started timestamp with time zone not null,
+                finished timestamp with time zone
+            )
+        """)
+
+        self.cursor.execute("""
+            CREATE TABLE linkcheck_inflight (
+                url text not null primary key,
+                selection text not null
+            )
+        """)
+
+        self.cursor.execute('CREATE INDEX ON linkcheck_inflight(selection)')
+
+        # links of each metapackage, and their statuses precomputed
+        # for metapackage pages
+        self.cursor.execute("""
+            CREATE TABLE link_metapackages (
+                url text not null,
+                effname text not null,
+                primary key(url, effname)
+            )
+        """)
+
+        self.cursor.execute("""
+            CREATE INDEX ON link_metapackages(effname)
+        """)
+
+        self.cursor.execute("""
+            CREATE TABLE metapackage_links (
+                effname text not null primary key,
+                links jsonb not null
             )
         """)
 
@@ -479,19 +788,38 @@ class Database:
 
         self.cursor.execute('CREATE INDEX ON reports(effname)')
 
-        # url_relations
+        # metapackage_clusters, precomputed by repology-update
         self.cursor.execute("""
-            CREATE MATERIALIZED VIEW url_relations AS
-                SELECT DISTINCT
-                    effname,
-                    regexp_replace(regexp_replace(homepage, '/?([#?].*)?$', ''), '^https?://(www\\.)?', '') as url
-                FROM packages
-                WHERE homepage ~ '^https?://'
-            WITH DATA
+            CREATE TABLE metapackage_clusters (
+                effname text not null primary key,
+                cluster text not null
+            )
         """)
 
-        self.cursor.execute('CREATE UNIQUE INDEX ON url_relations(effname, url)')  # we only need url here because we need unique index for concurrent refresh
-        self.cursor.execute('CREATE INDEX ON url_relations(url)')
+        self.cursor.execute('CREATE INDEX ON metapackage_clusters(cluster, effname)')
+
+        # maintainer_similarity, precomputed by repology-update
+        self.cursor.execute("""
+            CREATE TABLE maintainer_similarity (
+                maintainer text not null,
+                similar_maintainer text not null,
+                count integer not null,
+                score real not null,
+                primary key(maintainer, similar_maintainer)
+            )
+        """)
+
+        # update generation, used by webapp to invalidate caches
+        self.cursor.execute("""
+            CREATE TABLE update_generation (
+                generation integer not null,
+                ts timestamp with time zone not null
+            )
+        """)
+
+        self.cursor.execute("""
+            INSERT INTO update_generation VALUES(0, now())
+        """)
 
     def Clear(self):
         self.cursor.execute("""DELETE FROM packages""")
@@ -627,7 +955,7 @@ class Database:
         self.cursor.execute("""REFRESH MATERIALIZED VIEW CONCURRENTLY maintainer_metapackages""")
         self.cursor.execute("""REFRESH MATERIALIZED VIEW CONCURRENTLY maintainers""")
         self.cursor.execute("""REFRESH MATERIALIZED VIEW CONCURRENTLY metapackage_repocounts""")
-        self.cursor.execute("""REFRESH MATERIALIZED VIEW CONCURRENTLY url_relations""")
+        self.cursor.execute("""REFRESH MATERIALIZED VIEW CONCURRENTLY metapackages_search""")
 
         # package stats
         self.cursor.execute("""
@@ -872,14 +1200,17 @@ class Database:
         # cleanup expired reports
         self.cursor.execute('DELETE FROM reports WHERE now() >= expires')
 
-        # cleanup stale links
-        self.cursor.execute('DELETE FROM links WHERE last_extracted < now() - INTERVAL \'1\' MONTH')
+    def IncrementUpdateGeneration(self):
+        self.cursor.execute('UPDATE update_generation SET generation = generation + 1, ts = now()')
 
     def Commit(self):
         self.db.commit()
 
+    def Rollback(self):
+        self.db.rollback()
+
     def GetMetapackage(self, names):
-        self.cursor.execute(
+        self.ExecutePrepared(
             """
             SELECT
                 repo,
@@ -941,6 +1272,64 @@ class Database:
             ) for row in self.cursor.fetchall()
         ]
 
+    def SearchMetapackages(self, search, limit=20):
+        self.cursor.execute(GetRankedSearchQuery('metapackages_search', 'effname'), GetRankedSearchArgs(search, limit))
+
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def __GetEstimatesData(self):
+        # statistics change only on update, and estimates need not be
+        # exact, so they are cached for a while instead of being queried
+        # for each request
+        if self.estimates_data is None or time.monotonic() - self.estimates_data[0] >= self.estimates_ttl:
+            self.cursor.execute('SELECT num_families, count(*) FROM metapackage_repocounts GROUP BY num_families')
+            families_histogram = dict(self.cursor.fetchall())
+
+            self.cursor.execute('SELECT name, num_metapackages, num_metapackages_outdated FROM repositories')
+            repositories = {row[0]: (row[1], row[2]) for row in self.cursor.fetchall()}
+
+            self.estimates_data = (time.monotonic(), {
+                'families_histogram': families_histogram,
+                'repositories': repositories,
+                'maintainers': {},  # filled on demand
+            })
+
+        return self.estimates_data[1]
+
+    def GetMetapackageFamiliesHistogram(self):
+        return self.__GetEstimatesData()['families_histogram']
+
+    def GetMetapackageRequestEstimates(self, req):
+        data = self.__GetEstimatesData()
+        estimates = {}
+
+        if req.maintainer:
+            if req.maintainer not in data['maintainers']:
+                self.cursor.execute('SELECT num_metapackages FROM maintainers WHERE maintainer = %s', (req.maintainer,))
+                rows = self.cursor.fetchall()
+                data['maintainers'][req.maintainer] = rows[0][0] if rows else 0
+
+            estimates['maintainer_metapackages'] = data['maintainers'][req.maintainer]
+
+        if req.repos:
+            estimates['repo_metapackages'] = sum(
+                data['repositories'].get(repo, (0, 0))[1 if req.repos_outdated else 0]
+                for repo in req.repos
+            )
+
+        if req.name_substring:
+            # substring matches are usually few and are looked up
+            # with trigram index, so this table drives the query
+            estimates['metapackages_search'] = 0
+
+        if req.morefamilies or req.lessfamilies:
+            estimates['metapackage_repocounts'] = sum(
+                count for num_families, count in self.GetMetapackageFamiliesHistogram().items()
+                if (not req.morefamilies or num_families >= req.morefamilies) and (not req.lessfamilies or num_families <= req.lessfamilies)
+            )
+
+        return estimates
+
     def GetMetapackages(self, *filters, limit=500):
         req = MetapackageRequest()
 
@@ -950,9 +1339,9 @@ class Database:
 
         req.Limit(limit)
 
-        query, args = req.GetQuery()
+        query, args = req.GetQuery(self.GetMetapackageRequestEstimates(req))
 
-        self.cursor.execute(
+        self.ExecutePrepared(
             """
             SELECT
                 repo,
@@ -1015,6 +1404,18 @@ class Database:
             ) for row in self.cursor.fetchall()
         ]
 
+    def GetMetapackageIndexData(self):
+        self.cursor.execute('SELECT effname, num_families FROM metapackage_repocounts')
+        families = self.cursor.fetchall()
+
+        self.cursor.execute('SELECT repo, effname, num_newest, num_outdated FROM repo_metapackages')
+        repos = self.cursor.fetchall()
+
+        self.cursor.execute('SELECT maintainer, effname, num_packages_newest, num_packages_outdated FROM maintainer_metapackages')
+        maintainers = self.cursor.fetchall()
+
+        return families, repos, maintainers
+
     def GetPackagesCount(self):
         self.cursor.execute("""SELECT num_packages FROM statistics LIMIT 1""")
 
@@ -1030,6 +1431,16 @@ class Database:
 
         return self.cursor.fetchall()[0][0]
 
+    def GetUpdateGeneration(self):
+        self.cursor.execute("""SELECT generation, ts FROM update_generation LIMIT 1""")
+
+        row = self.cursor.fetchall()[0]
+
+        return {
+            'generation': row[0],
+            'timestamp': row[1],
+        }
+
     def GetMaintainersRange(self):
         # should use min/max here, but these are slower on pgsql 9.6
         self.cursor.execute('SELECT maintainer FROM maintainers ORDER BY maintainer LIMIT 1')
@@ -1039,6 +1450,30 @@ class Database:
         return (min_, max_)
 
     def GetMaintainers(self, bound=None, reverse=False, search=None, limit=500):
+        if search:
+            # search results are not paginated: best ranked maintainers
+            # are picked with trigram index and returned in name order
+            self.cursor.execute(
+                """
+                SELECT
+                    maintainer,
+                    num_packages,
+                    num_packages_outdated
+                FROM maintainers
+                WHERE maintainer IN ({})
+                ORDER BY maintainer
+                """.format(GetRankedSearchQuery('maintainers', 'maintainer')),
+                GetRankedSearchArgs(search, limit)
+            )
+
+            return [
+                {
+                    'maintainer': row[0],
+                    'num_packages': row[1],
+                    'num_packages_outdated': row[2]
+                } for row in self.cursor.fetchall()
+            ]
+
         where = []
         order = 'maintainer'
 
@@ -1060,10 +1495,6 @@ class Database:
                 where.append('maintainer >= %s')
                 args.append(bound)
 
-        if search:
-            where.append('maintainer LIKE %s')
-            args.append('%' + search + '%')
-
         if where:
             query += ' WHERE ' + ' AND '.join(where)
 
@@ -1084,6 +1515,11 @@ class Database:
             } for row in self.cursor.fetchall()
         ], key=lambda m: m['maintainer'])
 
+    def SearchMaintainers(self, search, limit=20):
+        self.cursor.execute(GetRankedSearchQuery('maintainers', 'maintainer'), GetRankedSearchArgs(search, limit))
+
+        return [row[0] for row in self.cursor.fetchall()]
+
     def GetMaintainerInformation(self, maintainer):
         self.cursor.execute(
             """
@@ -1127,54 +1563,42 @@ class Database:
 
         return [row[0] for row in self.cursor.fetchall()]
 
+    def GetMaintainerMetapackageSets(self):
+        self.cursor.execute('SELECT maintainer, effname FROM maintainer_metapackages')
+
+        sets = {}
+        for maintainer, effname in self.cursor:
+            sets.setdefault(maintainer, set()).add(effname)
+
+        return sets
+
+    def UpdateMaintainerSimilarity(self, similar):
+        self.cursor.execute('DELETE FROM maintainer_similarity')
+
+        psycopg2.extras.execute_values(
+            self.cursor,
+            'INSERT INTO maintainer_similarity(maintainer, similar_maintainer, count, score) VALUES %s',
+            (
+                (maintainer, similar_maintainer, count, score)
+                for maintainer, similar_maintainers in similar.items()
+                for similar_maintainer, count, score in similar_maintainers
+            ),
+            page_size=10000
+        )
+
     def GetMaintainerSimilarMaintainers(self, maintainer, limit=100):
-        # this obscure request needs some clarification
-        #
-        # what we calculate as score here is actually Jaccard index
-        # (see wikipedia) for two sets (of metapackages maintained by
-        # two maintainers)
-        #
-        # let M = set of metapackages for maintainer passed to this function
-        # let C = set of metapackages for other maintainer we test for similarity
-        #
-        # score = |M⋂C| / |M⋃C| = |M⋂C| / (|M| + |C| - |M⋂C|)
-        #
-        # - count(*) is number of common metapackages for both maintainers, e.g. |M⋂C|
-        # - min(num_metapackages) is number of metapackages for candidate maintainer |C|
-        #   we use min because we use GROUP BY and just need a group operation; since we
-        #   group by maintainer and join by maintainer, num_metapackages is the same
-        #   in all records, and we may pick min, max, avg, whatever
-        # - sub-select just gets |M|
-        # - the divisor is |M⋃C| = |M| + |C| - |M⋂C|
         self.cursor.execute(
             """
             SELECT
-                maintainer,
-                count(*) AS count,
-                100.0 * count(*) / (
-                    min(num_metapackages) -
-                    count(*) +
-                    (
-                        SELECT num_metapackages
-                        FROM maintainers
-                        WHERE maintainer=%s
-                    )
-                ) AS score
-            FROM maintainer_metapackages
-            INNER JOIN maintainers USING(maintainer)
-            WHERE
-                maintainer != %s AND
-                effname IN (
-                    SELECT
-                        effname
-                    FROM maintainer_metapackages
-                    WHERE maintainer=%s
-                )
-            GROUP BY maintainer
-            ORDER BY score DESC
+                similar_maintainer,
+                count,
+                score
+            FROM maintainer_similarity
+            WHERE maintainer = %s
+            ORDER BY score DESC, similar_maintainer
             LIMIT %s
             """,
-            (maintainer, maintainer, maintainer, limit)
+            (maintainer, limit)
         )
 
         return [
@@ -1284,66 +1708,126 @@ class Database:
             SELECT
                 ts,
                 now() - ts,
-                snapshot
-            FROM repositories_history
-            WHERE ts IN (
+                repo,
+                num_packages,
+                num_metapackages,
+                num_metapackages_unique,
+                num_metapackages_newest,
+                num_metapackages_outdated,
+                num_problems,
+                num_maintainers
+            FROM repository_history
+            WHERE ts = (
                 SELECT
-                    ts
-                FROM repositories_history
+                    max(ts)
+                FROM repository_history
                 WHERE ts < now() - INTERVAL %s
-                ORDER BY ts DESC
-                LIMIT 1
             )
         """, (datetime.timedelta(seconds=seconds),)
         )
 
-        row = self.cursor.fetchall()[0]
+        rows = self.cursor.fetchall()
 
         return {
-            'timestamp': row[0],
-            'timedelta': row[1],
-            **row[2]
+            'timestamp': rows[0][0],
+            'timedelta': rows[0][1],
+            **{row[2]: RepositoryHistoryRowToSnapshot(row[3:]) for row in rows}
         }
 
-    def GetRepositoriesHistoryPeriod(self, seconds=60 * 60 * 24, repo=None):
-        repopath = ''
-        repoargs = ()
-
+    def GetRepositoriesHistoryPeriod(self, seconds=60 * 60 * 24, repo=None, resolution=None, reference=None):
+        # reference is a point in time period and timedeltas are counted
+        # from, now by default
         if repo:
-            repopath = '#>%s'
-            repoargs = ('{' + repo + '}', )
+            # with resolution, only last point of each resolution-sized
+            # time bucket is returned
+            self.cursor.execute(
+                """
+                SELECT
+                    ts,
+                    coalesce(%(reference)s, now()) - ts,
+                    num_packages,
+                    num_metapackages,
+                    num_metapackages_unique,
+                    num_metapackages_newest,
+                    num_metapackages_outdated,
+                    num_problems,
+                    num_maintainers
+                FROM (
+                    SELECT DISTINCT ON ({bucket})
+                        *
+                    FROM repository_history
+                    WHERE repo = %(repo)s AND ts >= coalesce(%(reference)s, now()) - INTERVAL %(period)s AND ts <= coalesce(%(reference)s, now())
+                    ORDER BY {bucket}, ts DESC
+                ) AS history
+                ORDER BY ts
+                """.format(bucket=GetHistoryBucketExpression(resolution)),
+                {'repo': repo, 'period': datetime.timedelta(seconds=seconds), 'resolution': resolution, 'reference': reference}
+            )
 
-        self.cursor.execute("""
+            return [
+                {
+                    'timestamp': row[0],
+                    'timedelta': row[1],
+                    'snapshot': RepositoryHistoryRowToSnapshot(row[2:])
+                }
+                for row in self.cursor.fetchall()
+            ]
+
+        # same bucketing for all repositories: last snapshot of each
+        # bucket is picked, and rows of all repositories for it are returned
+        self.cursor.execute(
+            """
             SELECT
                 ts,
-                now() - ts,
-                snapshot{}
-            FROM repositories_history
-            WHERE ts >= now() - INTERVAL %s
+                coalesce(%(reference)s, now()) - ts,
+                repo,
+                num_packages,
+                num_metapackages,
+                num_metapackages_unique,
+                num_metapackages_newest,
+                num_metapackages_outdated,
+                num_problems,
+                num_maintainers
+            FROM repository_history
+            WHERE ts IN (
+                SELECT DISTINCT ON ({bucket})
+                    ts
+                FROM repository_history
+                WHERE ts >= coalesce(%(reference)s, now()) - INTERVAL %(period)s AND ts <= coalesce(%(reference)s, now())
+                ORDER BY {bucket}, ts DESC
+            )
             ORDER BY ts
-            """.format(repopath),
-            repoargs + (datetime.timedelta(seconds=seconds),)
+            """.format(bucket=GetHistoryBucketExpression(resolution)),
+            {'period': datetime.timedelta(seconds=seconds), 'resolution': resolution, 'reference': reference}
         )
 
-        return [
-            {
-                'timestamp': row[0],
-                'timedelta': row[1],
-                'snapshot': row[2]
-            }
-            for row in self.cursor.fetchall()
-        ]
+        result = []
+        for row in self.cursor.fetchall():
+            if not result or result[-1]['timestamp'] != row[0]:
+                result.append({
+                    'timestamp': row[0],
+                    'timedelta': row[1],
+                    'snapshot': {}
+                })
+            result[-1]['snapshot'][row[2]] = RepositoryHistoryRowToSnapshot(row[3:])
 
-    def GetStatisticsHistoryPeriod(self, seconds=60 * 60 * 24):
+        return result
+
+    def GetStatisticsHistoryPeriod(self, seconds=60 * 60 * 24, resolution=None, reference=None):
         self.cursor.execute("""
             SELECT
                 ts,
-                now() - ts,
+                coalesce(%(reference)s, now()) - ts,
                 snapshot
-            FROM statistics_history
-            WHERE ts >= now() - INTERVAL %s
+            FROM (
+                SELECT DISTINCT ON ({bucket})
+                    *
+                FROM statistics_history
+                WHERE ts >= coalesce(%(reference)s, now()) - INTERVAL %(period)s AND ts <= coalesce(%(reference)s, now())
+                ORDER BY {bucket}, ts DESC
+            ) AS history
             ORDER BY ts
-        """, (datetime.timedelta(seconds=seconds),)
+        """.format(bucket=GetHistoryBucketExpression(resolution)), {'period': datetime.timedelta(seconds=seconds), 'resolution': resolution, 'reference': reference}
         )
 
         return [
@@ -1355,6 +1839,11 @@ class Database:
             for row in self.cursor.fetchall()
         ]
 
+    def GetLatestHistoryTimestamp(self):
+        self.cursor.execute("""SELECT max(ts) FROM statistics_history""")
+
+        return self.cursor.fetchall()[0][0]
+
     def Query(self, query, *args):
         self.cursor.execute(query, args)
         return self.cursor.fetchall()
@@ -1363,24 +1852,30 @@ class Database:
         self.cursor.execute(
             """
             INSERT
-            INTO repositories_history(
+            INTO repository_history(
+                repo,
                 ts,
-                snapshot
+
+                num_packages,
+                num_metapackages,
+                num_metapackages_unique,
+                num_metapackages_newest,
+                num_metapackages_outdated,
+                num_problems,
+                num_maintainers
             )
             SELECT
+                name,
                 now(),
-                jsonb_object_agg(snapshot.name, to_jsonb(snapshot) - 'name')
-            FROM (
-                SELECT
-                    name,
-                    num_metapackages,
-                    num_metapackages_unique,
-                    num_metapackages_newest,
-                    num_metapackages_outdated,
-                    num_problems,
-                    num_maintainers
-                FROM repositories
-            ) AS snapshot
+
+                num_packages,
+                num_metapackages,
+                num_metapackages_unique,
+                num_metapackages_newest,
+                num_metapackages_outdated,
+                num_problems,
+                num_maintainers
+            FROM repositories
            """
         )
 
@@ -1402,7 +1897,79 @@ class Database:
            """
         )
 
-    def ExtractLinks(self):
+    def CompactHistory(self, full_days=None, hourly_days=None):
+        """Thin out old history snapshots.
+
+        Snapshots younger than full_days are kept as is; older ones are
+        thinned to the last snapshot per hour, and ones older than
+        hourly_days to the last snapshot per day. None disables the
+        corresponding tier.
+        """
+        for unit, days in (('hour', full_days), ('day', hourly_days)):
+            if days is None:
+                continue
+
+            older_than = datetime.timedelta(days=days)
+
+            self.cursor.execute(
+                """
+                DELETE FROM repository_history
+                WHERE (repo, ts) IN (
+                    SELECT
+                        repo,
+                        ts
+                    FROM (
+                        SELECT
+                            repo,
+                            ts,
+                            row_number() OVER (PARTITION BY repo, date_trunc(%s, ts) ORDER BY ts DESC) AS rn
+                        FROM repository_history
+                        WHERE ts < now() - INTERVAL %s
+                    ) AS buckets
+                    WHERE rn > 1
+                )
+                """,
+                (unit, older_than)
+            )
+
+            self.cursor.execute(
+                """
+                DELETE FROM statistics_history
+                WHERE ts IN (
+                    SELECT
+                        ts
+                    FROM (
+                        SELECT
+                            ts,
+                            row_number() OVER (PARTITION BY date_trunc(%s, ts) ORDER BY ts DESC) AS rn
+                        FROM statistics_history
+                        WHERE ts < now() - INTERVAL %s
+                    ) AS buckets
+                    WHERE rn > 1
+                )
+                """,
+                (unit, older_than)
+            )
+
+    def ExtractLinks(self, urls):
+        """Update links table with the set of urls extracted from packages.
+
+        Only new urls are inserted, and last_extracted of existing ones
+        is bumped only if it's older than a day, so most rows of links
+        table are not rewritten on each update. Links which were not
+        extracted for a month are removed.
+        """
+        self.cursor.execute('CREATE TEMPORARY TABLE extracted_links (url text not null primary key)')
+
+        psycopg2.extras.execute_values(
+            self.cursor,
+            'INSERT INTO extracted_links(url) VALUES %s',
+            ((url,) for url in urls),
+            page_size=10000
+        )
+
+        self.cursor.execute('ANALYZE extracted_links')
+
         self.cursor.execute(
             """
             INSERT
@@ -1411,24 +1978,49 @@ class Database:
                 first_extracted,
                 last_extracted
             ) SELECT
-                unnest(downloads),
-                now(),
-                now()
-            FROM packages
-            UNION
-            SELECT
-                homepage,
+                url,
                 now(),
                 now()
-            FROM packages
-            WHERE homepage IS NOT NULL AND repo NOT IN('cpan', 'pypi', 'rubygems', 'hackage', 'cran')
+            FROM extracted_links
             ON CONFLICT (url)
-            DO UPDATE SET
+            DO NOTHING
+            """
+        )
+
+        self.cursor.execute(
+            """
+            UPDATE links
+            SET
                 last_extracted = now()
+            FROM extracted_links
+            WHERE
+                links.url = extracted_links.url AND
+                links.last_extracted < now() - INTERVAL '1' DAY
             """
         )
 
-    def GetLinksForCheck(self, after=None, prefix=None, recheck_age=None, limit=None, unchecked_only=False, checked_only=False, failed_only=False, succeeded_only=False):
+        # cleanup stale links
+        self.cursor.execute(
+            """
+            DELETE
+            FROM links
+            WHERE
+                last_extracted < now() - INTERVAL '1' MONTH AND
+                NOT EXISTS (SELECT * FROM extracted_links WHERE extracted_links.url = links.url)
+            """
+        )
+
+        self.cursor.execute('DROP TABLE extracted_links')
+
+    def StreamLinksForCheck(self, prefix=None, recheck_age=None, unchecked_only=False, checked_only=False, failed_only=False, succeeded_only=False, checked_before=None, itersize=10000):
+        """Iterate over links due for check, interleaving hosts.
+
+        Unless fixed recheck_age is given, links are selected by their
+        next_check time. Never checked links go first, and links are
+        returned in rounds: first link of each host, then second link
+        of each host and so on, so large hosts don't occupy the start
+        of the stream. Links checked since checked_before are skipped.
+        """
         conditions = []
         args = []
 
@@ -1437,10 +2029,6 @@ class Database:
         args.append('http://%')
         args.append('https://%')
 
-        if after is not None:
-            conditions.append('url > %s')
-            args.append(after)
-
         if prefix is not None:
             conditions.append('url LIKE %s')
             args.append(prefix + '%')
@@ -1448,6 +2036,12 @@ class Database:
         if recheck_age is not None:
             conditions.append('(last_checked IS NULL OR last_checked <= now() - INTERVAL %s)')
             args.append(datetime.timedelta(seconds=recheck_age))
+        else:
+            conditions.append('next_check <= now()')
+
+        if checked_before is not None:
+            conditions.append('(last_checked IS NULL OR last_checked < %s)')
+            args.append(checked_before)
 
         if unchecked_only:
             conditions.append('last_checked IS NULL')
@@ -1459,31 +2053,33 @@ class Database:
             conditions.append('status != 200')
 
         if succeeded_only:
-            conditions.append('status == 200')
+            conditions.append('status = 200')
 
-        conditions_expr = ''
-        limit_expr = ''
-
-        if conditions:
-            conditions_expr = 'WHERE ' + ' AND '.join(conditions)
-
-        if limit:
-            limit_expr = 'LIMIT %s'
-            args.append(limit)
+        cursor = self.db.cursor(name='stream_links', withhold=True)
+        cursor.itersize = itersize
 
-        self.cursor.execute(
-            """
-            SELECT
-                url
-            FROM links
-            {}
-            ORDER BY url
-            {}
-            """.format(conditions_expr, limit_expr),
-            args
-        )
+        try:
+            cursor.execute(
+                """
+                SELECT
+                    url
+                FROM (
+                    SELECT
+                        url,
+                        last_checked IS NOT NULL AS checked,
+                        row_number() OVER (PARTITION BY last_checked IS NOT NULL, substring(url from '^[a-z]+://([^/]*)') ORDER BY url) AS round
+                    FROM links
+                    WHERE {}
+                ) AS due
+                ORDER BY checked, round, url
+                """.format(' AND '.join(conditions)),
+                args
+            )
 
-        return [row[0] for row in self.cursor.fetchall()]
+            for row in cursor:
+                yield row[0]
+        finally:
+            cursor.close()
 
     linkcheck_status_timeout = -1
     linkcheck_status_too_many_redirects = -2
@@ -1492,78 +2088,274 @@ class Database:
     linkcheck_status_invalid_url = -5
     linkcheck_status_dns_error = -6
 
+    # recheck interval is proportional to the time link status has
+    # been stable, so links which have been fine (or broken) for long
+    # are checked rarely, and a changed link is rechecked soon; for
+    # links checked before status_changed was tracked, stability is
+    # counted from the last check, and status_changed is backfilled
+    linkcheck_recheck_factor = 0.5
+    linkcheck_recheck_min = datetime.timedelta(hours=1)
+    linkcheck_recheck_max = datetime.timedelta(days=60)
+
     def UpdateLinkStatus(self, url, status, redirect=None, size=None, location=None):
-        success = status == 200
+        self.UpdateLinkStatuses([(url, status, redirect, size, location)])
 
-        self.cursor.execute(
+    def UpdateLinkStatuses(self, results):
+        """Save link check results and schedule next checks.
+
+        Takes iterable of (url, status, redirect, size, location) tuples.
+        """
+        psycopg2.extras.execute_values(
+            self.cursor,
             """
             UPDATE links
             SET
                 last_checked = now(),
-                last_success = CASE WHEN %s THEN now() ELSE last_success END,
-                last_failure = CASE WHEN %s THEN now() ELSE last_failure END,
-                status = %s,
-                redirect = %s,
-                size = %s,
-                location = %s
-            WHERE url = %s
-            """,
-            (
-                success,
-                not success,
-                status,
-                redirect,
-                size,
-                location,
-                url
-            )
+                last_success = CASE WHEN updates.status = 200 THEN now() ELSE last_success END,
+                last_failure = CASE WHEN updates.status != 200 THEN now() ELSE last_failure END,
+                status = updates.status,
+                redirect = updates.redirect,
+                size = updates.size,
+                location = updates.location,
+                status_changed = CASE WHEN links.status IS DISTINCT FROM updates.status THEN now() ELSE coalesce(links.status_changed, links.last_checked) END,
+                next_check = now() + least(
+                    greatest(
+                        CASE
+                            WHEN links.status IS DISTINCT FROM updates.status THEN INTERVAL '0'
+                            ELSE now() - coalesce(links.status_changed, links.last_checked, now())
+                        END * {factor},
+                        INTERVAL '{min} seconds'
+                    ),
+                    INTERVAL '{max} seconds'
+                )
+            FROM (VALUES %s) AS updates(url, status, redirect, size, location)
+            WHERE links.url = updates.url
+            """.format(
+                factor=float(self.linkcheck_recheck_factor),
+                min=int(self.linkcheck_recheck_min.total_seconds()),
+                max=int(self.linkcheck_recheck_max.total_seconds())
+            ),
+            results,
+            template='(%s, %s::smallint, %s::smallint, %s::bigint, %s)',
+            page_size=1000
         )
 
-    def GetMetapackageLinkStatuses(self, name):
+    def GetLinkCheckRun(self, selection):
         self.cursor.execute(
             """
             SELECT
-                url,
-                last_checked,
-                last_success,
-                last_failure,
-                status,
-                redirect,
-                size,
-                location
-            FROM links
-            WHERE url in (
-                -- this additional wrap seem to fix query planner somehow
-                -- to use index scan on links instead of seq scan, which
-                -- makes the query 100x faster; XXX: recheck with postgres 10
-                -- or report this?
-                SELECT DISTINCT url from (
-                    SELECT
-                        unnest(downloads) as url
-                    FROM packages
-                    WHERE effname = %s
-                    UNION
-                    SELECT
-                        homepage as url
-                    FROM packages
-                    WHERE homepage IS NOT NULL and effname = %s
-                ) AS tmp
+                started,
+                finished
+            FROM linkcheck_runs
+            WHERE selection = %s
+            """,
+            (selection,)
+        )
+
+        return self.cursor.fetchone()
+
+    def StartLinkCheckRun(self, selection):
+        self.cursor.execute('DELETE FROM linkcheck_inflight WHERE selection = %s', (selection,))
+
+        self.cursor.execute(
+            """
+            INSERT
+            INTO linkcheck_runs(
+                selection,
+                started
+            ) VALUES (
+                %s,
+                now()
             )
+            ON CONFLICT (selection)
+            DO UPDATE SET
+                started = now(),
+                finished = NULL
+            RETURNING started
             """,
-            (name, name)
+            (selection,)
+        )
+
+        return self.cursor.fetchone()[0]
+
+    def FinishLinkCheckRun(self, selection):
+        self.cursor.execute('DELETE FROM linkcheck_inflight WHERE selection = %s', (selection,))
+        self.cursor.execute('UPDATE linkcheck_runs SET finished = now() WHERE selection = %s', (selection,))
+
+    def AddLinksInFlight(self, selection, urls):
+        psycopg2.extras.execute_values(
+            self.cursor,
+            """
+            INSERT
+            INTO linkcheck_inflight(
+                url,
+                selection
+            ) VALUES %s
+            ON CONFLICT (url)
+            DO UPDATE SET
+                selection = EXCLUDED.selection
+            """,
+            ((url, selection) for url in urls),
+            page_size=1000
+        )
+
+    def RemoveLinksInFlight(self, urls):
+        self.cursor.execute('DELETE FROM linkcheck_inflight WHERE url = ANY(%s)', (list(urls),))
+
+    def GetLinksInFlight(self, selection):
+        self.cursor.execute('SELECT url FROM linkcheck_inflight WHERE selection = %s ORDER BY url', (selection,))
+
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def __RefreshMetapackageLinks(self, condition='', args=()):
+        self.cursor.execute(
+            """
+            INSERT
+            INTO metapackage_links(
+                effname,
+                links
+            ) SELECT
+                effname,
+                jsonb_object_agg(
+                    url,
+                    jsonb_build_object(
+                        'last_checked', extract(epoch from last_checked),
+                        'last_success', extract(epoch from last_success),
+                        'last_failure', extract(epoch from last_failure),
+                        'status', status,
+                        'redirect', redirect,
+                        'size', size,
+                        'location', location
+                    )
+                )
+            FROM link_metapackages
+            INNER JOIN links USING(url)
+            {}
+            GROUP BY effname
+            ON CONFLICT (effname)
+            DO UPDATE SET
+                links = EXCLUDED.links
+            """.format(condition),
+            args
         )
 
+    def UpdateMetapackageLinks(self):
+        """Update per-metapackage link statuses after packages update.
+
+        New url to metapackage mapping is compared with the current one,
+        and only changed mapping rows are written; link statuses are
+        only rebuilt for metapackages whose set of links has changed,
+        as statuses themselves are kept up to date by link checker.
+        """
+        self.cursor.execute(
+            """
+            CREATE TEMPORARY TABLE extracted_link_metapackages
+            AS
+                SELECT
+                    unnest(downloads) AS url,
+                    effname
+                FROM packages
+                UNION
+                SELECT
+                    homepage,
+                    effname
+                FROM packages
+                WHERE homepage IS NOT NULL
+            """
+        )
+
+        self.cursor.execute('ANALYZE extracted_link_metapackages')
+
+        self.cursor.execute('CREATE TEMPORARY TABLE changed_link_metapackages (effname text not null)')
+
+        self.cursor.execute(
+            """
+            WITH deleted AS (
+                DELETE
+                FROM link_metapackages
+                WHERE NOT EXISTS (
+                    SELECT *
+                    FROM extracted_link_metapackages
+                    WHERE
+                        extracted_link_metapackages.url = link_metapackages.url AND
+                        extracted_link_metapackages.effname = link_metapackages.effname
+                )
+                RETURNING effname
+            )
+            INSERT
+            INTO changed_link_metapackages
+            SELECT effname FROM deleted
+            """
+        )
+
+        self.cursor.execute(
+            """
+            WITH inserted AS (
+                INSERT
+                INTO link_metapackages(
+                    url,
+                    effname
+                ) SELECT
+                    url,
+                    effname
+                FROM extracted_link_metapackages
+                ON CONFLICT (url, effname)
+                DO NOTHING
+                RETURNING effname
+            )
+            INSERT
+            INTO changed_link_metapackages
+            SELECT effname FROM inserted
+            """
+        )
+
+        # metapackages which no longer have any links
+        self.cursor.execute(
+            """
+            DELETE
+            FROM metapackage_links
+            WHERE
+                effname IN (SELECT effname FROM changed_link_metapackages) AND
+                NOT EXISTS (SELECT * FROM link_metapackages WHERE link_metapackages.effname = metapackage_links.effname)
+            """
+        )
+
+        self.__RefreshMetapackageLinks('WHERE effname IN (SELECT effname FROM changed_link_metapackages)')
+
+        self.cursor.execute('DROP TABLE changed_link_metapackages')
+        self.cursor.execute('DROP TABLE extracted_link_metapackages')
+
+    def InvalidateMetapackageLinks(self, urls):
+        """Refresh link statuses of metapackages which use given urls.
+
+        Must be called after link statuses are updated.
+        """
+        self.__RefreshMetapackageLinks(
+            'WHERE effname IN (SELECT effname FROM link_metapackages WHERE url = ANY(%s))',
+            (list(urls),)
+        )
+
+    def GetMetapackageLinkStatuses(self, name):
+        self.cursor.execute('SELECT links FROM metapackage_links WHERE effname = %s', (name,))
+
+        row = self.cursor.fetchone()
+        if row is None:
+            return {}
+
+        def EpochToDatetime(epoch):
+            return datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc) if epoch is not None else None
+
         return {
-            row[0]: {
-                'last_checked': row[1],
-                'last_success': row[2],
-                'last_failure': row[3],
-                'status': row[4],
-                'redirect': row[5],
-                'size': row[6],
-                'location': row[7]
+            url: {
+                'last_checked': EpochToDatetime(status['last_checked']),
+                'last_success': EpochToDatetime(status['last_success']),
+                'last_failure': EpochToDatetime(status['last_failure']),
+                'status': status['status'],
+                'redirect': status['redirect'],
+                'size': status['size'],
+                'location': status['location']
             }
-            for row in self.cursor.fetchall()
+            for url, status in row[0].items()
         }
 
     def GetProblemsCount(self, repo=None, effname=None, maintainer=None):
@@ -1713,23 +2505,30 @@ class Database:
             for row in self.cursor.fetchall()
         ]
 
+    def UpdateMetapackageClusters(self, clusters):
+        self.cursor.execute('DELETE FROM metapackage_clusters')
+
+        psycopg2.extras.execute_values(
+            self.cursor,
+            'INSERT INTO metapackage_clusters(effname, cluster) VALUES %s',
+            clusters.items(),
+            page_size=10000
+        )
+
     def GetRelatedMetapackages(self, name, limit=500):
         self.cursor.execute(
             """
-            WITH RECURSIVE r AS (
-                    SELECT
-                        effname,
-                        url
-                    FROM url_relations
-                    WHERE effname=%s
-                UNION
-                    SELECT
-                        url_relations.effname,
-                        url_relations.url
-                    FROM url_relations
-                    JOIN r ON
-                        url_relations.effname = r.effname OR url_relations.url = r.url
-            ) SELECT DISTINCT effname FROM r ORDER by effname LIMIT %s
+            SELECT
+                effname
+            FROM metapackage_clusters
+            WHERE cluster = (
+                SELECT
+                    cluster
+                FROM metapackage_clusters
+                WHERE effname = %s
+            )
+            ORDER BY effname
+            LIMIT %s
             """,
             (name, limit)
         )
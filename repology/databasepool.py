@@ -0,0 +1,130 @@
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+
+
+class DatabasePoolTimeout(Exception):
+    def __init__(self, timeout):
+        Exception.__init__(self, 'Could not acquire database connection in {:.2f} seconds'.format(timeout))
+
+
+class DatabasePool:
+    def __init__(self, factory, maxsize=4, timeout=None, check_interval=60.0, timer=time.monotonic):
+        self.factory = factory
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.timer = timer
+
+        self.condition = threading.Condition()
+        self.idle = []  # (database, release time) pairs
+        self.size = 0   # number of live connections, both idle and in use
+
+        self.num_acquired = 0
+        self.num_created = 0
+        self.num_discarded = 0
+        self.num_timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def __Discard(self, database):
+        self.num_discarded += 1
+        try:
+            database.Close()
+        except Exception:
+            pass
+
+    def __Create(self):
+        try:
+            database = self.factory()
+        except BaseException:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+
+        self.num_created += 1
+        return database
+
+    def Acquire(self):
+        start = self.timer()
+
+        database = None
+        released = None
+
+        with self.condition:
+            while True:
+                if self.idle:
+                    database, released = self.idle.pop()
+                    break
+
+                if self.size < self.maxsize:
+                    self.size += 1
+                    break
+
+                remaining = None
+                if self.timeout is not None:
+                    remaining = self.timeout - (self.timer() - start)
+                    if remaining <= 0:
+                        self.num_timeouts += 1
+                        raise DatabasePoolTimeout(self.timeout)
+
+                self.condition.wait(remaining)
+
+            wait = self.timer() - start
+            self.num_acquired += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+        if database is None:
+            return self.__Create()
+
+        # check health of connections which were idle for long enough
+        # to be possibly dropped by server or network equipment
+        if self.timer() - released >= self.check_interval and not database.IsAlive():
+            self.__Discard(database)
+            return self.__Create()
+
+        return database
+
+    def Release(self, database, broken=False):
+        if broken or database.IsClosed():
+            self.__Discard(database)
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            return
+
+        with self.condition:
+            self.idle.append((database, self.timer()))
+            self.condition.notify()
+
+    def GetStats(self):
+        with self.condition:
+            return {
+                'size': self.size,
+                'idle': len(self.idle),
+                'maxsize': self.maxsize,
+                'acquired': self.num_acquired,
+                'created': self.num_created,
+                'discarded': self.num_discarded,
+                'timeouts': self.num_timeouts,
+                'avg_wait': self.total_wait / self.num_acquired if self.num_acquired else None,
+                'max_wait': self.max_wait,
+            }
@@ -0,0 +1,157 @@
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import re
+
+
+# stable name of the dump, which is redirected to the file of current generation
+EXPORT_DATA_FILE = 'metapackages.ndjson.gz'
+EXPORT_META_FILE = 'metapackages.json'
+
+EXPORT_GENERATION_FILE_RE = re.compile('metapackages-([0-9]+)\\.ndjson\\.gz$')
+
+
+def GetExportDataFileName(generation):
+    return 'metapackages-{}.ndjson.gz'.format(generation)
+
+
+def LoadExportMeta(path):
+    """Load metadata of published export, or None if there's none."""
+    try:
+        with open(os.path.join(path, EXPORT_META_FILE)) as metafile:
+            return json.load(metafile)
+    except FileNotFoundError:
+        return None
+
+
+def PackageToApiV1Json(package):
+    output = {
+        field: getattr(package, field) for field in (
+            'repo',
+            'subrepo',
+            'name',
+            'version',
+            'origversion',
+            'maintainers',
+            #'category',
+            #'comment',
+            #'homepage',
+            'licenses',
+            'downloads'
+        ) if getattr(package, field)
+    }
+
+    # XXX: these tweaks should be implemented in core
+    if package.homepage:
+        output['www'] = [package.homepage]
+    if package.comment:
+        output['summary'] = package.comment
+    if package.category:
+        output['categories'] = [package.category]
+
+    return output
+
+
+def MetapackageToNDJSONLine(name, packages):
+    return json.dumps({'name': name, 'packages': list(map(PackageToApiV1Json, packages))}) + '\n'
+
+
+def GetFileSha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as infile:
+        for chunk in iter(lambda: infile.read(65536), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class MetapackagesExportWriter:
+    """Writes gzipped NDJSON dump of all metapackages.
+
+    Packagesets are fed in as they are produced by ingestion and
+    written into temporary file. On Publish() the dump is moved into
+    place under a name containing update generation, and only then
+    metadata file containing its name and checksum is replaced, so
+    readers never see partially written dump or checksum which does
+    not match the data. Dumps of a few previous generations are kept
+    for readers which are still downloading them.
+    """
+
+    def __init__(self, path, keep_generations=2):
+        self.path = path
+        self.keep_generations = keep_generations
+        self.tmppath = os.path.join(path, EXPORT_DATA_FILE + '.tmp')
+        self.outfile = gzip.open(self.tmppath, 'wt', encoding='utf-8')
+        self.num_metapackages = 0
+
+    def AddPackageset(self, packageset):
+        if not packageset or all(package.shadow for package in packageset):
+            return
+
+        self.outfile.write(MetapackageToNDJSONLine(packageset[0].effname, packageset))
+        self.num_metapackages += 1
+
+    def __RemoveOldGenerations(self):
+        generations = []
+        for filename in os.listdir(self.path):
+            match = EXPORT_GENERATION_FILE_RE.match(filename)
+            if match:
+                generations.append(int(match.group(1)))
+
+        for generation in sorted(generations)[:-self.keep_generations]:
+            os.remove(os.path.join(self.path, GetExportDataFileName(generation)))
+
+    def Publish(self, generation):
+        self.outfile.close()
+
+        datafile = GetExportDataFileName(generation)
+
+        meta = {
+            'file': datafile,
+            'generation': generation,
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'num_metapackages': self.num_metapackages,
+            'size': os.path.getsize(self.tmppath),
+            'sha256': GetFileSha256(self.tmppath),
+        }
+
+        with open(self.tmppath, 'rb') as tmpfile:
+            os.fsync(tmpfile.fileno())
+        os.replace(self.tmppath, os.path.join(self.path, datafile))
+
+        # metadata goes last, after the data it refers to is in place
+        tmpmetapath = os.path.join(self.path, EXPORT_META_FILE + '.tmp')
+        with open(tmpmetapath, 'w') as metafile:
+            json.dump(meta, metafile)
+            metafile.flush()
+            os.fsync(metafile.fileno())
+        os.replace(tmpmetapath, os.path.join(self.path, EXPORT_META_FILE))
+
+        self.__RemoveOldGenerations()
+
+        return meta
+
+    def Discard(self):
+        self.outfile.close()
+        try:
+            os.remove(self.tmppath)
+        except FileNotFoundError:
+            pass
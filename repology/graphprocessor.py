@@ -17,60 +17,159 @@
 
 import math
 
+import numpy
+
+
+def RemoveStraightLines(x, y):
+    # drop inner points of runs of equal values, which do not
+    # affect the shape of the graph
+    if len(y) < 3:
+        return x, y
+
+    keep = numpy.ones(len(y), dtype=bool)
+    keep[1:-1] = (y[1:-1] != y[:-2]) | (y[1:-1] != y[2:])
+
+    return x[keep], y[keep]
+
+
+def LargestTriangleThreeBuckets(x, y, threshold):
+    """Downsample series to threshold points preserving its visual shape.
+
+    Implements Largest-Triangle-Three-Buckets algorithm by Sveinn
+    Steinarsson. Returns indexes of selected points.
+    """
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return numpy.arange(length)
+
+    # first and last points are always kept, the rest are split into
+    # threshold - 2 buckets of (almost) equal size
+    edges = numpy.linspace(1, length - 1, threshold - 1).astype(int)
+
+    selected = numpy.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = length - 1
+
+    prev = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+
+        # average point of the next bucket (or the last point)
+        if bucket < threshold - 3:
+            nextx = x[end:edges[bucket + 2]].mean()
+            nexty = y[end:edges[bucket + 2]].mean()
+        else:
+            nextx = x[-1]
+            nexty = y[-1]
+
+        # pick point forming largest triangle with previously selected
+        # point and next bucket average
+        area_left = (x[prev] - nextx) * (y[start:end] - y[prev])
+        area_right = (x[prev] - x[start:end]) * (nexty - y[prev])
+        areas = numpy.abs(area_left - area_right)
+
+        prev = start + int(areas.argmax())
+        selected[bucket + 1] = prev
+
+    return selected
+
+
+def TimesToSeconds(times):
+    times = numpy.asarray(times)
+    if times.dtype.kind == 'm':
+        return times / numpy.timedelta64(1, 's')
+    if times.dtype.kind == 'O':
+        return numpy.array([time.total_seconds() for time in times.tolist()], dtype=float)
+    return times.astype(float)
+
 
 class GraphProcessor:
     def __init__(self):
-        self.minval = None
-        self.maxval = None
-        self.points = []
+        self.time_chunks = []
+        self.value_chunks = []
         self.float = False
 
+        self.x = None
+        self.y = None
+
+    def __GetArrays(self):
+        if self.x is None:
+            x = numpy.concatenate(self.time_chunks) if self.time_chunks else numpy.empty(0)
+            y = numpy.concatenate(self.value_chunks).astype(float) if self.value_chunks else numpy.empty(0)
+            self.x, self.y = RemoveStraightLines(x, y)
+        return self.x, self.y
+
     def AddPoint(self, time, value):
-        # minor optimization of merging straight lines
-        if len(self.points) >= 2 and value == self.points[-1][1] and value == self.points[-2][1]:
-            del(self.points[-1])
-
-        self.minval = value if self.minval is None else min(value, self.minval)
-        self.maxval = value if self.maxval is None else max(value, self.maxval)
-        self.points.append([time, value])
-        if isinstance(value, float):
+        self.AddPoints([time], [value])
+
+    def AddPoints(self, times, values):
+        """Add points; times are timedeltas or seconds, in chronological order."""
+        times = TimesToSeconds(times)
+        values = numpy.asarray(values)
+
+        if len(times) != len(values):
+            raise RuntimeError('number of times and values do not match')
+
+        if values.dtype.kind == 'f':
             self.float = True
 
-    def GetPoints(self, period):
-        if self.minval is None:
+        self.time_chunks.append(times)
+        self.value_chunks.append(values)
+        self.x = None
+        self.y = None
+
+    @property
+    def minval(self):
+        x, y = self.__GetArrays()
+        return y.min().item() if len(y) else None
+
+    @property
+    def maxval(self):
+        x, y = self.__GetArrays()
+        return y.max().item() if len(y) else None
+
+    def GetPoints(self, period, maxpoints=None):
+        x, y = self.__GetArrays()
+
+        if not len(y):
             return []
 
-        if self.minval == self.maxval:
+        minval, maxval = y.min(), y.max()
+
+        if minval == maxval:
             return [
                 (
-                    self.points[0][0].total_seconds() / period,
+                    x[0].item() / period,
                     0.5
                 ),
                 (
-                    self.points[-1][0].total_seconds() / period,
+                    x[-1].item() / period,
                     0.5
                 )
             ]
 
-        return [
-            (
-                point[0].total_seconds() / period,
-                (point[1] - self.minval) / (self.maxval - self.minval)
-            ) for point in self.points
-        ]
+        x = x / period
+        y = (y - minval) / (maxval - minval)
+
+        if maxpoints is not None:
+            selected = LargestTriangleThreeBuckets(x, y, maxpoints)
+            x = x[selected]
+            y = y[selected]
+
+        return list(zip(x.tolist(), y.tolist()))
 
     def GetYTicks(self, suffix=''):
-        if self.minval is None:
-            return []
+        minval, maxval = self.minval, self.maxval
 
-        if self.minval == self.maxval:
-            value = self.points[0][1]
+        if minval is None:
+            return []
 
-            rounding = 0 if isinstance(value, int) else 3
+        if minval == maxval:
+            rounding = 3 if self.float else 0
 
-            return [(0.5, '{:.{}f}{}'.format(value, rounding, suffix))]
+            return [(0.5, '{:.{}f}{}'.format(minval, rounding, suffix))]
 
-        step = (self.maxval - self.minval) / 10
+        step = (maxval - minval) / 10
 
         steps = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000]
         if self.float:
@@ -89,12 +188,12 @@ class GraphProcessor:
         elif step < 1:
             rounding = 1
 
-        lowtick = math.ceil(self.minval / step) * step
-        numticks = int((self.maxval - lowtick) / step) + 1
+        lowtick = math.ceil(minval / step) * step
+        numticks = int((maxval - lowtick) / step) + 1
 
         return [
             (
-                (lowtick + step * n - self.minval) / (self.maxval - self.minval),
+                (lowtick + step * n - minval) / (maxval - minval),
                 '{:.{}f}{}'.format(lowtick + step * n, rounding, suffix)
             ) for n in range(numticks)
         ]
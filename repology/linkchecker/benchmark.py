@@ -0,0 +1,369 @@
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import multiprocessing
+import random
+import socket
+import threading
+import time
+from collections import Counter, defaultdict
+
+from aiohttp import web
+
+from repology.database import Database
+from repology.linkchecker.blocking import GetLinkStatuses
+from repology.linkchecker.common import LinkCheckStats
+from repology.linkchecker.engine import AsyncLinkChecker
+from repology.linkchecker.resolver import DNSCache
+from repology.linkchecker.scheduler import DistributeLinks, GetUrlHost, HostScheduler
+from repology.linkchecker.writer import LinkStatusWriter
+
+
+# share of links of each kind on live hosts
+LINK_KINDS = [
+    ('ok', 0.70),
+    ('notfound', 0.10),
+    ('redirect', 0.10),
+    ('large', 0.05),
+    ('hang', 0.05),
+]
+
+# share of hosts which don't resolve and which refuse connections
+DEAD_HOSTS_SHARE = 0.03
+REFUSING_HOSTS_SHARE = 0.02
+
+
+class SyntheticWeb:
+    """Local HTTP server farm which simulates many virtual hosts.
+
+    Each live host is a separate loopback address (127.1.x.y) served
+    by a single aiohttp server running in a background thread, and
+    has its own response latency. Links are distributed between hosts
+    with Zipf law, so there are few large hosts and a long tail of
+    small ones, like in the real links table. Link kinds:
+
+    - ok: plain 200 reply
+    - notfound: 404 reply
+    - redirect: chain of 1..max_redirects permanent redirects
+    - large: large file on server which supports neither HEAD nor ranges
+    - hang: reply which takes hang_time seconds, for timeouts
+
+    Additionally some hosts are unresolvable (.invalid domain) or
+    refuse connections (127.2.x.y address nobody listens on).
+    """
+
+    def __init__(self, numhosts=100, numlinks=1000, latency=0.05, hang_time=10.0, large_size=10000000, max_redirects=3, seed=0):
+        self.latency = latency
+        self.hang_time = hang_time
+        self.large_size = large_size
+
+        self.rnd = random.Random(seed)
+        self.port = None
+        self.sockets = []
+        self.latencies = {}
+
+        self.thread = None
+        self.loop = None
+        self.runner = None
+
+        self.hosts = []
+        for n in range(numhosts):
+            kind = self.rnd.choices(['live', 'dead', 'refusing'], [1 - DEAD_HOSTS_SHARE - REFUSING_HOSTS_SHARE, DEAD_HOSTS_SHARE, REFUSING_HOSTS_SHARE])[0]
+            if kind == 'dead':
+                host = 'dead{}.invalid'.format(n)
+            else:
+                host = '127.{}.{}.{}'.format(1 if kind == 'live' else 2, n // 250, n % 250 + 1)
+                self.latencies[host] = self.rnd.uniform(0, latency * 2)
+            self.hosts.append((host, kind))
+
+        weights = [1.0 / (n + 1) for n in range(numhosts)]
+        self.plan = []
+        for n in range(numlinks):
+            host, hostkind = self.rnd.choices(self.hosts, weights)[0]
+            linkkind = self.rnd.choices([kind for kind, share in LINK_KINDS], [share for kind, share in LINK_KINDS])[0] if hostkind == 'live' else hostkind
+            self.plan.append((host, linkkind, n, self.rnd.randint(1, max_redirects)))
+
+    def __HostBase(self, host):
+        if host.endswith('.invalid'):
+            return 'http://{}'.format(host)
+        return 'http://{}:{}'.format(host, self.port)
+
+    def GetLinks(self):
+        """Return list of (url, kind, expected result); server must be started."""
+        links = []
+        for host, kind, n, redirects in self.plan:
+            base = self.__HostBase(host)
+            if kind == 'ok':
+                links.append((base + '/ok/{}'.format(n), kind, (200, None, 1000 + n, None)))
+            elif kind == 'notfound':
+                links.append((base + '/notfound/{}'.format(n), kind, (404, None, None, None)))
+            elif kind == 'redirect':
+                links.append((base + '/redirect/{}/{}'.format(redirects, n), kind, (200, 301, 1000 + n, base + '/redirect/0/{}'.format(n))))
+            elif kind == 'large':
+                links.append((base + '/large/{}'.format(n), kind, (200, None, self.large_size, None)))
+            elif kind == 'hang':
+                links.append((base + '/hang/{}'.format(n), kind, (Database.linkcheck_status_timeout, None, None, None)))
+            elif kind == 'dead':
+                links.append((base + '/{}'.format(n), kind, (Database.linkcheck_status_dns_error, None, None, None)))
+            elif kind == 'refusing':
+                links.append((base + '/{}'.format(n), kind, (Database.linkcheck_status_cannot_connect, None, None, None)))
+
+        return links
+
+    async def __Handle(self, request):
+        await asyncio.sleep(self.latencies.get(request.url.host, 0))
+
+        parts = request.path.strip('/').split('/')
+
+        if parts[0] == 'ok':
+            return web.Response(body=b'x' * (1000 + int(parts[1])))
+        elif parts[0] == 'redirect':
+            if parts[1] == '0':
+                return web.Response(body=b'x' * (1000 + int(parts[2])))
+            return web.Response(status=301, headers={'Location': '/redirect/{}/{}'.format(int(parts[1]) - 1, parts[2])})
+        elif parts[0] == 'large':
+            if request.method == 'HEAD':
+                return web.Response(status=405)
+
+            response = web.StreamResponse()
+            response.content_length = self.large_size
+            await response.prepare(request)
+
+            chunk = b'x' * 65536
+            try:
+                for offset in range(0, self.large_size, len(chunk)):
+                    await response.write(chunk[:self.large_size - offset])
+            except (ConnectionError, RuntimeError):
+                pass  # client is not interested in the body
+
+            return response
+        elif parts[0] == 'hang':
+            await asyncio.sleep(self.hang_time)
+            return web.Response()
+
+        return web.Response(status=404)
+
+    def __Bind(self, host, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        return sock
+
+    def Start(self):
+        livehosts = [host for host, kind in self.hosts if kind == 'live']
+
+        # all hosts share the port, which is picked by the first bind
+        if livehosts:
+            self.sockets.append(self.__Bind(livehosts[0], 0))
+            self.port = self.sockets[0].getsockname()[1]
+            for host in livehosts[1:]:
+                self.sockets.append(self.__Bind(host, self.port))
+        else:
+            self.port = 1
+
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        async def Setup():
+            app = web.Application()
+            app.router.add_route('*', '/{tail:.*}', self.__Handle)
+
+            self.runner = web.AppRunner(app, handle_signals=False)
+            await self.runner.setup()
+            for sock in self.sockets:
+                await web.SockSite(self.runner, sock, backlog=1024).start()
+
+        def Serve():
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(Setup())
+            started.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=Serve)
+        self.thread.daemon = True
+        self.thread.start()
+        started.wait()
+
+    def Stop(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def __enter__(self):
+        self.Start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Stop()
+
+
+class SyntheticLinksDatabase:
+    """In-memory links table with Database methods used by link checker."""
+
+    def __init__(self, urls):
+        self.links = {url: None for url in urls}
+        self.num_commits = 0
+
+    def StreamLinksForCheck(self, **kwargs):
+        # same host interleaving as in real database
+        rounds = defaultdict(int)
+        ordered = []
+        for url in sorted(self.links):
+            host = GetUrlHost(url)
+            ordered.append((rounds[host], url))
+            rounds[host] += 1
+
+        for round, url in sorted(ordered):
+            yield url
+
+    def UpdateLinkStatuses(self, results):
+        for result in results:
+            self.links[result[0]] = result[1:]
+
+    def RemoveLinksInFlight(self, urls):
+        pass
+
+    def Commit(self):
+        self.num_commits += 1
+
+    def Rollback(self):
+        pass
+
+
+class SyntheticLinksDatabaseProxy:
+    """Forwards committed link statuses from a worker process to master."""
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.pending = []
+
+    def UpdateLinkStatuses(self, results):
+        self.pending.extend(results)
+
+    def RemoveLinksInFlight(self, urls):
+        pass
+
+    def Commit(self):
+        self.queue.put(('results', self.pending))
+        self.pending = []
+
+    def Rollback(self):
+        self.pending = []
+
+
+class BenchmarkResult:
+    def __init__(self, links, statuses, elapsed, stats):
+        self.elapsed = elapsed
+        self.stats = stats
+
+        self.num_links = len(links)
+        self.num_checked = 0
+        self.kinds = defaultdict(Counter)
+        self.mismatches = []
+
+        for url, kind, expected in links:
+            actual = statuses.get(url)
+            if actual is not None:
+                self.num_checked += 1
+
+            if actual == expected:
+                self.kinds[kind]['correct'] += 1
+            else:
+                self.kinds[kind]['wrong'] += 1
+                self.mismatches.append((url, expected, actual))
+
+    def IsCorrect(self):
+        return not self.mismatches
+
+    def Print(self, file=None):
+        print('        Time: {:.2f}s'.format(self.elapsed), file=file)
+        print('        URLs: {} of {} checked, {:.1f} URLs/s'.format(self.num_checked, self.num_links, self.num_checked / self.elapsed if self.elapsed else 0), file=file)
+        print('       Bytes: {}'.format(self.stats), file=file)
+        for kind, counts in sorted(self.kinds.items()):
+            print('    {:>8}: {} correct, {} wrong'.format(kind, counts['correct'], counts['wrong']), file=file)
+        for url, expected, actual in self.mismatches[:10]:
+            print('    mismatch: {}: expected {}, got {}'.format(url, expected, actual), file=file)
+
+
+def RunAsyncBenchmark(links, timeout=60.0, delay=3.0, concurrency=1000, flush_size=1000):
+    database = SyntheticLinksDatabase([link[0] for link in links])
+
+    checker = AsyncLinkChecker(timeout=timeout, delay=delay, concurrency=concurrency, stats_interval=None)
+
+    start = time.monotonic()
+    with LinkStatusWriter(database, max_size=flush_size) as writer:
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(checker.Run(database.StreamLinksForCheck(), writer.Add))
+        finally:
+            loop.close()
+
+    return BenchmarkResult(links, database.links, time.monotonic() - start, checker.stats)
+
+
+def SyncBenchmarkWorker(queue, results, timeout, delay, flush_size):
+    scheduler = HostScheduler(delay)
+    stats = LinkCheckStats()
+    dns_cache = DNSCache()
+
+    # same writer as in repology-linkchecker.py workers
+    with LinkStatusWriter(SyntheticLinksDatabaseProxy(results), max_size=flush_size) as writer:
+        while True:
+            pack = queue.get()
+            if pack is None:
+                break
+
+            for result in GetLinkStatuses(pack, delay=delay, timeout=timeout, stats=stats, scheduler=scheduler, dns_cache=dns_cache):
+                writer.Add(result)
+
+    results.put(('stats', (stats.num_checks, stats.num_bytes)))
+
+
+def RunSyncBenchmark(links, timeout=60.0, delay=3.0, jobs=1, packsize=128, flush_size=1000):
+    database = SyntheticLinksDatabase([link[0] for link in links])
+
+    start = time.monotonic()
+
+    queues = [multiprocessing.Queue() for i in range(jobs)]
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=SyncBenchmarkWorker, args=(queue, results, timeout, delay, flush_size)) for queue in queues]
+    for process in processes:
+        process.start()
+
+    DistributeLinks(database.StreamLinksForCheck(), queues, packsize)
+
+    for queue in queues:
+        queue.put(None)
+
+    stats = LinkCheckStats()
+    numfinished = 0
+    while numfinished < jobs:
+        kind, data = results.get()
+        if kind == 'results':
+            database.UpdateLinkStatuses(data)
+            database.Commit()
+        else:
+            stats.num_checks += data[0]
+            stats.num_bytes += data[1]
+            numfinished += 1
+
+    for process in processes:
+        process.join()
+
+    return BenchmarkResult(links, database.links, time.monotonic() - start, stats)
@@ -0,0 +1,123 @@
+# Copyright (C) 2016-2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import socket
+import time
+import urllib.parse
+
+import requests
+
+from repology.database import Database
+from repology.linkchecker.common import EstimateHeadersSize, GET_HEADERS, GetStatusAndSize, USER_AGENT
+from repology.linkchecker.scheduler import HostScheduler
+
+
+def CountResponseBytes(response):
+    # body is not consumed, so only headers are transferred (apart
+    # from what was buffered along with them)
+    return sum(EstimateHeadersSize(r.headers) for r in response.history) + EstimateHeadersSize(response.headers)
+
+
+def GetHTTPLinkStatus(url, timeout, stats=None, dns_cache=None):
+    num_bytes = 0
+
+    try:
+        host = urllib.parse.urlparse(url).hostname
+
+        # requests can't use our resolver, but resolving through the
+        # cache first makes all urls of a dead domain fail without I/O
+        if dns_cache is not None and host:
+            dns_cache.Resolve(host)
+
+        response = requests.head(url, allow_redirects=True, headers={'user-agent': USER_AGENT}, timeout=timeout)
+        num_bytes += CountResponseBytes(response)
+
+        # fallback to GET; response is streamed and closed right after
+        # the headers, so the body is not downloaded
+        if response.status_code != 200:
+            response = requests.get(url, allow_redirects=True, headers={'user-agent': USER_AGENT, **GET_HEADERS}, timeout=timeout, stream=True)
+            response.close()
+            num_bytes += CountResponseBytes(response)
+
+        redirect = None
+        location = None
+
+        # handle redirect chain
+        if response.history:
+            redirect = response.history[0].status_code
+
+            # resolve permanent (and only permament!) redirect chain
+            for h in response.history:
+                if h.status_code == 301:
+                    location = urllib.parse.urljoin(h.url, h.headers.get('location'))
+
+        status, size = GetStatusAndSize(response.status_code, response.headers)
+
+        return (url, status, redirect, size, location)
+    except KeyboardInterrupt:
+        raise
+    except requests.Timeout:
+        return (url, Database.linkcheck_status_timeout, None, None, None)
+    except requests.TooManyRedirects:
+        return (url, Database.linkcheck_status_too_many_redirects, None, None, None)
+    except socket.gaierror:
+        return (url, Database.linkcheck_status_dns_error, None, None, None)
+    except requests.ConnectionError:
+        # check for DNS error additionally
+        try:
+            if dns_cache is not None:
+                dns_cache.Resolve(host)
+            else:
+                socket.gethostbyname(host)
+        except socket.gaierror:
+            return (url, Database.linkcheck_status_dns_error, None, None, None)
+        except Exception:
+            pass
+        return (url, Database.linkcheck_status_cannot_connect, None, None, None)
+    except requests.exceptions.InvalidURL:
+        return (url, Database.linkcheck_status_invalid_url, None, None, None)
+    except Exception:
+        return (url, Database.linkcheck_status_unknown_error, None, None, None)
+    finally:
+        if stats is not None:
+            stats.Add(num_bytes)
+
+
+def GetLinkStatuses(urls, delay, timeout, stats=None, scheduler=None, dns_cache=None):
+    # scheduler may be shared between calls so host rate limits
+    # persist between packs
+    if scheduler is None:
+        scheduler = HostScheduler(delay)
+
+    for url in urls:
+        # XXX: add support for gentoo mirrors, skip for now
+        if url.startswith('http://') or url.startswith('https://'):
+            scheduler.Add(url)
+
+    results = []
+    while len(scheduler):
+        url = scheduler.Pop()
+        if url is None:
+            time.sleep(scheduler.GetWait())
+            continue
+
+        try:
+            results.append(GetHTTPLinkStatus(url, timeout, stats, dns_cache))
+        finally:
+            scheduler.Done(url)
+
+    return results
@@ -0,0 +1,115 @@
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+from repology.logger import NoopLogger
+
+
+class LinkCheckRun:
+    """Persistent state of a link checker run, which allows resuming it.
+
+    Each selection of links (see GetSelection) has its own run. Run
+    start time serves as a cursor: when a run is resumed, links which
+    were checked (and written) since it started are not selected again.
+    Links are recorded as in flight in packs before they are handed
+    to the checker, and removed from that list when their results are
+    written (see LinkStatusWriter clear_inflight). Thus links which are
+    still in flight on resume are ones whose checks were interrupted or
+    whose results were lost, and these are checked first.
+    """
+
+    def __init__(self, database, selection, packsize=1000, logger=NoopLogger()):
+        self.database = database
+        self.selection = selection
+        self.packsize = packsize
+        self.logger = logger
+
+        self.started = None
+        self.leftover = []
+
+    def Start(self, resume=False):
+        run = self.database.GetLinkCheckRun(self.selection) if resume else None
+
+        if run is not None and run[1] is None:
+            self.started = run[0]
+            self.leftover = self.database.GetLinksInFlight(self.selection)
+            self.logger.Log('Resuming run started at {}, {} urls were in flight'.format(self.started, len(self.leftover)))
+        else:
+            if resume:
+                self.logger.Log('No interrupted run to resume, starting new one')
+            self.started = self.database.StartLinkCheckRun(self.selection)
+            self.leftover = []
+
+        self.database.Commit()
+
+        return self.started
+
+    def __Claim(self, pack):
+        self.database.AddLinksInFlight(self.selection, pack)
+        self.database.Commit()
+
+    def IterUrls(self, urls):
+        """Pass urls through, recording them as in flight in packs."""
+        leftover = set(self.leftover)
+
+        for url in self.leftover:
+            yield url
+
+        pack = []
+        for url in urls:
+            if url in leftover:
+                continue
+
+            pack.append(url)
+            if len(pack) >= self.packsize:
+                self.__Claim(pack)
+                yield from pack
+                pack = []
+
+        if pack:
+            self.__Claim(pack)
+            yield from pack
+
+    def Finish(self):
+        self.database.FinishLinkCheckRun(self.selection)
+        self.database.Commit()
+
+
+def GetSelection(prefix=None, recheck_age=None, unchecked_only=False, checked_only=False, failed_only=False, succeeded_only=False):
+    """Build a key which identifies selection of links to check."""
+    parts = []
+
+    if recheck_age is not None:
+        parts.append('age={}'.format(recheck_age))
+    else:
+        parts.append('due')
+
+    if unchecked_only:
+        parts.append('unchecked')
+
+    if checked_only:
+        parts.append('checked')
+
+    if failed_only:
+        parts.append('failed')
+
+    if succeeded_only:
+        parts.append('succeeded')
+
+    if prefix is not None:
+        parts.append('prefix={}'.format(prefix))
+
+    return ' '.join(parts)
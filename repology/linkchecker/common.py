@@ -0,0 +1,71 @@
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+
+
+USER_AGENT = 'Repology link checker/0'
+
+# GET fallback only asks for the first byte of the resource; servers
+# which don't support ranges reply with full body, but the response is
+# closed right after headers are received anyway
+GET_HEADERS = {'range': 'bytes=0-0'}
+
+CONTENT_RANGE_TOTAL = re.compile('/([0-9]+)$')
+
+
+def GetStatusAndSize(status, headers):
+    """Convert response status and headers into (status, size).
+
+    Partial content replies to ranged GET fallback mean the resource
+    is available, so they are reported as 200 with full size taken
+    from Content-Range. 416 (range not satisfiable) is returned for
+    existing empty resources.
+    """
+    if status in (206, 416):
+        match = CONTENT_RANGE_TOTAL.search(headers.get('content-range', ''))
+        return 200, int(match.group(1)) if match else None
+
+    if status == 200:
+        content_length = headers.get('content-length')
+        if content_length:
+            return 200, int(content_length)
+
+    return status, None
+
+
+def EstimateHeadersSize(headers):
+    # status line, header lines and terminating empty line; exact
+    # wire size is not available from http client libraries
+    return 17 + sum(len(name) + len(value) + 4 for name, value in headers.items())
+
+
+class LinkCheckStats:
+    def __init__(self):
+        self.num_checks = 0
+        self.num_bytes = 0
+
+    def Add(self, num_bytes):
+        self.num_checks += 1
+        self.num_bytes += num_bytes
+
+    def __str__(self):
+        return '{} checks, {} bytes received ({:.0f} bytes per check)'.format(
+            self.num_checks,
+            self.num_bytes,
+            self.num_bytes / self.num_checks if self.num_checks else 0
+        )
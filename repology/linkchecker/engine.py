@@ -0,0 +1,216 @@
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import socket
+import urllib.parse
+
+import aiohttp
+
+from repology.database import Database
+from repology.linkchecker.common import EstimateHeadersSize, GET_HEADERS, GetStatusAndSize, LinkCheckStats, USER_AGENT
+from repology.linkchecker.resolver import CachingResolver, DNSCache
+from repology.linkchecker.scheduler import HostScheduler
+from repology.logger import NoopLogger
+
+
+class AsyncLinkChecker:
+    """Checks links with many concurrent requests in a single thread.
+
+    Produces the same (url, status, redirect, size, location) tuples
+    as GetHTTPLinkStatus.
+    """
+
+    def __init__(self, timeout=60.0, delay=3.0, concurrency=1000, host_concurrency=1, max_redirects=30, buffer_size=None, logger=NoopLogger(), stats_interval=60.0, dns_cache=None):
+        self.timeout = timeout
+        self.delay = delay
+        self.concurrency = concurrency
+        self.host_concurrency = host_concurrency
+        self.max_redirects = max_redirects
+        self.buffer_size = buffer_size if buffer_size is not None else concurrency * 10
+        self.logger = logger
+        self.stats_interval = stats_interval
+
+        self.scheduler = None
+        self.stats = LinkCheckStats()
+        self.dns_cache = dns_cache if dns_cache is not None else DNSCache()
+
+    async def __IsDNSError(self, host):
+        # the host was just resolved while connecting, so this is
+        # normally answered from the cache
+        try:
+            await self.dns_cache.ResolveAsync(host)
+        except socket.gaierror:
+            return True
+        except Exception:
+            pass
+        return False
+
+    def __CountBytes(self, response):
+        # body is never read explicitly, but some of it may have
+        # arrived along with the headers
+        return sum(EstimateHeadersSize(r.headers) for r in response.history) + EstimateHeadersSize(response.headers) + getattr(response.content, 'total_bytes', 0)
+
+    async def __Request(self, session, method, url, headers=None):
+        response = await session.request(method, url, allow_redirects=True, max_redirects=self.max_redirects, headers=headers)
+
+        # close the connection right after the headers, so the body is
+        # never downloaded
+        response.close()
+
+        return response
+
+    async def CheckUrl(self, session, url):
+        host = urllib.parse.urlparse(url).hostname
+        num_bytes = 0
+
+        try:
+            # all urls of a domain found dead fail without any I/O
+            if host and self.dns_cache.IsDead(host):
+                return (url, Database.linkcheck_status_dns_error, None, None, None)
+
+            response = await self.__Request(session, 'HEAD', url)
+            num_bytes += self.__CountBytes(response)
+
+            # fallback to GET
+            if response.status != 200:
+                response = await self.__Request(session, 'GET', url, GET_HEADERS)
+                num_bytes += self.__CountBytes(response)
+
+            redirect = None
+            location = None
+
+            # handle redirect chain
+            if response.history:
+                redirect = response.history[0].status
+
+                # resolve permanent (and only permament!) redirect chain
+                for h in response.history:
+                    if h.status == 301:
+                        location = urllib.parse.urljoin(str(h.url), h.headers.get('location'))
+
+            status, size = GetStatusAndSize(response.status, response.headers)
+
+            return (url, status, redirect, size, location)
+        except asyncio.TimeoutError:
+            return (url, Database.linkcheck_status_timeout, None, None, None)
+        except aiohttp.TooManyRedirects:
+            return (url, Database.linkcheck_status_too_many_redirects, None, None, None)
+        except aiohttp.InvalidURL:
+            return (url, Database.linkcheck_status_invalid_url, None, None, None)
+        except aiohttp.ClientConnectionError:
+            # check for DNS error additionally
+            if host and await self.__IsDNSError(host):
+                return (url, Database.linkcheck_status_dns_error, None, None, None)
+            return (url, Database.linkcheck_status_cannot_connect, None, None, None)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            return (url, Database.linkcheck_status_unknown_error, None, None, None)
+        finally:
+            self.stats.Add(num_bytes)
+
+    async def __CheckUrlScheduled(self, session, url):
+        try:
+            return await self.CheckUrl(session, url)
+        finally:
+            self.scheduler.Done(url)
+
+    def __LogHostStats(self):
+        self.logger.Log('{}; {}; {} urls queued, {} in flight; busiest hosts: {}'.format(
+            self.stats,
+            self.dns_cache,
+            len(self.scheduler),
+            self.scheduler.num_inflight,
+            self.scheduler.GetHostStatsString()
+        ))
+
+    async def Run(self, urls, callback):
+        """Check all urls from given iterable, calling callback with each result.
+
+        Urls are taken from the iterable into the HostScheduler buffer
+        of up to buffer_size urls, and checks are started in the order
+        it decides, with no more than concurrency checks in flight at
+        a time. Urls waiting for their host's turn don't occupy any
+        slots, so a slow or large host never blocks the others.
+        """
+        loop = asyncio.get_event_loop()
+
+        self.scheduler = HostScheduler(self.delay, host_concurrency=self.host_concurrency, timer=loop.time)
+
+        # aiohttp's own dns cache is replaced by ours, which also
+        # remembers failures
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=0, force_close=True, resolver=CachingResolver(self.dns_cache), use_dns_cache=False)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        urls = iter(urls)
+        exhausted = False
+        pending = set()
+        last_stats = loop.time()
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers={'user-agent': USER_AGENT}) as session:
+            try:
+                while True:
+                    while not exhausted and len(self.scheduler) < self.buffer_size:
+                        url = next(urls, None)
+                        if url is None:
+                            exhausted = True
+                        # XXX: add support for gentoo mirrors, skip for now
+                        elif url.startswith('http://') or url.startswith('https://'):
+                            self.scheduler.Add(url)
+
+                    while len(pending) < self.concurrency:
+                        url = self.scheduler.Pop()
+                        if url is None:
+                            break
+                        pending.add(asyncio.ensure_future(self.__CheckUrlScheduled(session, url)))
+
+                    if not pending:
+                        if exhausted and not len(self.scheduler):
+                            break
+
+                        # everything left waits for host tokens
+                        await asyncio.sleep(self.scheduler.GetWait())
+                        continue
+
+                    done, pending = await asyncio.wait(pending, timeout=self.scheduler.GetWait(), return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        callback(task.result())
+
+                    if self.stats_interval is not None and loop.time() - last_stats >= self.stats_interval:
+                        self.__LogHostStats()
+                        last_stats = loop.time()
+            finally:
+                # interrupted checks are abandoned
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    await asyncio.wait(pending)
+
+        self.__LogHostStats()
+
+    def CheckUrls(self, urls):
+        """Synchronous helper which returns list of results."""
+        results = []
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self.Run(urls, results.append))
+        finally:
+            loop.close()
+
+        return results
@@ -0,0 +1,151 @@
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import socket
+import time
+
+import aiohttp.abc
+
+
+class DNSCache:
+    """Caches hostname resolution results for the link checker.
+
+    Successful lookups are kept for ttl seconds. Failed lookups are
+    kept for negative_ttl seconds, so all urls of a dead domain fail
+    without network I/O; temporary failures (EAI_AGAIN) are not cached.
+    """
+
+    def __init__(self, ttl=600.0, negative_ttl=3600.0, timer=time.monotonic):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timer = timer
+
+        self.positive = {}  # (host, port, family) -> (expires, addrinfos)
+        self.negative = {}  # host -> (expires, error)
+
+        self.num_lookups = 0
+        self.num_hits = 0
+        self.num_negative_hits = 0
+        self.num_failures = 0
+
+    def __Lookup(self, key):
+        self.num_lookups += 1
+
+        now = self.timer()
+
+        negative = self.negative.get(key[0])
+        if negative is not None:
+            if negative[0] > now:
+                self.num_hits += 1
+                self.num_negative_hits += 1
+                raise negative[1]
+            del self.negative[key[0]]
+
+        positive = self.positive.get(key)
+        if positive is not None:
+            if positive[0] > now:
+                self.num_hits += 1
+                return positive[1]
+            del self.positive[key]
+
+        return None
+
+    def __Store(self, key, addrinfos):
+        self.positive[key] = (self.timer() + self.ttl, addrinfos)
+
+    def __StoreError(self, key, error):
+        self.num_failures += 1
+        if error.errno != socket.EAI_AGAIN:
+            self.negative[key[0]] = (self.timer() + self.negative_ttl, error)
+
+    def IsDead(self, host):
+        """Check whether host is known to not resolve, without any I/O."""
+        negative = self.negative.get(host)
+        return negative is not None and negative[0] > self.timer()
+
+    def Resolve(self, host, port=None, family=socket.AF_UNSPEC):
+        """Blocking getaddrinfo with caching; raises socket.gaierror on failure."""
+        key = (host, port, family)
+
+        addrinfos = self.__Lookup(key)
+        if addrinfos is not None:
+            return addrinfos
+
+        try:
+            addrinfos = socket.getaddrinfo(host, port, family, socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            self.__StoreError(key, e)
+            raise
+
+        self.__Store(key, addrinfos)
+        return addrinfos
+
+    async def ResolveAsync(self, host, port=None, family=socket.AF_UNSPEC):
+        """Asynchronous version of Resolve."""
+        key = (host, port, family)
+
+        addrinfos = self.__Lookup(key)
+        if addrinfos is not None:
+            return addrinfos
+
+        try:
+            addrinfos = await asyncio.get_event_loop().getaddrinfo(host, port, family=family, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            self.__StoreError(key, e)
+            raise
+
+        self.__Store(key, addrinfos)
+        return addrinfos
+
+    def __str__(self):
+        return 'DNS cache: {} lookups, {} hits ({:.0f}%), {} negative hits, {} failed lookups, {} hosts known dead'.format(
+            self.num_lookups,
+            self.num_hits,
+            self.num_hits * 100.0 / self.num_lookups if self.num_lookups else 0,
+            self.num_negative_hits,
+            self.num_failures,
+            len(self.negative)
+        )
+
+
+class CachingResolver(aiohttp.abc.AbstractResolver):
+    """aiohttp resolver backed by DNSCache."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        try:
+            addrinfos = await self.cache.ResolveAsync(host, port, family)
+        except socket.gaierror as e:
+            # aiohttp expects OSError, which it converts into connection error
+            raise OSError(e.errno, 'Cannot resolve {}: {}'.format(host, e.strerror)) from e
+
+        return [
+            {
+                'hostname': host,
+                'host': address[0],
+                'port': address[1],
+                'family': family,
+                'proto': proto,
+                'flags': socket.AI_NUMERICHOST | socket.AI_NUMERICSERV,
+            } for family, _, proto, _, address in addrinfos
+        ]
+
+    async def close(self):
+        pass
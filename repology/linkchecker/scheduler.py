@@ -0,0 +1,235 @@
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import heapq
+import time
+import urllib.parse
+import zlib
+from collections import deque
+
+
+def GetUrlHost(url):
+    try:
+        return urllib.parse.urlparse(url).hostname or ''
+    except ValueError:
+        return ''
+
+
+def GetHostShard(host, numshards):
+    """Stable mapping of host to one of numshards workers."""
+    return zlib.crc32(host.encode('utf-8', 'replace')) % numshards
+
+
+def DistributeLinks(urls, queues, packsize):
+    """Shard urls between worker queues by host, in packs."""
+    packs = [[] for queue in queues]
+
+    for url in urls:
+        shard = GetHostShard(GetUrlHost(url), len(queues))
+        packs[shard].append(url)
+        if len(packs[shard]) >= packsize:
+            queues[shard].put(packs[shard])
+            packs[shard] = []
+
+    for queue, pack in zip(queues, packs):
+        if pack:
+            queue.put(pack)
+
+
+class TokenBucket:
+    """Classic token bucket: rate tokens per second, up to burst tokens."""
+
+    def __init__(self, rate, burst=1, now=0.0):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def __Refill(self, now):
+        if self.rate is not None and now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def GetWait(self, now):
+        """Return number of seconds until a token is available."""
+        if self.rate is None:
+            return 0.0
+
+        self.__Refill(now)
+
+        if self.tokens >= 1:
+            return 0.0
+
+        return (1 - self.tokens) / self.rate
+
+    def Take(self, now):
+        if self.rate is None:
+            return
+
+        self.__Refill(now)
+        self.tokens -= 1
+
+
+class HostQueue:
+    def __init__(self, host, bucket):
+        self.host = host
+        self.bucket = bucket
+        self.urls = deque()
+        self.inflight = 0
+        self.queued = False
+
+        self.num_checks = 0
+        self.first_started = None
+        self.last_finished = None
+
+
+class HostScheduler:
+    """Decides which url to check next, keeping hosts apart.
+
+    Urls are grouped by hostname, and hosts are served round-robin,
+    so a few large hosts never delay all others. Each host has a token
+    bucket which allows one request per delay seconds (with bursts of
+    up to burst requests), and no more than host_concurrency requests
+    to a host may be in flight at a time.
+
+    The scheduler does no waiting itself: Pop() returns None when no
+    url may be checked right now, and GetWait() tells how long the
+    caller should wait before the next try. Done() must be called for
+    each popped url after its check completes.
+    """
+
+    def __init__(self, delay=3.0, burst=1, host_concurrency=1, timer=time.monotonic):
+        self.rate = 1.0 / delay if delay > 0 else None
+        self.burst = burst
+        self.host_concurrency = host_concurrency
+        self.timer = timer
+
+        self.hosts = {}
+        self.ready = deque()  # hosts which may be requested right now
+        self.waiting = []  # heap of (time, seq, host) for hosts waiting for a token
+        self.seq = 0
+
+        self.num_queued = 0
+        self.num_inflight = 0
+
+    def __len__(self):
+        return self.num_queued
+
+    def __GetHostQueue(self, host):
+        hostqueue = self.hosts.get(host)
+        if hostqueue is None:
+            hostqueue = self.hosts[host] = HostQueue(host, TokenBucket(self.rate, self.burst, self.timer()))
+        return hostqueue
+
+    def __Enqueue(self, hostqueue, now):
+        if hostqueue.queued or not hostqueue.urls or hostqueue.inflight >= self.host_concurrency:
+            return
+
+        hostqueue.queued = True
+
+        wait = hostqueue.bucket.GetWait(now)
+        if wait > 0:
+            heapq.heappush(self.waiting, (now + wait, self.seq, hostqueue))
+            self.seq += 1
+        else:
+            self.ready.append(hostqueue)
+
+    def Add(self, url):
+        hostqueue = self.__GetHostQueue(GetUrlHost(url))
+        hostqueue.urls.append(url)
+        self.num_queued += 1
+        self.__Enqueue(hostqueue, self.timer())
+
+    def Pop(self):
+        now = self.timer()
+
+        while self.waiting and self.waiting[0][0] <= now:
+            self.ready.append(heapq.heappop(self.waiting)[2])
+
+        if not self.ready:
+            return None
+
+        hostqueue = self.ready.popleft()
+        hostqueue.queued = False
+
+        hostqueue.bucket.Take(now)
+        if hostqueue.first_started is None:
+            hostqueue.first_started = now
+        hostqueue.inflight += 1
+        self.num_inflight += 1
+        self.num_queued -= 1
+
+        url = hostqueue.urls.popleft()
+
+        # host goes to the end of the round
+        self.__Enqueue(hostqueue, now)
+
+        return url
+
+    def Done(self, url):
+        now = self.timer()
+
+        hostqueue = self.hosts[GetUrlHost(url)]
+        hostqueue.inflight -= 1
+        hostqueue.num_checks += 1
+        hostqueue.last_finished = now
+        self.num_inflight -= 1
+
+        self.__Enqueue(hostqueue, now)
+
+    def GetWait(self):
+        """Return seconds until next url may be popped.
+
+        None is returned when nothing may become ready without some
+        in-flight check completing first.
+        """
+        if self.ready:
+            return 0.0
+
+        if self.waiting:
+            return max(0.0, self.waiting[0][0] - self.timer())
+
+        return None
+
+    def GetHostStats(self, limit=None):
+        """Return (host, checks, checks per second, urls left) for busiest hosts."""
+        stats = []
+        for hostqueue in self.hosts.values():
+            if not hostqueue.num_checks:
+                continue
+
+            elapsed = hostqueue.last_finished - hostqueue.first_started
+            stats.append((
+                hostqueue.host,
+                hostqueue.num_checks,
+                hostqueue.num_checks / elapsed if elapsed > 0 else None,
+                len(hostqueue.urls)
+            ))
+
+        stats.sort(key=lambda s: s[1], reverse=True)
+
+        return stats[:limit] if limit is not None else stats
+
+    def GetHostStatsString(self, limit=10):
+        return ', '.join(
+            '{} {} ({}, {} left)'.format(
+                host or '<no host>',
+                checks,
+                '{:.2f}/s'.format(rate) if rate is not None else '-',
+                left
+            ) for host, checks, rate, left in self.GetHostStats(limit)
+        )
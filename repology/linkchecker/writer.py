@@ -0,0 +1,120 @@
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+from collections import OrderedDict
+
+from repology.logger import NoopLogger
+
+
+class LinkStatusWriter:
+    """Accumulates link check results and writes them in bulk.
+
+    Buffer is flushed into the database when it reaches max_size
+    results or when max_age seconds have passed since the first
+    buffered result, and each flush is committed as a separate
+    transaction. If the process dies, results which were not flushed
+    are just lost and the corresponding links stay due for check, so
+    no inconsistent state is possible.
+
+    If clear_inflight is set, written links are removed from the
+    in-flight list of the current LinkCheckRun in the same transaction.
+    If update_metapackages is set, precomputed link statuses of
+    metapackages which use written links are refreshed as well.
+
+    Use as a context manager to flush remaining results on exit.
+    """
+
+    def __init__(self, database, max_size=1000, max_age=10.0, logger=NoopLogger(), timer=time.monotonic, clear_inflight=False, update_metapackages=False):
+        self.database = database
+        self.max_size = max_size
+        self.max_age = max_age
+        self.logger = logger
+        self.timer = timer
+        self.clear_inflight = clear_inflight
+        self.update_metapackages = update_metapackages
+
+        self.buffer = OrderedDict()
+        self.first_added = None
+
+        self.num_flushes = 0
+        self.num_written = 0
+        self.total_flush_time = 0.0
+        self.max_flush_time = 0.0
+
+    def Add(self, result):
+        if not self.buffer:
+            self.first_added = self.timer()
+
+        # newer result for the same url supersedes older one
+        self.buffer[result[0]] = result
+        self.buffer.move_to_end(result[0])
+
+        if len(self.buffer) >= self.max_size or self.timer() - self.first_added >= self.max_age:
+            self.Flush()
+
+    def Flush(self):
+        if not self.buffer:
+            return
+
+        start = self.timer()
+
+        try:
+            self.database.UpdateLinkStatuses(list(self.buffer.values()))
+            if self.clear_inflight:
+                self.database.RemoveLinksInFlight(list(self.buffer.keys()))
+            if self.update_metapackages:
+                self.database.InvalidateMetapackageLinks(list(self.buffer.keys()))
+            self.database.Commit()
+        except BaseException:
+            self.database.Rollback()
+            raise
+
+        elapsed = self.timer() - start
+
+        self.num_flushes += 1
+        self.num_written += len(self.buffer)
+        self.total_flush_time += elapsed
+        self.max_flush_time = max(self.max_flush_time, elapsed)
+
+        self.logger.Log('Flushed {} statuses in {:.1f}ms'.format(len(self.buffer), elapsed * 1000.0))
+
+        self.buffer.clear()
+        self.first_added = None
+
+    def GetStats(self):
+        return '{} statuses written in {} flushes, avg flush {:.1f}ms, max flush {:.1f}ms'.format(
+            self.num_written,
+            self.num_flushes,
+            self.total_flush_time / self.num_flushes * 1000.0 if self.num_flushes else 0.0,
+            self.max_flush_time * 1000.0
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.Flush()
+            return
+
+        # results gathered before an error (or interruption) are still
+        # valid, but failure to save them must not mask the original error
+        try:
+            self.Flush()
+        except Exception:
+            self.logger.Log('Failed to flush {} statuses'.format(len(self.buffer)))
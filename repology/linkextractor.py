@@ -0,0 +1,38 @@
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# homepages of these repositories are generated from package names and
+# point to the repository itself, so there's no point in checking them
+HOMEPAGE_EXCLUDED_REPOS = frozenset(['cpan', 'pypi', 'rubygems', 'hackage', 'cran'])
+
+
+class LinkExtractor:
+    """Collects set of links for link checker during packages ingestion."""
+
+    def __init__(self):
+        self.urls = set()
+
+    def AddPackages(self, packages):
+        for package in packages:
+            self.urls.update(package.downloads)
+
+            if package.homepage is not None and package.repo not in HOMEPAGE_EXCLUDED_REPOS:
+                self.urls.add(package.homepage)
+
+    def GetUrls(self):
+        return self.urls
@@ -0,0 +1,226 @@
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import bisect
+import os
+import pickle
+import re
+from array import array
+
+from repology.database import MetapackageRequest
+
+
+NONZERO_BYTE = re.compile(b'[^\x00]')
+
+
+def MakeBitset(ids, size):
+    data = bytearray((size + 7) // 8)
+    for i in ids:
+        data[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(data, 'little')
+
+
+def LikeToRegexp(pattern):
+    # translate SQL LIKE pattern (without escapes) into regexp
+    return re.compile(''.join('.*' if c == '%' else '.' if c == '_' else re.escape(c) for c in pattern), re.DOTALL)
+
+
+class MetapackageIndex:
+    """In-memory replica of metapackage listing tables.
+
+    Metapackages are identified by their position in sorted effname
+    list, and sets of metapackages are stored as bitsets (python ints),
+    so filters are evaluated as bitwise operations and name bounds are
+    resolved with binary search. Maintainer sets are usually small and
+    are stored as id lists, converted to bitsets on demand.
+
+    Effnames are sorted in python (codepoint) order, which is the
+    same as "C" collation used for effnames in the database, so
+    pagination is consistent with database queries.
+    """
+
+    def __init__(self, metapackage_families, repo_metapackages, maintainer_metapackages):
+        families = dict(metapackage_families)
+
+        self.effnames = sorted(families.keys())
+        ids = {effname: n for n, effname in enumerate(self.effnames)}
+        size = len(self.effnames)
+
+        # repositories
+        repos = {}
+        repos_outdated = {}
+        for repo, effname, num_newest, num_outdated in repo_metapackages:
+            repos.setdefault(repo, []).append(ids[effname])
+            if num_outdated > 0 and num_newest == 0:
+                repos_outdated.setdefault(repo, []).append(ids[effname])
+
+        self.repos = {repo: MakeBitset(repoids, size) for repo, repoids in repos.items()}
+        self.repos_outdated = {repo: MakeBitset(repoids, size) for repo, repoids in repos_outdated.items()}
+
+        # metapackages present in repo_metapackages, e.g. having
+        # at least one non-shadow package
+        self.nonshadow = 0
+        for bitset in self.repos.values():
+            self.nonshadow |= bitset
+
+        # maintainers
+        self.maintainers = {}
+        self.maintainers_outdated = {}
+        for maintainer, effname, num_newest, num_outdated in maintainer_metapackages:
+            self.maintainers.setdefault(maintainer, array('I')).append(ids[effname])
+            if num_outdated > 0 and num_newest == 0:
+                self.maintainers_outdated.setdefault(maintainer, array('I')).append(ids[effname])
+
+        # families: families_atleast[n] is a set of metapackages
+        # present in at least n families
+        by_families = {}
+        for effname, num_families in families.items():
+            by_families.setdefault(num_families, []).append(ids[effname])
+
+        self.families_atleast = [0] * (max(by_families.keys(), default=0) + 2)
+        for num_families in range(len(self.families_atleast) - 2, -1, -1):
+            self.families_atleast[num_families] = self.families_atleast[num_families + 1] | MakeBitset(by_families.get(num_families, []), size)
+
+    def __GetAll(self):
+        return (1 << len(self.effnames)) - 1
+
+    def __GetFamiliesAtLeast(self, num):
+        num = max(num, 0)
+        return self.families_atleast[num] if num < len(self.families_atleast) else 0
+
+    def __GetNameRange(self, req):
+        lo, hi = 0, len(self.effnames)
+
+        if req.namecond and req.namebound:
+            if req.namecond == '>=':
+                lo = bisect.bisect_left(self.effnames, req.namebound)
+            elif req.namecond == '>':
+                lo = bisect.bisect_right(self.effnames, req.namebound)
+            elif req.namecond == '<':
+                hi = bisect.bisect_left(self.effnames, req.namebound)
+
+        return lo, hi
+
+    def __IterIds(self, bitset, lo, hi, descending):
+        # only scan bytes covering [lo, hi) range
+        offset = lo >> 3
+        data = bitset.to_bytes((len(self.effnames) + 7) // 8, 'little')[offset:(hi + 7) >> 3]
+
+        if descending:
+            data = data[::-1]
+
+        for match in NONZERO_BYTE.finditer(data):
+            pos = offset + (len(data) - 1 - match.start() if descending else match.start())
+            byte = data[match.start()]
+
+            for bit in (range(7, -1, -1) if descending else range(8)):
+                if byte & (1 << bit):
+                    n = pos * 8 + bit
+                    if lo <= n < hi:
+                        yield n
+
+    def Evaluate(self, req):
+        size = len(self.effnames)
+        result = None
+
+        def Intersect(bitset):
+            nonlocal result
+            result = bitset if result is None else result & bitset
+
+        if req.maintainer:
+            maintainers = self.maintainers_outdated if req.maintainer_outdated else self.maintainers
+            Intersect(MakeBitset(maintainers.get(req.maintainer, []), size))
+
+        if req.morefamilies:
+            Intersect(self.__GetFamiliesAtLeast(req.morefamilies))
+
+        if req.lessfamilies:
+            Intersect(self.__GetAll() & ~self.__GetFamiliesAtLeast(req.lessfamilies + 1))
+
+        if req.repos:
+            repos = self.repos_outdated if req.repos_outdated else self.repos
+            bitset = 0
+            for repo in req.repos:
+                bitset |= repos.get(repo, 0)
+            Intersect(bitset)
+
+        if req.repo_not:
+            Intersect(self.nonshadow & ~self.repos.get(req.repo_not, 0))
+
+        if result is None:
+            result = self.nonshadow
+
+        lo, hi = self.__GetNameRange(req)
+
+        substring = LikeToRegexp(req.name_substring) if req.name_substring else None
+
+        names = []
+        for n in self.__IterIds(result, lo, hi, req.nameorder == 'DESC'):
+            if substring and not substring.search(self.effnames[n]):
+                continue
+
+            names.append(self.effnames[n])
+
+            if req.limit and len(names) >= req.limit:
+                break
+
+        return names
+
+    def Query(self, *filters, limit=500):
+        req = MetapackageRequest()
+
+        for f in filters:
+            if f:
+                f.ApplyToRequest(req)
+
+        req.Limit(limit)
+
+        return self.Evaluate(req)
+
+    def Save(self, path):
+        tmppath = path + '.tmp'
+        with open(tmppath, 'wb') as outfile:
+            pickle.dump(self, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(tmppath, path)
+
+
+def LoadMetapackageIndex(path):
+    with open(path, 'rb') as infile:
+        return pickle.load(infile)
+
+
+class MetapackageIndexFile:
+    """Loads index from file and reloads it when the file changes."""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+        self.index = None
+
+    def Get(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        if mtime != self.mtime:
+            self.index = LoadMetapackageIndex(self.path)
+            self.mtime = mtime
+
+        return self.index
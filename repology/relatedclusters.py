@@ -0,0 +1,104 @@
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+
+
+HOMEPAGE_SUFFIX = re.compile('/?([#?].*)?$')
+HOMEPAGE_PREFIX = re.compile('^https?://(www\\.)?')
+
+
+def HomepageToRelationUrl(homepage):
+    # should match url normalization of former url_relations view
+    if not homepage or not HOMEPAGE_PREFIX.match(homepage):
+        return None
+
+    return HOMEPAGE_PREFIX.sub('', HOMEPAGE_SUFFIX.sub('', homepage, count=1), count=1)
+
+
+class UnionFind:
+    def __init__(self):
+        self.parents = {}
+
+    def Find(self, item):
+        root = item
+        while True:
+            parent = self.parents.setdefault(root, root)
+            if parent == root:
+                break
+            root = parent
+
+        # path compression
+        while item != root:
+            self.parents[item], item = root, self.parents[item]
+
+        return root
+
+    def Union(self, first, second):
+        first = self.Find(first)
+        second = self.Find(second)
+        if first != second:
+            # smaller root wins, so result does not depend on order
+            if second < first:
+                first, second = second, first
+            self.parents[second] = first
+
+
+class RelatedClusterer:
+    """Groups metapackages which share homepages.
+
+    Metapackages are related if they have packages with the same
+    (normalized) homepage, directly or transitively. Urls shared by
+    more than max_url_metapackages metapackages (usually hosting
+    roots such as github.com or sourceforge.net) or listed in
+    hub_urls are ignored, as these would glue unrelated projects into
+    huge clusters.
+    """
+
+    def __init__(self, max_url_metapackages=100, hub_urls=()):
+        self.max_url_metapackages = max_url_metapackages
+        self.hub_urls = set(hub_urls)
+        self.url_effnames = {}
+        self.effnames = set()
+
+    def AddPackages(self, packages):
+        for package in packages:
+            url = HomepageToRelationUrl(package.homepage)
+            if url is None:
+                continue
+
+            self.effnames.add(package.effname)
+            if url not in self.hub_urls:
+                self.url_effnames.setdefault(url, set()).add(package.effname)
+
+    def GetClusters(self):
+        """Return dict of effname -> cluster id (smallest effname in cluster)."""
+        unionfind = UnionFind()
+
+        for effname in self.effnames:
+            unionfind.Find(effname)
+
+        for url, effnames in self.url_effnames.items():
+            if self.max_url_metapackages is not None and len(effnames) > self.max_url_metapackages:
+                continue
+
+            effnames = iter(effnames)
+            first = next(effnames)
+            for effname in effnames:
+                unionfind.Union(first, effname)
+
+        return {effname: unionfind.Find(effname) for effname in unionfind.parents}
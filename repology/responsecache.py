@@ -0,0 +1,186 @@
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """LRU cache with optional item expiration.
+
+    By default, maxsize limits number of items; if sizeof function is
+    given, it limits total size of items as returned by it (e.g. in
+    bytes), and items which do not fit at all are not stored.
+    """
+
+    def __init__(self, maxsize=1000, ttl=None, timer=time.monotonic, sizeof=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.sizeof = sizeof if sizeof is not None else lambda value: 1
+        self.items = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def __Remove(self, key):
+        self.size -= self.items.pop(key)[2]
+
+    def Get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+
+            value, expires, size = item
+            if expires is not None and self.timer() >= expires:
+                self.__Remove(key)
+                return None
+
+            self.items.move_to_end(key)
+            return value
+
+    def Set(self, key, value):
+        expires = self.timer() + self.ttl if self.ttl is not None else None
+        size = self.sizeof(value)
+
+        with self.lock:
+            if key in self.items:
+                self.__Remove(key)
+
+            if size > self.maxsize:
+                return
+
+            self.items[key] = (value, expires, size)
+            self.size += size
+
+            while self.size > self.maxsize:
+                self.__Remove(next(iter(self.items)))
+
+    def Clear(self):
+        with self.lock:
+            self.items.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self.items)
+
+
+class MemcachedCache:
+    def __init__(self, server, ttl=None, prefix='repology:'):
+        # optional dependency, only needed when memcached is configured
+        from pymemcache.client.base import Client
+
+        host, port = server.rsplit(':', 1)
+
+        self.client = Client((host, int(port)))
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def __MakeKey(self, key):
+        # memcached keys are limited in length and character set
+        return self.prefix + hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+    def Get(self, key):
+        data = self.client.get(self.__MakeKey(key))
+        return pickle.loads(data) if data is not None else None
+
+    def Set(self, key, value):
+        self.client.set(self.__MakeKey(key), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), expire=self.ttl or 0)
+
+    def Clear(self):
+        # storage is shared between processes and keys include update
+        # generation, so outdated entries are just left to expire
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class UpdateGenerationTracker:
+    def __init__(self, getter, check_interval=10.0, timer=time.monotonic):
+        self.getter = getter
+        self.check_interval = check_interval
+        self.timer = timer
+
+        self.current = None
+        self.checked = None
+
+    def __Refresh(self):
+        now = self.timer()
+
+        if self.checked is None or now - self.checked >= self.check_interval:
+            self.current = self.getter()
+            self.checked = now
+
+        return self.current
+
+    def GetGeneration(self):
+        return self.__Refresh()['generation']
+
+    def GetTimestamp(self):
+        return self.__Refresh()['timestamp']
+
+
+class ResponseCache:
+    def __init__(self, storage, generation_getter):
+        self.storage = storage
+        self.generation_getter = generation_getter
+
+        self.generation = None
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def GetGeneration(self):
+        generation = self.generation_getter()
+
+        if generation != self.generation:
+            if self.generation is not None:
+                self.invalidations += 1
+            self.storage.Clear()
+            self.generation = generation
+
+        return self.generation
+
+    def Get(self, key):
+        value = self.storage.Get((self.GetGeneration(), key))
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return value
+
+    def Set(self, key, value):
+        self.storage.Set((self.GetGeneration(), key), value)
+
+    def GetStats(self):
+        total = self.hits + self.misses
+
+        return {
+            'generation': self.generation,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else None,
+            'invalidations': self.invalidations,
+            'size': len(self.storage),
+        }
@@ -27,12 +27,14 @@ setup(
     packages=[
         'repology',
         'repology.fetcher',
+        'repology.linkchecker',
         'repology.parser',
     ],
     scripts=[
         'repology-app.py',
         'repology-benchmark.py',
         'repology-dump.py',
+        'repology-genbadges.py',
         'repology-gensitemap.py',
         'repology-linkchecker.py',
         'repology-update.py',
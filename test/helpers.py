@@ -0,0 +1,125 @@
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+from http.server import HTTPServer
+from socketserver import ThreadingMixIn
+
+
+class FakeTimer:
+    """Manually advanced replacement for time.monotonic."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class LocalHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakeDatabase:
+    """In-memory stand-in for link checker related Database methods.
+
+    Link statuses are visible to link selection right away, while
+    Commit() and Rollback() only account for written results.
+    """
+
+    def __init__(self, urls=(), fail=False):
+        self.fail = fail
+
+        self.now = 0
+        self.links = {url: None for url in urls}  # url -> last_checked
+        self.runs = {}
+        self.inflight = {}
+
+        self.pending = []
+        self.committed = []
+        self.invalidated = []
+        self.num_commits = 0
+        self.num_rollbacks = 0
+
+    def __Tick(self):
+        self.now += 1
+        return self.now
+
+    def StreamLinksForCheck(self, checked_before=None):
+        for url, last_checked in sorted(self.links.items()):
+            if last_checked is None or last_checked < checked_before:
+                yield url
+
+    def UpdateLinkStatuses(self, results):
+        if self.fail:
+            raise RuntimeError('database failure')
+
+        now = self.__Tick()
+        for result in results:
+            self.links[result[0]] = now
+            self.pending.append(result)
+
+    def InvalidateMetapackageLinks(self, urls):
+        self.invalidated.append(urls)
+
+    def GetLinkCheckRun(self, selection):
+        return self.runs.get(selection)
+
+    def StartLinkCheckRun(self, selection):
+        self.inflight = {url: sel for url, sel in self.inflight.items() if sel != selection}
+        self.runs[selection] = (self.__Tick(), None)
+        return self.runs[selection][0]
+
+    def FinishLinkCheckRun(self, selection):
+        self.inflight = {url: sel for url, sel in self.inflight.items() if sel != selection}
+        self.runs[selection] = (self.runs[selection][0], self.__Tick())
+
+    def AddLinksInFlight(self, selection, urls):
+        for url in urls:
+            self.inflight[url] = selection
+
+    def RemoveLinksInFlight(self, urls):
+        for url in urls:
+            self.inflight.pop(url, None)
+
+    def GetLinksInFlight(self, selection):
+        return sorted(url for url, sel in self.inflight.items() if sel == selection)
+
+    def Commit(self):
+        self.committed.extend(self.pending)
+        self.pending = []
+        self.num_commits += 1
+
+    def Rollback(self):
+        self.pending = []
+        self.num_rollbacks += 1
+
+
+class FakePooledDatabase:
+    """Stand-in for Database connection state checked by DatabasePool."""
+
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+
+    def IsAlive(self):
+        return self.alive
+
+    def IsClosed(self):
+        return self.closed
+
+    def Close(self):
+        self.closed = True
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from repology.database import GetPositionalQuery
+
+
+class TestPositionalQuery(unittest.TestCase):
+    def test_placeholders(self):
+        self.assertEqual(GetPositionalQuery('SELECT 1'), ('SELECT 1', 0))
+        self.assertEqual(GetPositionalQuery('SELECT * FROM t WHERE a = %s AND b = %s'), ('SELECT * FROM t WHERE a = $1 AND b = $2', 2))
+
+    def test_literal_percent(self):
+        self.assertEqual(GetPositionalQuery("SELECT * FROM t WHERE a LIKE '%%foo%%' AND b = %s"), ("SELECT * FROM t WHERE a LIKE '%foo%' AND b = $1", 1))
+        self.assertEqual(GetPositionalQuery("SELECT %s || '%%'"), ("SELECT $1 || '%'", 1))
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            GetPositionalQuery('SELECT %(name)s')
+        with self.assertRaises(ValueError):
+            GetPositionalQuery("SELECT '%'")
+
+
+if __name__ == '__main__':
+    unittest.main()
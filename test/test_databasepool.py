@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from repology.databasepool import DatabasePool, DatabasePoolTimeout
+
+from .helpers import FakePooledDatabase, FakeTimer
+
+
+class TestDatabasePool(unittest.TestCase):
+    def test_reuse(self):
+        pool = DatabasePool(FakePooledDatabase, maxsize=2)
+
+        db1 = pool.Acquire()
+        pool.Release(db1)
+        db2 = pool.Acquire()
+
+        self.assertIs(db1, db2)
+        self.assertEqual(pool.GetStats()['created'], 1)
+        self.assertEqual(pool.GetStats()['acquired'], 2)
+
+    def test_bounded(self):
+        pool = DatabasePool(FakePooledDatabase, maxsize=2, timeout=0.01)
+
+        db1 = pool.Acquire()
+        db2 = pool.Acquire()
+        self.assertIsNot(db1, db2)
+
+        with self.assertRaises(DatabasePoolTimeout):
+            pool.Acquire()
+
+        pool.Release(db2)
+        self.assertIs(pool.Acquire(), db2)
+        self.assertEqual(pool.GetStats()['timeouts'], 1)
+
+    def test_broken(self):
+        pool = DatabasePool(FakePooledDatabase, maxsize=1)
+
+        db1 = pool.Acquire()
+        pool.Release(db1, broken=True)
+        self.assertTrue(db1.closed)
+
+        db2 = pool.Acquire()
+        self.assertIsNot(db1, db2)
+        self.assertEqual(pool.GetStats()['size'], 1)
+        self.assertEqual(pool.GetStats()['discarded'], 1)
+
+    def test_health_check(self):
+        timer = FakeTimer()
+        pool = DatabasePool(FakePooledDatabase, maxsize=1, check_interval=60, timer=timer)
+
+        db1 = pool.Acquire()
+        pool.Release(db1)
+        db1.alive = False
+
+        # not checked until idle for long enough
+        timer.now = 30
+        self.assertIs(pool.Acquire(), db1)
+        pool.Release(db1)
+
+        timer.now = 90
+        db2 = pool.Acquire()
+        self.assertIsNot(db1, db2)
+        self.assertEqual(pool.GetStats()['size'], 1)
+
+    def test_factory_failure(self):
+        def Factory():
+            raise RuntimeError('cannot connect')
+
+        pool = DatabasePool(Factory, maxsize=1)
+
+        with self.assertRaises(RuntimeError):
+            pool.Acquire()
+
+        self.assertEqual(pool.GetStats()['size'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import unittest
+
+from repology.export import EXPORT_META_FILE, GetExportDataFileName, LoadExportMeta, MetapackagesExportWriter, PackageToApiV1Json
+from repology.package import Package
+
+
+PACKAGES = [
+    Package(repo='freebsd', name='bar', effname='bar', version='1.0', maintainers=['amdmi3@freebsd.org'], homepage='http://bar.org/'),
+    Package(repo='debian', name='bar', effname='bar', version='1.1', comment='Bar utility'),
+    Package(repo='freebsd', name='baz-shadow', effname='baz', version='2.0', shadow=True),
+    Package(repo='arch', name='foo', effname='foo', version='3.0', category='devel'),
+]
+
+
+class TestExport(unittest.TestCase):
+    def test_package_to_json(self):
+        self.assertEqual(PackageToApiV1Json(PACKAGES[0]), {'repo': 'freebsd', 'name': 'bar', 'version': '1.0', 'maintainers': ['amdmi3@freebsd.org'], 'www': ['http://bar.org/']})
+        self.assertEqual(PackageToApiV1Json(PACKAGES[1]), {'repo': 'debian', 'name': 'bar', 'version': '1.1', 'summary': 'Bar utility'})
+        self.assertEqual(PackageToApiV1Json(PACKAGES[3]), {'repo': 'arch', 'name': 'foo', 'version': '3.0', 'categories': ['devel']})
+
+    def test_writer(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            writer = MetapackagesExportWriter(tmpdir)
+            writer.AddPackageset(PACKAGES[0:2])
+            writer.AddPackageset(PACKAGES[2:3])
+            writer.AddPackageset(PACKAGES[3:4])
+
+            # nothing is visible until published
+            self.assertIsNone(LoadExportMeta(tmpdir))
+            self.assertFalse(os.path.exists(os.path.join(tmpdir, GetExportDataFileName(123))))
+
+            meta = writer.Publish(123)
+
+            self.assertEqual(LoadExportMeta(tmpdir), meta)
+
+            self.assertEqual(meta['file'], GetExportDataFileName(123))
+            self.assertEqual(meta['generation'], 123)
+            self.assertEqual(meta['num_metapackages'], 2)
+
+            with open(os.path.join(tmpdir, meta['file']), 'rb') as datafile:
+                data = datafile.read()
+
+            self.assertEqual(meta['sha256'], hashlib.sha256(data).hexdigest())
+            self.assertEqual(meta['size'], len(data))
+
+            # shadow-only metapackages are skipped
+            lines = gzip.decompress(data).decode('utf-8').splitlines(True)
+            self.assertTrue(all(line.endswith('\n') for line in lines))
+
+            first, second = map(json.loads, lines)
+            self.assertEqual(first['name'], 'bar')
+            self.assertEqual([package['repo'] for package in first['packages']], ['freebsd', 'debian'])
+            self.assertEqual(second['name'], 'foo')
+
+            self.assertEqual(sorted(os.listdir(tmpdir)), sorted([meta['file'], EXPORT_META_FILE]))
+
+    def test_writer_generations(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for generation in range(1, 5):
+                writer = MetapackagesExportWriter(tmpdir, keep_generations=2)
+                writer.AddPackageset(PACKAGES[0:2])
+                writer.Publish(generation)
+
+            # data files of previous generation are kept for readers
+            # of previous metadata
+            self.assertEqual(sorted(os.listdir(tmpdir)), sorted([GetExportDataFileName(3), GetExportDataFileName(4), EXPORT_META_FILE]))
+            self.assertEqual(LoadExportMeta(tmpdir)['file'], GetExportDataFileName(4))
+
+    def test_writer_discard(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            writer = MetapackagesExportWriter(tmpdir)
+            writer.AddPackageset(PACKAGES[0:2])
+            writer.Discard()
+
+            self.assertEqual(os.listdir(tmpdir), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -23,6 +23,8 @@ import sys
 import unittest
 import xml.etree.ElementTree
 
+from repology.export import LoadExportMeta
+
 
 html_validation = True
 
@@ -108,6 +110,68 @@ class TestFlask(unittest.TestCase):
 
         self.checkurl_svg('/graph/map_repo_size_fresh.svg')
 
+    def test_graph_cache(self):
+        first = self.app.get('/graph/total/metapackages.svg')
+        second = self.app.get('/graph/total/metapackages.svg')
+        self.assertEqual(first.data, second.data)
+
+        # unversioned urls must not be cached by clients for long
+        self.assertIsNone(first.cache_control.max_age)
+
+    def test_conditional_requests(self):
+        reply = self.app.get('/statistics')
+        self.assertEqual(reply.status_code, 200)
+        etag = reply.headers['ETag']
+        last_modified = reply.headers['Last-Modified']
+
+        reply = self.app.get('/statistics', headers={'If-None-Match': etag})
+        self.assertEqual(reply.status_code, 304)
+        self.assertEqual(reply.headers['ETag'], etag)
+        self.assertEqual(reply.data, b'')
+
+        # weak comparison is used for If-None-Match, e.g. for etags weakened by compressing proxies
+        reply = self.app.get('/statistics', headers={'If-None-Match': 'W/' + etag})
+        self.assertEqual(reply.status_code, 304)
+
+        reply = self.app.get('/statistics', headers={'If-None-Match': '"nonexistent"'})
+        self.assertEqual(reply.status_code, 200)
+
+        reply = self.app.get('/statistics', headers={'If-Modified-Since': last_modified})
+        self.assertEqual(reply.status_code, 304)
+
+        # etag depends on the url
+        self.assertNotEqual(self.app.get('/repositories/').headers['ETag'], etag)
+
+        # volatile endpoints are never validated
+        reply = self.app.get('/runtime-stats')
+        self.assertNotIn('ETag', reply.headers)
+
+        # pages with link statuses change independently of updates
+        reply = self.app.get('/metapackage/kiconvtool/packages')
+        self.assertNotIn('ETag', reply.headers)
+        self.assertNotIn('X-Cache', reply.headers)
+
+    def test_response_cache(self):
+        if repology_app.response_cache is None:
+            self.skipTest('response cache is disabled in the configuration')
+
+        # unique query, as the cache may be shared with previous runs
+        url = '/statistics?cachetest=' + os.urandom(8).hex()
+
+        first = self.app.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.headers['X-Cache'], 'MISS')
+
+        second = self.app.get(url)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.headers['X-Cache'], 'HIT')
+        self.assertEqual(first.data, second.data)
+
+        # conditional request is answered before cache lookup
+        third = self.app.get(url, headers={'If-None-Match': first.headers['ETag']})
+        self.assertEqual(third.status_code, 304)
+        self.assertNotIn('X-Cache', third.headers)
+
     def test_metapackage(self):
         self.checkurl('/metapackage/kiconvtool', status_code=303)
 
@@ -162,6 +226,13 @@ class TestFlask(unittest.TestCase):
         self.checkurl_html('/metapackages/all/<0/', has=['kiconvtool'])
         self.checkurl_html('/metapackages/all/>zzzzzz/', has=['kiconvtool'])
 
+    def test_search_suggestions(self):
+        self.assertEqual(self.checkurl_json('/opensearch/metapackage/suggest?search=kiconvtool', mimetype='application/x-suggestions+json'), ['kiconvtool', ['kiconvtool']])
+        self.assertEqual(self.checkurl_json('/opensearch/metapackage/suggest?search=iconv', mimetype='application/x-suggestions+json'), ['iconv', ['kiconvtool']])
+        self.assertEqual(self.checkurl_json('/opensearch/metapackage/suggest?search=nonexistent', mimetype='application/x-suggestions+json'), ['nonexistent', []])
+
+        self.assertEqual(self.checkurl_json('/opensearch/maintainer/suggest?search=amdmi3@freebsd.org', mimetype='application/x-suggestions+json')[1][0], 'amdmi3@freebsd.org')
+
     def test_api_v1_metapackage(self):
         self.assertEqual(
             self.checkurl_json('/api/v1/metapackage/kiconvtool', mimetype='application/json'),
@@ -180,6 +251,32 @@ class TestFlask(unittest.TestCase):
         )
         self.assertEqual(self.checkurl_json('/api/v1/metapackage/nonexistent', mimetype='application/json'), [])
 
+    def test_api_v1_metapackages_ndjson(self):
+        # served from pregenerated dump, never from the database
+        reply = self.app.get('/api/v1/metapackages/all.ndjson')
+        if not repology_app.app.config['EXPORT_DIR'] or LoadExportMeta(repology_app.app.config['EXPORT_DIR']) is None:
+            self.assertEqual(reply.status_code, 404)
+            return
+
+        self.assertEqual(reply.status_code, 302)
+        self.assertEqual(reply.headers['Location'], self.app.get('/api/v1/export/metapackages.ndjson.gz').headers['Location'])
+
+    def test_api_v1_metapackages_batch(self):
+        reply = self.app.post('/api/v1/metapackages/batch', data=json.dumps(['kiconvtool', 'nonexistent', 'kiconvtool']), content_type='application/json')
+        self.assertEqual(reply.status_code, 200)
+        self.assertEqual(reply.mimetype, 'application/json')
+
+        data = json.loads(reply.data.decode('utf-8'))
+        self.assertEqual(sorted(data.keys()), ['kiconvtool', 'nonexistent'])
+        self.assertEqual(data['kiconvtool'][0]['version'], '0.97')
+        self.assertEqual(data['nonexistent'], [])
+
+        reply = self.app.post('/api/v1/metapackages/batch', data=json.dumps({'name': 'kiconvtool'}), content_type='application/json')
+        self.assertEqual(reply.status_code, 400)
+
+        reply = self.app.post('/api/v1/metapackages/batch', data=json.dumps(['name{}'.format(n) for n in range(10000)]), content_type='application/json')
+        self.assertEqual(reply.status_code, 413)
+
     def test_api_v1_metapackages(self):
         self.checkurl_json('/api/v1/metapackages/', has=['kiconvtool', '0.97'])
 
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import unittest
+
+import numpy
+
+from repology.graphprocessor import GraphProcessor, LargestTriangleThreeBuckets, RemoveStraightLines
+
+
+class TestGraphProcessor(unittest.TestCase):
+    def test_remove_straight_lines(self):
+        x, y = RemoveStraightLines(numpy.arange(7), numpy.array([1, 1, 1, 2, 2, 2, 3]))
+        self.assertEqual(x.tolist(), [0, 2, 3, 5, 6])
+        self.assertEqual(y.tolist(), [1, 1, 2, 2, 3])
+
+    def test_lttb(self):
+        x = numpy.arange(1000, dtype=float)
+        y = numpy.sin(x / 50.0)
+        y[500] = 10.0  # spike must survive downsampling
+
+        selected = LargestTriangleThreeBuckets(x, y, 100)
+
+        self.assertEqual(len(selected), 100)
+        self.assertEqual(selected[0], 0)
+        self.assertEqual(selected[-1], 999)
+        self.assertTrue((numpy.diff(selected) > 0).all())
+        self.assertIn(500, selected)
+
+    def test_lttb_small(self):
+        x = numpy.arange(10, dtype=float)
+        self.assertEqual(LargestTriangleThreeBuckets(x, x, 100).tolist(), list(range(10)))
+        self.assertEqual(LargestTriangleThreeBuckets(x, x, 10).tolist(), list(range(10)))
+
+    def test_empty(self):
+        graph = GraphProcessor()
+        self.assertEqual(graph.GetPoints(100), [])
+        self.assertEqual(graph.GetYTicks(), [])
+
+    def test_constant(self):
+        graph = GraphProcessor()
+        graph.AddPoints([datetime.timedelta(seconds=80), datetime.timedelta(seconds=40), datetime.timedelta(seconds=20)], [5, 5, 5])
+        self.assertEqual(graph.GetPoints(100), [(0.8, 0.5), (0.2, 0.5)])
+        self.assertEqual(graph.GetYTicks(), [(0.5, '5')])
+
+    def test_points(self):
+        graph = GraphProcessor()
+        graph.AddPoint(datetime.timedelta(seconds=100), 10)
+        graph.AddPoints(numpy.array([50, 0], dtype='timedelta64[s]'), [20, 30])
+
+        self.assertEqual(graph.GetPoints(100), [(1.0, 0.0), (0.5, 0.5), (0.0, 1.0)])
+        self.assertEqual(graph.GetYTicks('%'), [(0.0, '10%'), (0.25, '15%'), (0.5, '20%'), (0.75, '25%'), (1.0, '30%')])
+
+    def test_float_ticks(self):
+        graph = GraphProcessor()
+        graph.AddPoints([2, 1], [0.1, 0.2])
+        self.assertEqual([label for pos, label in graph.GetYTicks()], ['0.10', '0.12', '0.14', '0.16', '0.18', '0.20'])
+
+    def test_bounded(self):
+        numpoints = 100000
+        graph = GraphProcessor()
+        graph.AddPoints(numpy.arange(numpoints, 0, -1), numpy.sin(numpy.arange(numpoints) / 1000.0))
+
+        points = graph.GetPoints(numpoints, maxpoints=1000)
+        self.assertEqual(len(points), 1000)
+        self.assertEqual(points[0][0], 1.0)
+        self.assertTrue(all(0.0 <= x <= 1.0 and 0.0 <= y <= 1.0 for x, y in points))
+        self.assertGreater(max(y for x, y in points), 0.99)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from repology.linkchecker.benchmark import RunAsyncBenchmark, RunSyncBenchmark, SyntheticWeb
+
+
+class TestLinkBenchmark(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.web = SyntheticWeb(numhosts=40, numlinks=100, latency=0.01, hang_time=1.0, large_size=1000000, seed=1)
+        cls.web.Start()
+        cls.links = cls.web.GetLinks()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.web.Stop()
+
+    def test_plan(self):
+        kinds = set(kind for url, kind, expected in self.links)
+        self.assertEqual(len(self.links), 100)
+        self.assertTrue({'ok', 'notfound', 'redirect', 'large', 'hang'}.issubset(kinds))
+
+        # same seed produces same links
+        self.assertEqual(SyntheticWeb(numhosts=40, numlinks=100, seed=1).plan, self.web.plan)
+
+    def test_async(self):
+        result = RunAsyncBenchmark(self.links, timeout=0.5, delay=0)
+        self.assertEqual(result.mismatches, [])
+        self.assertEqual(result.num_checked, len(self.links))
+        self.assertEqual(result.stats.num_checks, len(self.links))
+
+    def test_sync(self):
+        result = RunSyncBenchmark(self.links, timeout=0.5, delay=0, jobs=2, packsize=10)
+        self.assertEqual(result.mismatches, [])
+        self.assertEqual(result.num_checked, len(self.links))
+        self.assertEqual(result.stats.num_checks, len(self.links))
+
+
+if __name__ == '__main__':
+    unittest.main()
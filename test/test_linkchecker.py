@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import socket
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler
+
+from repology.database import Database
+from repology.linkchecker.blocking import GetHTTPLinkStatus
+from repology.linkchecker.common import LinkCheckStats
+from repology.linkchecker.engine import AsyncLinkChecker
+from repology.linkchecker.resolver import DNSCache
+
+from .helpers import LocalHTTPServer
+
+
+class LocalHTTPRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def __Reply(self, code, headers={}, body=b''):
+        self.send_response(code)
+        for header, value in headers.items():
+            self.send_header(header, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        if self.command == 'GET':
+            try:
+                self.wfile.write(body)
+            except ConnectionError:
+                pass  # client is not interested in the body
+
+    def __ReplyFile(self, size, ranges=True):
+        body = b'x' * size
+        range_header = self.headers.get('range')
+
+        if ranges and range_header == 'bytes=0-0' and self.command == 'GET':
+            if size:
+                self.__Reply(206, {'Content-Range': 'bytes 0-0/{}'.format(size)}, body[:1])
+            else:
+                self.__Reply(416, {'Content-Range': 'bytes */0'})
+        elif self.command == 'HEAD':
+            # don't send body, but report its length
+            self.send_response(200)
+            self.send_header('Content-Length', str(size))
+            self.end_headers()
+        else:
+            self.__Reply(200, {}, body)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        if self.path == '/ok':
+            self.__ReplyFile(1000)
+        elif self.path == '/notfound':
+            self.__Reply(404)
+        elif self.path == '/nohead':
+            if self.command == 'HEAD':
+                self.__Reply(405)
+            else:
+                self.__ReplyFile(1000)
+        elif self.path == '/nohead-empty':
+            if self.command == 'HEAD':
+                self.__Reply(405)
+            else:
+                self.__ReplyFile(0)
+        elif self.path == '/nohead-norange':
+            if self.command == 'HEAD':
+                self.__Reply(405)
+            else:
+                self.__ReplyFile(10000000, ranges=False)
+        elif self.path == '/moved':
+            self.__Reply(301, {'Location': '/ok'})
+        elif self.path == '/found':
+            self.__Reply(302, {'Location': '/ok'})
+        elif self.path == '/loop':
+            self.__Reply(302, {'Location': '/loop'})
+        elif self.path.startswith('/slow'):
+            time.sleep(1)
+            self.__ReplyFile(1000)
+        else:
+            self.__Reply(404)
+
+
+class TestLinkChecker(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = LocalHTTPServer(('127.0.0.1', 0), LocalHTTPRequestHandler)
+        cls.base = 'http://127.0.0.1:{}'.format(cls.server.server_address[1])
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def check(self, path, **kwargs):
+        results = AsyncLinkChecker(delay=0, **kwargs).CheckUrls([self.base + path])
+        self.assertEqual(len(results), 1)
+
+        # blocking engine must produce the same results
+        self.assertEqual(GetHTTPLinkStatus(self.base + path, kwargs.get('timeout', 60)), results[0])
+
+        return results[0][1:]
+
+    def test_statuses(self):
+        self.assertEqual(self.check('/ok'), (200, None, 1000, None))
+        self.assertEqual(self.check('/notfound'), (404, None, None, None))
+        self.assertEqual(self.check('/moved'), (200, 301, 1000, self.base + '/ok'))
+        self.assertEqual(self.check('/found'), (200, 302, 1000, None))
+        self.assertEqual(self.check('/loop'), (Database.linkcheck_status_too_many_redirects, None, None, None))
+        self.assertEqual(self.check('/slow', timeout=0.2), (Database.linkcheck_status_timeout, None, None, None))
+
+    def test_get_fallback(self):
+        self.assertEqual(self.check('/nohead'), (200, None, 1000, None))
+        self.assertEqual(self.check('/nohead-empty'), (200, None, 0, None))
+        self.assertEqual(self.check('/nohead-norange'), (200, None, 10000000, None))
+
+    def test_bytes(self):
+        # body of the file is not downloaded even if server ignores range
+        checker = AsyncLinkChecker(delay=0)
+        checker.CheckUrls([self.base + '/nohead-norange'])
+        self.assertEqual(checker.stats.num_checks, 1)
+        self.assertGreater(checker.stats.num_bytes, 0)
+        self.assertLess(checker.stats.num_bytes, 1000000)
+
+        stats = LinkCheckStats()
+        GetHTTPLinkStatus(self.base + '/nohead-norange', 60, stats)
+        self.assertEqual(stats.num_checks, 1)
+        self.assertGreater(stats.num_bytes, 0)
+        self.assertLess(stats.num_bytes, 1000000)
+
+    def test_errors(self):
+        results = AsyncLinkChecker(delay=0).CheckUrls([
+            'http://127.0.0.1:1/',
+            'http://nonexistent.invalid/',
+            'ftp://example.com/',
+        ])
+
+        self.assertEqual(sorted(results), sorted([
+            ('http://127.0.0.1:1/', Database.linkcheck_status_cannot_connect, None, None, None),
+            ('http://nonexistent.invalid/', Database.linkcheck_status_dns_error, None, None, None),
+        ]))
+
+    def test_concurrency(self):
+        urls = [self.base + '/slow', self.base + '/slow?2']
+
+        # same host requests are serialized
+        start = time.monotonic()
+        results = AsyncLinkChecker(delay=0, host_concurrency=1).CheckUrls(urls)
+        self.assertGreaterEqual(time.monotonic() - start, 2.0)
+
+        start = time.monotonic()
+        results = AsyncLinkChecker(delay=0, host_concurrency=2).CheckUrls(urls)
+        self.assertLess(time.monotonic() - start, 1.9)
+
+        self.assertEqual([result[1] for result in results], [200, 200])
+
+    def test_politeness_delay(self):
+        urls = [self.base + '/ok', self.base + '/moved', self.base + '/found']
+
+        start = time.monotonic()
+        results = AsyncLinkChecker(delay=0.2).CheckUrls(urls)
+        self.assertGreaterEqual(time.monotonic() - start, 0.39)
+        self.assertEqual([result[1] for result in results], [200, 200, 200])
+
+    def test_other_hosts_not_blocked(self):
+        # many urls of a slow host must not delay checks of other hosts
+        order = []
+        urls = [self.base + '/slow?{}'.format(i) for i in range(3)] + ['http://localhost:{}/ok'.format(self.server.server_address[1])]
+
+        checker = AsyncLinkChecker(delay=0, concurrency=2)
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(checker.Run(urls, lambda result: order.append(result[0])))
+        finally:
+            loop.close()
+
+        self.assertEqual(len(order), 4)
+        self.assertEqual(order[0], urls[-1])
+        self.assertEqual(checker.scheduler.GetHostStats()[0][:2], ('127.0.0.1', 3))
+
+    def test_dns_cache(self):
+        dns_cache = DNSCache()
+        checker = AsyncLinkChecker(delay=0, dns_cache=dns_cache)
+        results = checker.CheckUrls([
+            'http://nonexistent.invalid/1',
+            'http://nonexistent.invalid/2',
+            'http://nonexistent.invalid/3',
+        ])
+
+        self.assertEqual([result[1] for result in results], [Database.linkcheck_status_dns_error] * 3)
+
+        # domain is only resolved once, other urls fail without lookup
+        self.assertEqual(dns_cache.num_failures, 1)
+        self.assertTrue(dns_cache.IsDead('nonexistent.invalid'))
+
+        # the same in blocking engine
+        self.assertEqual(GetHTTPLinkStatus('http://nonexistent.invalid/4', 60, dns_cache=dns_cache)[1], Database.linkcheck_status_dns_error)
+        self.assertEqual(dns_cache.num_failures, 1)
+
+        # successful resolutions are cached too
+        base = 'http://localhost:{}'.format(self.server.server_address[1])
+        num_hits = dns_cache.num_hits
+        results = checker.CheckUrls([base + '/ok', base + '/notfound'])
+        self.assertEqual(sorted(result[1] for result in results), [200, 404])
+        self.assertGreater(dns_cache.num_hits, num_hits)
+
+    def test_dns_cache_expiration(self):
+        now = [0.0]
+        dns_cache = DNSCache(ttl=10, negative_ttl=100, timer=lambda: now[0])
+
+        with self.assertRaises(socket.gaierror):
+            dns_cache.Resolve('nonexistent.invalid')
+        self.assertTrue(dns_cache.IsDead('nonexistent.invalid'))
+
+        now[0] = 101.0
+        self.assertFalse(dns_cache.IsDead('nonexistent.invalid'))
+
+        dns_cache.Resolve('localhost')
+        dns_cache.Resolve('localhost')
+        self.assertEqual(dns_cache.num_hits, 1)
+
+        now[0] = 112.0
+        dns_cache.Resolve('localhost')
+        self.assertEqual(dns_cache.num_hits, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import threading
+import unittest
+from collections import Counter
+from http.server import BaseHTTPRequestHandler
+
+from repology.linkchecker.checkpoint import GetSelection, LinkCheckRun
+from repology.linkchecker.engine import AsyncLinkChecker
+from repology.linkchecker.writer import LinkStatusWriter
+
+from .helpers import FakeDatabase, LocalHTTPServer
+
+
+class CountingHTTPRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        with self.server.lock:
+            self.server.hits[self.path] += 1
+
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class Interrupted(Exception):
+    pass
+
+
+class TestLinkCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalHTTPServer(('127.0.0.1', 0), CountingHTTPRequestHandler)
+        self.server.hits = Counter()
+        self.server.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+        base = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+        self.urls = [base + '/page/{:02d}'.format(i) for i in range(10)]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def run_checker(self, database, resume=False, interrupt_after=None):
+        run = LinkCheckRun(database, GetSelection(), packsize=3)
+        run.Start(resume)
+
+        checker = AsyncLinkChecker(delay=0, concurrency=1)
+        num_results = 0
+
+        with LinkStatusWriter(database, max_size=3, clear_inflight=True) as writer:
+            def Callback(result):
+                nonlocal num_results
+                writer.Add(result)
+                num_results += 1
+                if num_results == interrupt_after:
+                    raise Interrupted()
+
+            loop = asyncio.new_event_loop()
+            try:
+                loop.run_until_complete(checker.Run(run.IterUrls(database.StreamLinksForCheck(checked_before=run.started)), Callback))
+            finally:
+                loop.close()
+
+        run.Finish()
+
+        return num_results
+
+    def test_resume(self):
+        database = FakeDatabase(self.urls)
+
+        with self.assertRaises(Interrupted):
+            self.run_checker(database, interrupt_after=4)
+
+        # results gathered before interruption were written, the rest
+        # of claimed urls are still in flight
+        self.assertEqual(sum(self.server.hits.values()), 4)
+        self.assertEqual(len([url for url, last_checked in database.links.items() if last_checked is not None]), 4)
+        self.assertEqual(database.GetLinksInFlight(GetSelection()), self.urls[4:])
+
+        self.assertEqual(self.run_checker(database, resume=True), 6)
+
+        # each url was checked exactly once
+        self.assertEqual(len(self.server.hits), 10)
+        self.assertEqual(set(self.server.hits.values()), {1})
+        self.assertEqual(database.GetLinksInFlight(GetSelection()), [])
+        self.assertIsNotNone(database.runs[GetSelection()][1])
+
+        # finished run is not resumed
+        self.assertEqual(self.run_checker(database, resume=True), 10)
+
+    def test_no_resume(self):
+        database = FakeDatabase(self.urls)
+
+        with self.assertRaises(Interrupted):
+            self.run_checker(database, interrupt_after=4)
+
+        # without --resume, run starts over
+        self.assertEqual(self.run_checker(database), 10)
+        self.assertEqual(sum(self.server.hits.values()), 14)
+
+    def test_lost_results(self):
+        database = FakeDatabase(self.urls)
+
+        # simulate results lost on hard kill: all urls were claimed,
+        # but only first two results were written
+        run = LinkCheckRun(database, GetSelection(), packsize=3)
+        run.Start()
+        claimed = list(run.IterUrls(database.StreamLinksForCheck(checked_before=run.started)))
+        self.assertEqual(claimed, self.urls)
+        database.UpdateLinkStatuses([(url, 200, None, None, None) for url in self.urls[:2]])
+        database.RemoveLinksInFlight(self.urls[:2])
+
+        run = LinkCheckRun(database, GetSelection(), packsize=3)
+        run.Start(resume=True)
+        self.assertEqual(run.leftover, self.urls[2:])
+        self.assertEqual(list(run.IterUrls(database.StreamLinksForCheck(checked_before=run.started))), self.urls[2:])
+
+    def test_selection(self):
+        self.assertEqual(GetSelection(), 'due')
+        self.assertEqual(GetSelection(recheck_age=86400, failed_only=True, prefix='http://a/'), 'age=86400 failed prefix=http://a/')
+
+
+if __name__ == '__main__':
+    unittest.main()
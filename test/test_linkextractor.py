@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from repology.linkextractor import LinkExtractor
+from repology.package import Package
+
+
+class TestLinkExtractor(unittest.TestCase):
+    def test_extract(self):
+        extractor = LinkExtractor()
+
+        extractor.AddPackages([
+            Package(repo='freebsd', name='foo', homepage='http://foo/', downloads=['http://foo/foo-1.0.tar.gz']),
+            Package(repo='openbsd', name='foo', homepage='http://foo/', downloads=['http://foo/foo-1.0.tar.gz', 'http://mirror/foo-1.0.tar.gz']),
+            Package(repo='freebsd', name='bar'),
+        ])
+
+        extractor.AddPackages([
+            Package(repo='pypi', name='baz', homepage='https://pypi.python.org/pypi/baz/', downloads=['https://pypi.python.org/packages/baz-1.0.tar.gz']),
+        ])
+
+        self.assertEqual(extractor.GetUrls(), {
+            'http://foo/',
+            'http://foo/foo-1.0.tar.gz',
+            'http://mirror/foo-1.0.tar.gz',
+            'https://pypi.python.org/packages/baz-1.0.tar.gz',
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import queue
+import unittest
+
+from repology.linkchecker.scheduler import DistributeLinks, GetHostShard, GetUrlHost, HostScheduler, TokenBucket
+
+from .helpers import FakeTimer
+
+
+class TestLinkScheduler(unittest.TestCase):
+    def test_url_host(self):
+        self.assertEqual(GetUrlHost('http://Example.COM:8080/foo'), 'example.com')
+        self.assertEqual(GetUrlHost('http://[invalid/'), '')
+        self.assertEqual(GetHostShard('example.com', 4), GetHostShard('example.com', 4))
+
+    def test_distribute(self):
+        urls = ['http://{}.example.com/{}'.format(host, n) for n in range(5) for host in 'abcdef']
+        queues = [queue.Queue() for i in range(3)]
+
+        DistributeLinks(urls, queues, packsize=2)
+
+        for shard, shardqueue in enumerate(queues):
+            packs = list(shardqueue.queue)
+            self.assertTrue(all(len(pack) <= 2 for pack in packs))
+
+            # all urls of a host go to the same shard, in original order
+            shardurls = sum(packs, [])
+            self.assertEqual(shardurls, [url for url in urls if GetHostShard(GetUrlHost(url), 3) == shard])
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=0.5, burst=2)
+
+        self.assertEqual(bucket.GetWait(0.0), 0.0)
+        bucket.Take(0.0)
+        bucket.Take(0.0)
+        self.assertEqual(bucket.GetWait(0.0), 2.0)
+        self.assertEqual(bucket.GetWait(1.0), 1.0)
+        self.assertEqual(bucket.GetWait(2.0), 0.0)
+
+        # tokens don't accumulate beyond burst
+        self.assertEqual(bucket.GetWait(100.0), 0.0)
+        bucket.Take(100.0)
+        bucket.Take(100.0)
+        self.assertEqual(bucket.GetWait(100.0), 2.0)
+
+    def test_round_robin(self):
+        timer = FakeTimer()
+        scheduler = HostScheduler(delay=0, host_concurrency=10, timer=timer)
+
+        for url in ['http://a/1', 'http://a/2', 'http://a/3', 'http://b/1', 'http://c/1', 'http://c/2']:
+            scheduler.Add(url)
+
+        self.assertEqual(len(scheduler), 6)
+
+        popped = [scheduler.Pop() for i in range(6)]
+        self.assertEqual(popped, ['http://a/1', 'http://b/1', 'http://c/1', 'http://a/2', 'http://c/2', 'http://a/3'])
+        self.assertEqual(len(scheduler), 0)
+        self.assertIsNone(scheduler.Pop())
+
+    def test_rate_limit(self):
+        timer = FakeTimer()
+        scheduler = HostScheduler(delay=2, timer=timer)
+
+        for url in ['http://big/1', 'http://big/2', 'http://small/1']:
+            scheduler.Add(url)
+
+        self.assertEqual(scheduler.Pop(), 'http://big/1')
+        self.assertEqual(scheduler.Pop(), 'http://small/1')
+
+        # big host is both in flight and out of tokens
+        self.assertIsNone(scheduler.Pop())
+        self.assertIsNone(scheduler.GetWait())
+
+        timer.now = 1.0
+        scheduler.Done('http://big/1')
+        scheduler.Done('http://small/1')
+        self.assertIsNone(scheduler.Pop())
+        self.assertEqual(scheduler.GetWait(), 1.0)
+
+        timer.now = 2.0
+        self.assertEqual(scheduler.Pop(), 'http://big/2')
+
+        timer.now = 3.0
+        scheduler.Done('http://big/2')
+
+        host, checks, rate, left = scheduler.GetHostStats()[0]
+        self.assertEqual((host, checks, rate, left), ('big', 2, 2 / 3, 0))
+
+    def test_host_concurrency(self):
+        timer = FakeTimer()
+        scheduler = HostScheduler(delay=0, host_concurrency=2, timer=timer)
+
+        for url in ['http://a/1', 'http://a/2', 'http://a/3']:
+            scheduler.Add(url)
+
+        self.assertEqual(scheduler.Pop(), 'http://a/1')
+        self.assertEqual(scheduler.Pop(), 'http://a/2')
+        self.assertIsNone(scheduler.Pop())
+
+        scheduler.Done('http://a/1')
+        self.assertEqual(scheduler.Pop(), 'http://a/3')
+
+
+if __name__ == '__main__':
+    unittest.main()
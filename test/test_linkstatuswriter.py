@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from repology.linkchecker.writer import LinkStatusWriter
+
+from .helpers import FakeDatabase, FakeTimer
+
+
+def Result(url, status=200):
+    return (url, status, None, None, None)
+
+
+class TestLinkStatusWriter(unittest.TestCase):
+    def test_flush_by_size(self):
+        database = FakeDatabase()
+        writer = LinkStatusWriter(database, max_size=3, max_age=1000)
+
+        writer.Add(Result('http://a/'))
+        writer.Add(Result('http://b/'))
+        self.assertEqual(database.committed, [])
+
+        writer.Add(Result('http://c/'))
+        self.assertEqual([r[0] for r in database.committed], ['http://a/', 'http://b/', 'http://c/'])
+        self.assertEqual(database.num_commits, 1)
+
+    def test_flush_by_age(self):
+        database = FakeDatabase()
+        timer = FakeTimer()
+        writer = LinkStatusWriter(database, max_size=1000, max_age=10, timer=timer)
+
+        writer.Add(Result('http://a/'))
+        timer.now = 5
+        writer.Add(Result('http://b/'))
+        self.assertEqual(database.num_commits, 0)
+
+        timer.now = 10
+        writer.Add(Result('http://c/'))
+        self.assertEqual(len(database.committed), 3)
+
+        # age is counted from first buffered result
+        timer.now = 15
+        writer.Add(Result('http://d/'))
+        self.assertEqual(database.num_commits, 1)
+
+    def test_duplicates(self):
+        database = FakeDatabase()
+
+        with LinkStatusWriter(database) as writer:
+            writer.Add(Result('http://a/', 404))
+            writer.Add(Result('http://b/'))
+            writer.Add(Result('http://a/', 200))
+
+        self.assertEqual(database.committed, [Result('http://b/'), Result('http://a/', 200)])
+        self.assertEqual(writer.num_written, 2)
+        self.assertEqual(writer.num_flushes, 1)
+
+    def test_flush_on_error(self):
+        database = FakeDatabase()
+
+        with self.assertRaises(KeyboardInterrupt):
+            with LinkStatusWriter(database) as writer:
+                writer.Add(Result('http://a/'))
+                raise KeyboardInterrupt()
+
+        self.assertEqual(database.committed, [Result('http://a/')])
+
+    def test_failed_flush(self):
+        database = FakeDatabase(fail=True)
+        writer = LinkStatusWriter(database, max_size=1)
+
+        with self.assertRaises(RuntimeError):
+            writer.Add(Result('http://a/'))
+
+        self.assertEqual(database.num_rollbacks, 1)
+        self.assertEqual(database.committed, [])
+
+        # failed flush while handling another error does not mask it
+        with self.assertRaises(KeyboardInterrupt):
+            with LinkStatusWriter(database) as writer:
+                writer.Add(Result('http://a/'))
+                raise KeyboardInterrupt()
+
+    def test_update_metapackages(self):
+        database = FakeDatabase()
+
+        with LinkStatusWriter(database, max_size=2) as writer:
+            writer.Add(Result('http://a/'))
+            writer.Add(Result('http://b/'))
+
+        self.assertEqual(database.invalidated, [])
+
+        with LinkStatusWriter(database, max_size=2, update_metapackages=True) as writer:
+            writer.Add(Result('http://a/'))
+            writer.Add(Result('http://b/'))
+            writer.Add(Result('http://c/'))
+
+        # only urls of each flush are passed
+        self.assertEqual(database.invalidated, [['http://a/', 'http://b/'], ['http://c/']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+import unittest
+
+from repology.metapackageindex import LoadMetapackageIndex, MetapackageIndex, MetapackageIndexFile
+from repology.queryfilters import *
+
+
+# effname, num_families
+FAMILIES = [
+    ('bar', 1),
+    ('baz', 3),
+    ('foo', 2),
+    ('quux', 1),
+    ('shadowonly', 1),
+    ('zzz', 2),
+]
+
+# repo, effname, num_newest, num_outdated
+REPOS = [
+    ('freebsd', 'bar', 1, 0),
+    ('freebsd', 'baz', 0, 1),
+    ('freebsd', 'foo', 1, 1),
+    ('debian', 'baz', 1, 0),
+    ('debian', 'foo', 0, 2),
+    ('debian', 'quux', 0, 1),
+    ('arch', 'baz', 1, 0),
+    ('arch', 'zzz', 1, 0),
+]
+
+# maintainer, effname, num_packages_newest, num_packages_outdated
+MAINTAINERS = [
+    ('amdmi3@freebsd.org', 'bar', 1, 0),
+    ('amdmi3@freebsd.org', 'baz', 0, 1),
+    ('amdmi3@freebsd.org', 'shadowonly', 1, 0),
+    ('someone@debian.org', 'foo', 0, 2),
+]
+
+
+class TestMetapackageIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = MetapackageIndex(FAMILIES, REPOS, MAINTAINERS)
+
+    def test_pagination(self):
+        self.assertEqual(self.index.Query(NameStartingQueryFilter()), ['bar', 'baz', 'foo', 'quux', 'zzz'])
+        self.assertEqual(self.index.Query(NameStartingQueryFilter('baz')), ['baz', 'foo', 'quux', 'zzz'])
+        self.assertEqual(self.index.Query(NameAfterQueryFilter('baz')), ['foo', 'quux', 'zzz'])
+        self.assertEqual(self.index.Query(NameBeforeQueryFilter('foo')), ['baz', 'bar'])
+        self.assertEqual(self.index.Query(NameBeforeQueryFilter()), ['zzz', 'quux', 'foo', 'baz', 'bar'])
+        self.assertEqual(self.index.Query(NameStartingQueryFilter(), limit=2), ['bar', 'baz'])
+        self.assertEqual(self.index.Query(NameBeforeQueryFilter(), limit=2), ['zzz', 'quux'])
+
+    def test_substring(self):
+        self.assertEqual(self.index.Query(NameSubstringQueryFilter('ba')), ['bar', 'baz'])
+        self.assertEqual(self.index.Query(NameSubstringQueryFilter('b_r')), ['bar'])
+        self.assertEqual(self.index.Query(NameSubstringQueryFilter('u%x')), ['quux'])
+
+    def test_repos(self):
+        self.assertEqual(self.index.Query(InRepoQueryFilter('freebsd')), ['bar', 'baz', 'foo'])
+        self.assertEqual(self.index.Query(InAnyRepoQueryFilter(['arch', 'debian'])), ['baz', 'foo', 'quux', 'zzz'])
+        self.assertEqual(self.index.Query(OutdatedInRepoQueryFilter('freebsd')), ['baz'])
+        self.assertEqual(self.index.Query(OutdatedInRepoQueryFilter('debian')), ['foo', 'quux'])
+        self.assertEqual(self.index.Query(NotInRepoQueryFilter('freebsd')), ['quux', 'zzz'])
+        self.assertEqual(self.index.Query(InRepoQueryFilter('nonexistent')), [])
+
+    def test_maintainers(self):
+        # maintainer_metapackages includes shadow-only metapackages
+        self.assertEqual(self.index.Query(MaintainerQueryFilter('amdmi3@freebsd.org')), ['bar', 'baz', 'shadowonly'])
+        self.assertEqual(self.index.Query(MaintainerOutdatedQueryFilter('amdmi3@freebsd.org')), ['baz'])
+        self.assertEqual(self.index.Query(MaintainerQueryFilter('nobody')), [])
+
+    def test_families(self):
+        self.assertEqual(self.index.Query(InNumFamiliesQueryFilter(more=2)), ['baz', 'foo', 'zzz'])
+        self.assertEqual(self.index.Query(InNumFamiliesQueryFilter(less=1)), ['bar', 'quux', 'shadowonly'])
+        self.assertEqual(self.index.Query(InNumFamiliesQueryFilter(more=2, less=2)), ['foo', 'zzz'])
+        self.assertEqual(self.index.Query(InNumFamiliesQueryFilter(more=10)), [])
+
+    def test_combined(self):
+        self.assertEqual(self.index.Query(NameAfterQueryFilter('bar'), MaintainerQueryFilter('amdmi3@freebsd.org'), InRepoQueryFilter('freebsd')), ['baz'])
+        self.assertEqual(self.index.Query(NotInRepoQueryFilter('freebsd'), InNumFamiliesQueryFilter(more=2)), ['zzz'])
+        self.assertEqual(self.index.Query(MaintainerQueryFilter('amdmi3@freebsd.org'), NotInRepoQueryFilter('debian')), ['bar'])
+
+    def test_many(self):
+        names = ['pkg{:03}'.format(n) for n in range(100)]
+        index = MetapackageIndex(
+            [(name, 1) for name in names],
+            [('repo', name, 1, 0) for name in names[::3]],
+            []
+        )
+
+        self.assertEqual(index.Query(InRepoQueryFilter('repo'), limit=1000), names[::3])
+        self.assertEqual(index.Query(NameAfterQueryFilter('pkg050'), limit=3), ['pkg051', 'pkg054', 'pkg057'])
+        self.assertEqual(index.Query(NameBeforeQueryFilter('pkg050'), limit=3), ['pkg048', 'pkg045', 'pkg042'])
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'index')
+            self.index.Save(path)
+
+            self.assertEqual(LoadMetapackageIndex(path).Query(InRepoQueryFilter('arch')), ['baz', 'zzz'])
+
+            indexfile = MetapackageIndexFile(path)
+            self.assertEqual(indexfile.Get().Query(InRepoQueryFilter('arch')), ['baz', 'zzz'])
+
+            MetapackageIndex([('new', 1)], [('arch', 'new', 1, 0)], []).Save(path)
+            os.utime(path, ns=(0, 0))
+            self.assertEqual(indexfile.Get().Query(InRepoQueryFilter('arch')), ['new'])
+
+            os.remove(path)
+            self.assertEqual(MetapackageIndexFile(path).Get(), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from repology.database import GetRankedSearchArgs, MetapackageRequest
+from repology.queryfilters import *
+
+
+def GetQuery(*filters, estimates=None):
+    req = MetapackageRequest()
+    for f in filters:
+        f.ApplyToRequest(req)
+    req.Limit(500)
+    return req.GetQuery(estimates)
+
+
+class TestMetapackageRequest(unittest.TestCase):
+    def test_default(self):
+        query, args = GetQuery(NameStartingQueryFilter('foo'))
+        self.assertEqual(query, 'SELECT DISTINCT effname FROM metapackages_search WHERE (effname >= %s) ORDER BY effname ASC LIMIT %s')
+        self.assertEqual(args, ['foo', 500])
+
+    def test_filter_order_independent(self):
+        estimates = {'maintainer_metapackages': 100, 'repo_metapackages': 20000}
+
+        query1, args1 = GetQuery(MaintainerQueryFilter('amdmi3@freebsd.org'), InRepoQueryFilter('freebsd'), estimates=estimates)
+        query2, args2 = GetQuery(InRepoQueryFilter('freebsd'), MaintainerQueryFilter('amdmi3@freebsd.org'), estimates=estimates)
+
+        self.assertEqual(query1, query2)
+        self.assertEqual(args1, args2)
+
+    def test_selectivity_order(self):
+        query, args = GetQuery(InRepoQueryFilter('freebsd'), MaintainerQueryFilter('amdmi3@freebsd.org'), estimates={'maintainer_metapackages': 100, 'repo_metapackages': 20000})
+        self.assertTrue(query.startswith('SELECT DISTINCT effname FROM maintainer_metapackages INNER JOIN repo_metapackages USING(effname)'))
+        self.assertEqual(args, ['amdmi3@freebsd.org', 'freebsd', 500])
+
+        query, args = GetQuery(InRepoQueryFilter('freebsd'), MaintainerQueryFilter('amdmi3@freebsd.org'), estimates={'maintainer_metapackages': 30000, 'repo_metapackages': 20000})
+        self.assertTrue(query.startswith('SELECT DISTINCT effname FROM repo_metapackages INNER JOIN maintainer_metapackages USING(effname)'))
+        self.assertEqual(args, ['freebsd', 'amdmi3@freebsd.org', 500])
+
+    def test_not_in_repo_last(self):
+        query, args = GetQuery(NotInRepoQueryFilter('freebsd'), InNumFamiliesQueryFilter(more=5), estimates={'metapackage_repocounts': 1000})
+        self.assertEqual(query, 'SELECT DISTINCT effname FROM metapackage_repocounts INNER JOIN repo_metapackages as repo_metapackages1 USING(effname) WHERE ((metapackage_repocounts.num_families >= %s)) GROUP BY effname HAVING (count(nullif(repo_metapackages1.repo = %s, false)) = 0) ORDER BY effname ASC LIMIT %s')
+        self.assertEqual(args, [5, 'freebsd', 500])
+
+    def test_substring_uses_search_table(self):
+        query, args = GetQuery(InAnyRepoQueryFilter(['freebsd', 'debian']), NameSubstringQueryFilter('foo'), estimates={'metapackages_search': 0, 'repo_metapackages': 20000})
+        self.assertTrue(query.startswith('SELECT DISTINCT effname FROM metapackages_search INNER JOIN repo_metapackages USING(effname) WHERE ((metapackages_search.effname LIKE %s)) AND '))
+        self.assertEqual(args[0], '%foo%')
+
+
+class TestRankedSearch(unittest.TestCase):
+    def test_args(self):
+        self.assertEqual(GetRankedSearchArgs('foo', 10), {'search': 'foo', 'prefix': 'foo%', 'substring': '%foo%', 'limit': 10})
+        self.assertEqual(GetRankedSearchArgs('50%_off', 10)['substring'], '%50\\%\\_off%')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import random
+import unittest
+
+from repology.minhash import FindSimilarSets, FindSimilarSetsExact, MinHasher
+
+
+class TestMinHash(unittest.TestCase):
+    def test_signature(self):
+        hasher = MinHasher(num_hashes=16)
+
+        self.assertEqual(len(hasher.GetSignature({'foo', 'bar'})), 16)
+        self.assertEqual(hasher.GetSignature({'foo', 'bar'}), hasher.GetSignature({'bar', 'foo'}))
+        self.assertNotEqual(hasher.GetSignature({'foo'}), hasher.GetSignature({'bar'}))
+
+    def test_estimate(self):
+        hasher = MinHasher(num_hashes=256)
+
+        a = set('pkg{}'.format(n) for n in range(0, 100))
+        b = set('pkg{}'.format(n) for n in range(50, 150))  # jaccard = 1/3
+
+        matches = sum(1 for x, y in zip(hasher.GetSignature(a), hasher.GetSignature(b)) if x == y)
+        self.assertAlmostEqual(matches / 256, 1 / 3, delta=0.1)
+
+    def test_exact(self):
+        sets = {
+            'a': {'foo', 'bar', 'baz'},
+            'b': {'foo', 'bar'},
+            'c': {'quux'},
+        }
+
+        self.assertEqual(FindSimilarSetsExact(sets), {
+            'a': [('b', 2, 100.0 * 2 / 3)],
+            'b': [('a', 2, 100.0 * 2 / 3)],
+        })
+        self.assertEqual(FindSimilarSets(sets), FindSimilarSetsExact(sets))
+
+    def test_recall(self):
+        # maintainers working on groups of related packages
+        rnd = random.Random(1)
+        groups = [['group{}pkg{}'.format(g, n) for n in range(rnd.randrange(5, 50))] for g in range(20)]
+
+        sets = {}
+        for m in range(300):
+            items = set()
+            for group in rnd.sample(groups, rnd.randrange(1, 3)):
+                items.update(rnd.sample(group, rnd.randrange(1, len(group) + 1)))
+            sets['maintainer{}'.format(m)] = items
+
+        limit = 10
+        approximate = FindSimilarSets(sets, limit=limit)
+        exact = FindSimilarSetsExact(sets, limit=limit)
+
+        # exact scoring of candidates means no false positives
+        for key, similar in approximate.items():
+            for other, common, score in similar:
+                self.assertEqual(common, len(sets[key] & sets[other]))
+
+        # fraction of exact top-N pairs with score >= 20% found
+        relevant = set((key, other) for key, similar in exact.items() for other, common, score in similar if score >= 20)
+        found = set((key, other) for key, similar in approximate.items() for other, common, score in similar)
+
+        self.assertGreaterEqual(len(relevant & found) / len(relevant), 0.9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from repology.package import Package
+from repology.relatedclusters import HomepageToRelationUrl, RelatedClusterer, UnionFind
+
+
+class TestRelatedClusters(unittest.TestCase):
+    def test_normalize(self):
+        self.assertEqual(HomepageToRelationUrl('http://www.example.com/'), 'example.com')
+        self.assertEqual(HomepageToRelationUrl('https://example.com/foo/?bar=baz#quux'), 'example.com/foo')
+        self.assertEqual(HomepageToRelationUrl('https://example.com/foo#bar'), 'example.com/foo')
+        self.assertEqual(HomepageToRelationUrl('ftp://example.com/'), None)
+        self.assertEqual(HomepageToRelationUrl(None), None)
+
+    def test_unionfind(self):
+        unionfind = UnionFind()
+        unionfind.Union('c', 'd')
+        unionfind.Union('b', 'c')
+        unionfind.Find('e')
+
+        self.assertEqual(unionfind.Find('d'), 'b')
+        self.assertEqual(unionfind.Find('b'), 'b')
+        self.assertEqual(unionfind.Find('e'), 'e')
+
+    def test_clusters(self):
+        clusterer = RelatedClusterer()
+        clusterer.AddPackages([
+            Package(effname='foo', homepage='http://foo.org/'),
+            Package(effname='libfoo', homepage='https://www.foo.org'),
+            Package(effname='libfoo', homepage='http://libfoo.net/'),
+            Package(effname='py-libfoo', homepage='http://libfoo.net/?from=pypi'),
+            Package(effname='bar', homepage='http://bar.org/'),
+            Package(effname='nohomepage'),
+        ])
+
+        self.assertEqual(clusterer.GetClusters(), {
+            'foo': 'foo',
+            'libfoo': 'foo',
+            'py-libfoo': 'foo',
+            'bar': 'bar',
+        })
+
+    def test_hubs(self):
+        clusterer = RelatedClusterer(max_url_metapackages=2, hub_urls=['sourceforge.net'])
+        clusterer.AddPackages([
+            Package(effname='foo', homepage='http://github.com/'),
+            Package(effname='bar', homepage='http://github.com/'),
+            Package(effname='baz', homepage='http://github.com/'),
+            Package(effname='foo', homepage='http://sourceforge.net/'),
+            Package(effname='quux', homepage='http://sourceforge.net/'),
+        ])
+
+        self.assertEqual(clusterer.GetClusters(), {
+            'foo': 'foo',
+            'bar': 'bar',
+            'baz': 'baz',
+            'quux': 'quux',
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2017 Dmitry Marakasov <amdmi3@amdmi3.ru>
+#
+# This file is part of repology
+#
+# repology is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# repology is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with repology.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from repology.responsecache import LRUCache, ResponseCache, UpdateGenerationTracker
+
+from .helpers import FakeTimer
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_basic(self):
+        cache = LRUCache(10)
+
+        self.assertEqual(cache.Get('foo'), None)
+        cache.Set('foo', 1)
+        self.assertEqual(cache.Get('foo'), 1)
+        cache.Clear()
+        self.assertEqual(cache.Get('foo'), None)
+
+    def test_eviction(self):
+        cache = LRUCache(2)
+
+        cache.Set('a', 1)
+        cache.Set('b', 2)
+        cache.Get('a')  # makes b least recently used
+        cache.Set('c', 3)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.Get('a'), 1)
+        self.assertEqual(cache.Get('b'), None)
+        self.assertEqual(cache.Get('c'), 3)
+
+    def test_sizeof(self):
+        cache = LRUCache(10, sizeof=len)
+
+        cache.Set('a', 'xxxx')
+        cache.Set('b', 'xxxx')
+        self.assertEqual(cache.size, 8)
+
+        # evicts a to fit
+        cache.Set('c', 'xxxx')
+        self.assertEqual(cache.Get('a'), None)
+        self.assertEqual(cache.size, 8)
+
+        # replacing an item accounts for its old size
+        cache.Set('c', 'xx')
+        self.assertEqual(cache.size, 6)
+        self.assertEqual(cache.Get('b'), 'xxxx')
+
+        # items larger than the cache are not stored
+        cache.Set('d', 'x' * 11)
+        self.assertEqual(cache.Get('d'), None)
+        self.assertEqual(len(cache), 2)
+
+        cache.Clear()
+        self.assertEqual(cache.size, 0)
+
+    def test_ttl(self):
+        timer = FakeTimer()
+        cache = LRUCache(10, ttl=60, timer=timer)
+
+        cache.Set('foo', 1)
+        timer.now = 59
+        self.assertEqual(cache.Get('foo'), 1)
+        timer.now = 60
+        self.assertEqual(cache.Get('foo'), None)
+        self.assertEqual(len(cache), 0)
+
+
+class TestResponseCache(unittest.TestCase):
+    def test_hits_misses(self):
+        cache = ResponseCache(LRUCache(10), lambda: 1)
+
+        self.assertEqual(cache.Get('page'), None)
+        cache.Set('page', 'data')
+        self.assertEqual(cache.Get('page'), 'data')
+        self.assertEqual(cache.Get('page'), 'data')
+
+        stats = cache.GetStats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['size'], 1)
+
+    def test_generation_change(self):
+        generation = 1
+        cache = ResponseCache(LRUCache(10), lambda: generation)
+
+        cache.Set('page', 'data')
+        self.assertEqual(cache.Get('page'), 'data')
+
+        generation = 2
+        self.assertEqual(cache.Get('page'), None)
+        self.assertEqual(cache.GetStats()['invalidations'], 1)
+        self.assertEqual(cache.GetStats()['generation'], 2)
+
+
+class TestUpdateGenerationTracker(unittest.TestCase):
+    def test_check_interval(self):
+        timer = FakeTimer()
+        generation = 1
+        numchecks = 0
+
+        def GetGeneration():
+            nonlocal numchecks
+            numchecks += 1
+            return {'generation': generation, 'timestamp': 'ts{}'.format(generation)}
+
+        tracker = UpdateGenerationTracker(GetGeneration, check_interval=10, timer=timer)
+
+        self.assertEqual(tracker.GetGeneration(), 1)
+        generation = 2
+
+        # generation is not rechecked until interval passes
+        timer.now = 5
+        self.assertEqual(tracker.GetGeneration(), 1)
+        self.assertEqual(tracker.GetTimestamp(), 'ts1')
+        self.assertEqual(numchecks, 1)
+
+        timer.now = 10
+        self.assertEqual(tracker.GetGeneration(), 2)
+        self.assertEqual(tracker.GetTimestamp(), 'ts2')
+        self.assertEqual(numchecks, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()